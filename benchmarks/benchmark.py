@@ -0,0 +1,303 @@
+__author__ = "Joseph Curtis"
+__license__ = "BSD 4-Clause"
+__copyright__ = """Copyright 2023 Joseph Curtis 
+
+ Licensed under the BSD 4-Clause License, (the “Original” or “Old” License);
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+  https://choosealicense.com/licenses/bsd-4-clause/
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+ WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+ License for the specific language governing permissions and limitations under
+ the License.
+
+ If you use this software, please cite it using the metadata from the
+ CITATION.cff file.
+
+"""
+
+
+# Description: Reproducible benchmarks of loading, routing and status queries on synthetic data
+# Usage:   python benchmarks/benchmark.py --addresses 100 1000 --packages 1000 10000 --output results.json
+#          python benchmarks/benchmark.py --compare baseline.json results.json
+# Date: 29 Apr 2023
+from argparse import ArgumentParser
+import csv
+from datetime import time
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+import clustering  # noqa: E402
+import controller  # noqa: E402
+import main  # noqa: E402
+from model import DeliveryTruck, PackageStatusTimeline  # noqa: E402
+from utilities import ChainingHashTable, OpenAddressingHashTable  # noqa: E402
+
+# Deadlines of the synthetic packages, weighted like the sample package file
+DEADLINES = ['EOD'] * 6 + ['10:30 AM'] * 3 + ['9:00 AM']
+
+
+def write_distance_table(path: str, address_count: int, rng: random.Random):
+    """
+    Writes a synthetic distance table CSV in the layout of data/distance-table.csv.
+
+    Addresses are random points in a 20 by 20 mile square with the hub first; distances are
+    straight-line miles rounded to 0.1, written as the lower triangle of the table.
+
+    Parameters
+    ----------
+    path : str
+        The CSV file to write.
+    address_count : int
+        The number of addresses (rows), including the hub.
+    rng : random.Random
+        The random number generator, seeded for reproducible tables.
+
+    Returns
+    -------
+    list of tuple
+        (address, zipcode) of every address, in table order.
+    """
+    points = [(rng.uniform(0, 20), rng.uniform(0, 20)) for _ in range(address_count)]
+    addresses = [(str(number + 100) + ' S ' + str(rng.randrange(1, 99) * 100) + ' E', str(84000 + number % 200))
+                 for number in range(address_count)]
+    with open(path, 'w', newline='') as table_file:
+        writer = csv.writer(table_file)
+        writer.writerow(['LABEL', 'ADDRESS'] + ['Address ' + str(number) + '\n' + address + '\n(' + zipcode + ')'
+                                                for number, (address, zipcode) in enumerate(addresses)])
+        for row_index, ((x, y), (address, zipcode)) in enumerate(zip(points, addresses)):
+            distances = [format(math.hypot(x - column_x, y - column_y), '.1f')
+                         for column_x, column_y in points[:row_index + 1]]
+            writer.writerow(['Address ' + str(row_index), address + '\n(' + zipcode + ')'] + distances
+                            + [''] * (address_count - row_index - 1))
+    return addresses
+
+
+def write_package_file(path: str, package_count: int, addresses: list, rng: random.Random):
+    """
+    Writes a synthetic package CSV in the layout of data/package-file.csv.
+
+    Parameters
+    ----------
+    path : str
+        The CSV file to write.
+    package_count : int
+        The number of packages.
+    addresses : list of tuple
+        (address, zipcode) of every address in the distance table; packages go to any but the hub.
+    rng : random.Random
+        The random number generator, seeded for reproducible manifests.
+    """
+    with open(path, 'w', newline='') as package_file:
+        writer = csv.writer(package_file)
+        writer.writerow(['Package\nID', 'Address', 'City ', 'State', 'Zip', 'Delivery\nDeadline', 'Mass\nKILO',
+                         'Special Notes', 'Arrival'])
+        for package_id in range(1, package_count + 1):
+            address, zipcode = addresses[rng.randrange(1, len(addresses))]
+            writer.writerow([package_id, address, 'Salt Lake City', 'UT', zipcode, rng.choice(DEADLINES),
+                             rng.randrange(1, 90), '', ''])
+
+
+def measure(run, repeat: int, setup=None) -> list:
+    """
+    Times run(setup()) repeat times; setup is not timed.
+
+    Returns
+    -------
+    list of float
+        The seconds taken by each run.
+    """
+    seconds = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = timer.perf_counter()
+        run(state)
+        seconds.append(timer.perf_counter() - start)
+    return seconds
+
+
+def filled(table_type, keys):
+    """
+    Returns a new hash table of the given type with every key mapped to itself.
+    """
+    table = table_type()
+    table.insert_many((key, key) for key in keys)
+    return table
+
+
+def load_fleet(table_file: str, package_file: str):
+    """
+    Loads the synthetic data and fills enough 8:00 trucks for every package, plus one at 10:30 for late arrivals.
+
+    Returns
+    -------
+    tuple
+        (graph, package hash table, list of loaded trucks)
+    """
+    graph, vertex_list, hub_address = main.load_distance_data(table_file)
+    packages = main.load_package_data(vertex_list, package_file=package_file)
+    trucks = [DeliveryTruck(hub_address, 'Truck ' + str(number + 1))
+              for number in range(math.ceil(len(packages) / 16))]
+    trucks.append(DeliveryTruck(hub_address, 'Truck ' + str(len(trucks) + 1), time(hour=10, minute=30)))
+    controller.fill_trucks(trucks, graph, (package for _, package in packages))
+    return graph, packages, trucks
+
+
+def partition_fleet(table_file: str, package_file: str):
+    """
+    Loads the synthetic packages and enough empty trucks for them at about 100 packages per truck, with 10% spare room.
+
+    Returns
+    -------
+    tuple
+        (list of packages, list of empty trucks)
+    """
+    _, vertex_list, hub_address = main.load_distance_data(table_file)
+    packages = [package for _, package in main.load_package_data(vertex_list, package_file=package_file)]
+    truck_count = max(1, len(packages) // 100)
+    capacity = math.ceil(1.1 * len(packages) / truck_count)
+    return packages, [DeliveryTruck(hub_address, 'Truck ' + str(number + 1), capacity=capacity)
+                      for number in range(truck_count)]
+
+
+def run_benchmarks(address_count: int, package_count: int, repeat: int, seed: int, work_dir: str) -> list:
+    """
+    Runs every benchmark on one synthetic distance table and package manifest.
+
+    Returns
+    -------
+    list of dict
+        One result per benchmark: name, sizes, best and all timings in seconds.
+    """
+    rng = random.Random(seed)
+    table_file = os.path.join(work_dir, 'distance-table-' + str(address_count) + '.csv')
+    package_file = os.path.join(work_dir, 'package-file-' + str(address_count) + '-' + str(package_count) + '.csv')
+    addresses = write_distance_table(table_file, address_count, rng)
+    write_package_file(package_file, package_count, addresses, rng)
+
+    graph, vertex_list, _ = main.load_distance_data(table_file)
+    address_index = main.build_address_index(vertex_list)
+    keys = list(range(1, package_count + 1))
+    lookup_keys = [rng.randrange(1, package_count + 1) for _ in range(package_count)]
+
+    timings = {
+        'load_distance_data': measure(lambda _: main.load_distance_data(table_file), repeat),
+        'load_package_data': measure(lambda _: main.load_package_data(vertex_list, address_index,
+                                                                      package_file=package_file), repeat),
+    }
+    for table_type in (ChainingHashTable, OpenAddressingHashTable):
+        name = table_type.__name__
+        timings[name + '.insert'] = measure(
+            lambda table: [table.insert(key, key) for key in keys], repeat, table_type)
+        timings[name + '.get'] = measure(
+            lambda table: [table.get(key) for key in lookup_keys], repeat,
+            lambda: filled(table_type, keys))
+        timings[name + '.get_many'] = measure(
+            lambda table: table.get_many(lookup_keys), repeat, lambda: filled(table_type, keys))
+
+    timings['truck_deliver_packages'] = measure(
+        lambda fleet: [controller.truck_deliver_packages(truck, fleet[0]) for truck in fleet[2]], repeat,
+        lambda: load_fleet(table_file, package_file))
+
+    for method in (clustering.SWEEP, clustering.KMEANS):
+        timings['partition_packages.' + method] = measure(
+            lambda fleet: clustering.partition_packages(fleet[1], graph, fleet[0], method), repeat,
+            lambda: partition_fleet(table_file, package_file))
+
+    _, packages, trucks = load_fleet(table_file, package_file)
+    for truck in trucks:
+        controller.truck_deliver_packages(truck, graph)
+    timings['PackageStatusTimeline'] = measure(
+        lambda _: PackageStatusTimeline(package for _, package in packages), repeat)
+    timeline = PackageStatusTimeline(package for _, package in packages)
+    report_times = [time(hour=hour) for hour in range(8, 18)]
+    timings['statuses_at'] = measure(
+        lambda _: [timeline.statuses_at(report_time) for report_time in report_times], repeat)
+    timings['status_at'] = measure(
+        lambda _: [timeline.status_at(key, report_times[key % len(report_times)]) for key in lookup_keys], repeat)
+
+    return [{'benchmark': name, 'addresses': address_count, 'packages': package_count,
+             'seconds': min(seconds), 'all_seconds': seconds}
+            for name, seconds in timings.items()]
+
+
+def git_commit() -> str:
+    """
+    Returns the current git commit of the repository, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_file: str, results_file: str):
+    """
+    Prints how much slower (>1) or faster (<1) each benchmark of results_file is than in baseline_file.
+    """
+    with open(baseline_file) as file:
+        baseline = {(result['benchmark'], result['addresses'], result['packages']): result['seconds']
+                    for result in json.load(file)['results']}
+    with open(results_file) as file:
+        results = json.load(file)['results']
+    for result in results:
+        key = (result['benchmark'], result['addresses'], result['packages'])
+        if key in baseline and baseline[key] > 0:
+            print(f'{key[0]:40} {key[1]:>7} {key[2]:>8} {result["seconds"] / baseline[key]:8.2f}x')
+
+
+def benchmark_main():
+    """
+    Parses the command line and runs the benchmarks, or compares two result files.
+    """
+    parser = ArgumentParser(description='Benchmark loading, routing and status queries on synthetic data.')
+    parser.add_argument('--addresses', type=int, nargs='+', default=[100, 1000],
+                        help='Distance table sizes (number of addresses) to benchmark (default is 100 1000). '
+                             'The table has one cell per pair of addresses, so 100k addresses need ~40 GB.')
+    parser.add_argument('--packages', type=int, nargs='+', default=[1000, 10000],
+                        help='Package manifest sizes to benchmark with each table (default is 1000 10000).')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark; the best is reported.')
+    parser.add_argument('--seed', type=int, default=2023, help='Seed of the synthetic data generator.')
+    parser.add_argument('--output', '-o', default=None, help='JSON file for the results (default is stdout).')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'RESULTS'), default=None,
+                        help='Compare two result files instead of running the benchmarks.')
+    benchmark_args = parser.parse_args()
+
+    if benchmark_args.compare:
+        compare(*benchmark_args.compare)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for address_count in benchmark_args.addresses:
+            for package_count in benchmark_args.packages:
+                print('Benchmarking ' + str(address_count) + ' addresses, ' + str(package_count) + ' packages',
+                      file=sys.stderr)
+                results.extend(run_benchmarks(address_count, package_count, benchmark_args.repeat,
+                                              benchmark_args.seed, work_dir))
+
+    report = {'commit': git_commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+              'seed': benchmark_args.seed, 'repeat': benchmark_args.repeat, 'results': results}
+    if benchmark_args.output:
+        with open(benchmark_args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    benchmark_main()
@@ -0,0 +1,117 @@
+__author__ = "Joseph Curtis"
+__license__ = "BSD 4-Clause"
+__copyright__ = """Copyright 2023 Joseph Curtis 
+
+ Licensed under the BSD 4-Clause License, (the “Original” or “Old” License);
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+  https://choosealicense.com/licenses/bsd-4-clause/
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+ WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+ License for the specific language governing permissions and limitations under
+ the License.
+
+ If you use this software, please cite it using the metadata from the
+ CITATION.cff file.
+
+"""
+
+
+# Description: Load generator for the package status service (python src/main.py --serve)
+# Usage:   python benchmarks/load_test.py --port 8080 --requests 20000 --connections 50
+# Date: 29 Apr 2023
+from argparse import ArgumentParser
+import asyncio
+import json
+import random
+import sys
+import time as timer
+
+
+async def client(host: str, port: int, paths: list, latencies: list, errors: list):
+    """
+    Sends the requests for paths one after another over one keep-alive connection, recording each latency.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path in paths:
+            start = timer.perf_counter()
+            writer.write(('GET ' + path + ' HTTP/1.1\r\nHost: ' + host + '\r\n\r\n').encode('latin-1'))
+            head = await reader.readuntil(b'\r\n\r\n')
+            status_line, *header_lines = head.decode('latin-1').split('\r\n')
+            body_length = 0
+            for line in header_lines:
+                name, _, value = line.partition(':')
+                if name.strip().lower() == 'content-length':
+                    body_length = int(value)
+            await reader.readexactly(body_length)
+            latencies.append(timer.perf_counter() - start)
+            if status_line.split()[1] != '200':
+                errors.append(path + ' ' + status_line)
+    finally:
+        writer.close()
+
+
+async def run_load(host: str, port: int, request_count: int, connections: int, package_count: int,
+                   fleet_share: float, seed: int) -> dict:
+    """
+    Sends request_count requests over the given number of concurrent connections.
+
+    Most requests ask for one random package at a random time; fleet_share of them ask for
+    every package or every truck.
+
+    Returns
+    -------
+    dict
+        Requests, seconds, requests per second, latency percentiles in milliseconds, and errors.
+    """
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(request_count):
+        at = str(rng.randrange(8, 18)).zfill(2) + str(rng.randrange(60)).zfill(2)
+        if rng.random() < fleet_share:
+            paths.append(rng.choice(('/packages', '/trucks')) + '?at=' + at)
+        else:
+            paths.append('/package/' + str(rng.randrange(1, package_count + 1)) + '?at=' + at)
+    latencies = []
+    errors = []
+    start = timer.perf_counter()
+    await asyncio.gather(*(client(host, port, paths[number::connections], latencies, errors)
+                           for number in range(connections)))
+    seconds = timer.perf_counter() - start
+    latencies.sort()
+    return {'requests': len(latencies), 'connections': connections, 'seconds': seconds,
+            'requests_per_second': len(latencies) / seconds,
+            'latency_ms': {str(percentile): latencies[min(len(latencies) - 1, len(latencies) * percentile // 100)]
+                           * 1000 for percentile in (50, 90, 99)},
+            'errors': len(errors), 'first_errors': errors[:5]}
+
+
+def load_test_main():
+    """
+    Parses the command line, runs the load test and prints the results as JSON.
+    """
+    parser = ArgumentParser(description='Send concurrent status queries to a running status service.')
+    parser.add_argument('--host', default='127.0.0.1', help='The address of the service (default is 127.0.0.1).')
+    parser.add_argument('--port', type=int, default=8080, help='The port of the service (default is 8080).')
+    parser.add_argument('--requests', type=int, default=20000, help='The number of requests (default is 20000).')
+    parser.add_argument('--connections', type=int, default=50,
+                        help='The number of concurrent keep-alive connections (default is 50).')
+    parser.add_argument('--packages', type=int, default=40,
+                        help='Package IDs 1 to this are queried (default is 40, the sample package file).')
+    parser.add_argument('--fleet-share', type=float, default=0.0,
+                        help='The share of requests for /packages or /trucks instead of one package (default 0).')
+    parser.add_argument('--seed', type=int, default=2023, help='Seed of the request generator.')
+    load_args = parser.parse_args()
+
+    results = asyncio.run(run_load(load_args.host, load_args.port, load_args.requests, load_args.connections,
+                                   load_args.packages, load_args.fleet_share, load_args.seed))
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    load_test_main()
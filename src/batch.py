@@ -0,0 +1,251 @@
+__author__ = "Joseph Curtis"
+__license__ = "BSD 4-Clause"
+__copyright__ = """Copyright 2023 Joseph Curtis 
+
+ Licensed under the BSD 4-Clause License, (the “Original” or “Old” License);
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+  https://choosealicense.com/licenses/bsd-4-clause/
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+ WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+ License for the specific language governing permissions and limitations under
+ the License.
+
+ If you use this software, please cite it using the metadata from the
+ CITATION.cff file.
+
+"""
+
+
+# Description: Plans many days at many depots in one run, across a process pool
+# Usage:   python src/batch.py --manifests days/ --tables depot-a.csv depot-b.csv --output-dir plans/
+# Date: 29 Apr 2023
+#
+# Every package file in the manifest directory is planned at every depot. A depot is a
+# distance table in the layout of data/distance-table.csv, whose first row is the depot
+# itself. Each table is loaded once, in this process, and its distance matrix is shared
+# with the workers (see controller.share_city_map); the workers plan one day at one depot
+# per task and write the plan to <output-dir>/<depot>/<day>.json. A summary of every plan
+# is written to <output-dir>/summary.json.
+from argparse import ArgumentParser
+import json
+from multiprocessing import Pool
+import os
+import sys
+import time as timer
+
+import controller
+import main
+from model import DeliveryTruck
+from simulation import simulate_fleet_events
+
+# Per depot: (city map, address index), in a worker process
+_worker_depots = {}
+_worker_shared_memory = []
+
+
+def load_depot(table_file: str):
+    """
+    Loads a depot's distance table (through the table cache) and completes it with shortest paths if needed.
+
+    Returns
+    -------
+    model.Graph
+        The city map; its first vertex is the depot.
+    """
+    city_map, _, _ = main.load_cached_distance_data(table_file)
+    if not city_map.is_complete():
+        city_map = city_map.shortest_path_closure()
+    return city_map
+
+
+def _init_batch_worker(depot_descriptions: dict):
+    """
+    Rebuilds every depot's city map in a worker process on top of the shared distance matrices.
+
+    Parameters
+    ----------
+    depot_descriptions : dict
+        {depot name: description of its city map returned by controller.share_city_map}
+    """
+    for depot, description in depot_descriptions.items():
+        city_map, shared_memory = controller.attach_city_map(*description)
+        _worker_shared_memory.append(shared_memory)
+        _worker_depots[depot] = city_map, main.build_address_index(city_map.vertex_list)
+
+
+def plan_day(depot: str, manifest_file: str, output_file: str, truck_count: int = 2,
+             improve_route: bool = False, time_budget: float = 0.05, deadline_aware: bool = False) -> dict:
+    """
+    Plans one day at one depot and writes the plan as JSON.
+
+    The day is simulated with controller.HubLoader and the event-driven fleet (see
+    simulation.simulate_fleet_events): truck_count trucks leave the depot at 8:00 and are
+    reloaded whenever they return. Every package is at the depot at 8:00; the delayed and
+    wrong-address packages of the sample day are not applied. Packages whose address is not
+    in the depot's distance table are left out of the plan and listed as unresolved.
+
+    Parameters
+    ----------
+    depot : str
+        The name of a depot loaded in this worker.
+    manifest_file : str
+        The package CSV file of the day.
+    output_file : str
+        The JSON file the plan is written to.
+    truck_count : int, optional
+        The number of trucks at the depot (default is 2).
+    improve_route : bool, optional
+        Whether to improve each trip's route with local search (default is False).
+    time_budget : float, optional
+        The most seconds to spend improving each trip's route (default is 0.05).
+    deadline_aware : bool, optional
+        Whether to plan each trip's route around package deadlines (default is False).
+
+    Returns
+    -------
+    dict
+        The summary of the plan: depot, manifest, output file, package count, total miles,
+        late and unresolved package IDs, and the seconds taken.
+    """
+    start = timer.perf_counter()
+    city_map, address_index = _worker_depots[depot]
+    hub_address = city_map.vertex_list[0]
+    packages = main.load_package_data(city_map.vertex_list, address_index, package_file=manifest_file,
+                                      sample_day=False)
+    deliverable = [package for _, package in packages if package.destination.index is not None]
+    unresolved_ids = [package.package_id for _, package in packages if package.destination.index is None]
+
+    trips = simulate_fleet_events([DeliveryTruck(hub_address, 'Truck ' + str(number + 1))
+                                   for number in range(truck_count)],
+                                  city_map, deliverable, improve_route, time_budget, deadline_aware)
+    # unresolved packages are never loaded, so only the deliverable ones can be late
+    late_ids = [package.package_id
+                for package in controller.late_packages((package.package_id, package) for package in deliverable)]
+    total_miles = sum(trip.miles_traveled for trip in trips)
+
+    plan = {
+        'depot': depot, 'manifest': manifest_file, 'hub': hub_address.address,
+        'total_miles': round(total_miles, 1), 'late_package_ids': late_ids, 'unresolved_package_ids': unresolved_ids,
+        'trips': [{'label': trip.label, 'departure_time': str(trip.departure_time),
+                   'miles_traveled': round(trip.miles_traveled, 1),
+                   'package_ids': [package.package_id for package in trip.manifest],
+                   'route': [stop.label for stop in trip.route_list]} for trip in trips],
+        'packages': [{'package_id': package.package_id, 'status': package.status_delivered}
+                     for package in deliverable],
+    }
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w') as plan_file:
+        json.dump(plan, plan_file)
+
+    return {'depot': depot, 'manifest': manifest_file, 'output': output_file, 'packages': len(packages),
+            'total_miles': plan['total_miles'], 'late_package_ids': late_ids,
+            'unresolved_package_ids': unresolved_ids, 'seconds': timer.perf_counter() - start}
+
+
+def _plan_task(task: tuple) -> dict:
+    """
+    Runs plan_day for one (depot, manifest, output, options) task in a worker process.
+    """
+    depot, manifest_file, output_file, options = task
+    return plan_day(depot, manifest_file, output_file, **options)
+
+
+def run_batch(manifest_files: list, table_files: list, output_dir: str, processes: int = None, **options) -> list:
+    """
+    Plans every manifest at every depot, each depot's table loaded once, writing one plan file per pair.
+
+    Parameters
+    ----------
+    manifest_files : list of str
+        The package CSV files, one per day.
+    table_files : list of str
+        The distance table CSV files, one per depot; a depot is named after its file.
+    output_dir : str
+        The directory the plans are written to, one subdirectory per depot.
+    processes : int, optional
+        The number of worker processes (default is the number of CPUs); 1 plans in this process.
+    **options
+        truck_count, improve_route, time_budget and deadline_aware, passed to plan_day.
+
+    Returns
+    -------
+    list of dict
+        The summary of every plan, in (depot, manifest) order.
+    """
+    depots = {os.path.splitext(os.path.basename(table_file))[0]: load_depot(table_file) for table_file in table_files}
+    if len(depots) != len(table_files):
+        raise ValueError('depot distance tables must have different file names')
+    tasks = [(depot, manifest_file,
+              os.path.join(output_dir, depot, os.path.splitext(os.path.basename(manifest_file))[0] + '.json'), options)
+             for depot in depots for manifest_file in manifest_files]
+
+    summaries = []
+
+    def report(summary):
+        print('Planned ' + summary['depot'] + ' ' + summary['manifest'] + ': '
+              + str(summary['total_miles']) + ' miles', file=sys.stderr)
+        summaries.append(summary)
+
+    if processes == 1:
+        for depot, city_map in depots.items():
+            _worker_depots[depot] = city_map, main.build_address_index(city_map.vertex_list)
+        for task in tasks:
+            report(_plan_task(task))
+        return summaries
+
+    shared = {depot: controller.share_city_map(city_map, with_paths=True) for depot, city_map in depots.items()}
+    try:
+        with Pool(processes, initializer=_init_batch_worker,
+                  initargs=({depot: description for depot, (_, description) in shared.items()},)) as pool:
+            for summary in pool.imap(_plan_task, tasks):
+                report(summary)
+    finally:
+        for shared_memory, _ in shared.values():
+            shared_memory.close()
+            shared_memory.unlink()
+    return summaries
+
+
+def batch_main():
+    """
+    Parses the command line and plans every day at every depot.
+    """
+    parser = ArgumentParser(description='Plan Daily Local Deliveries for many days and depots.')
+    parser.add_argument('--manifests', '-m', required=True,
+                        help='The directory of package CSV files, one per day.')
+    parser.add_argument('--tables', '-t', required=True, nargs='+',
+                        help='The distance table CSV files, one per depot; the first row of each is the depot.')
+    parser.add_argument('--output-dir', '-o', required=True, help='The directory the plans are written to.')
+    parser.add_argument('--trucks', type=int, default=2, help='The number of trucks at each depot (default is 2).')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='The number of worker processes (default is the number of CPUs).')
+    parser.add_argument('--improve-routes', action='store_true',
+                        help='Shorten each trip route with 2-opt and Or-opt local search.')
+    parser.add_argument('--route-time-budget', type=float, default=0.05,
+                        help='The most seconds spent improving each trip route (default is 0.05).')
+    parser.add_argument('--deadline-aware', action='store_true',
+                        help='Plan each trip route by deadline-feasible insertion instead of nearest neighbor.')
+    batch_args = parser.parse_args()
+
+    manifest_files = sorted(os.path.join(batch_args.manifests, name) for name in os.listdir(batch_args.manifests)
+                            if name.endswith('.csv'))
+    if not manifest_files:
+        parser.error('no .csv package files in ' + batch_args.manifests)
+
+    start = timer.perf_counter()
+    summaries = run_batch(manifest_files, batch_args.tables, batch_args.output_dir, batch_args.processes,
+                          truck_count=batch_args.trucks, improve_route=batch_args.improve_routes,
+                          time_budget=batch_args.route_time_budget, deadline_aware=batch_args.deadline_aware)
+    os.makedirs(batch_args.output_dir, exist_ok=True)
+    with open(os.path.join(batch_args.output_dir, 'summary.json'), 'w') as summary_file:
+        json.dump({'seconds': timer.perf_counter() - start, 'plans': summaries}, summary_file, indent=2)
+    print('Planned ' + str(len(summaries)) + ' day(s) in ' + str(round(timer.perf_counter() - start, 1))
+          + ' s; summary in ' + os.path.join(batch_args.output_dir, 'summary.json'), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    batch_main()
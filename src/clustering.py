@@ -0,0 +1,473 @@
+__author__ = "Joseph Curtis"
+__license__ = "BSD 4-Clause"
+__copyright__ = """Copyright 2023 Joseph Curtis 
+
+ Licensed under the BSD 4-Clause License, (the “Original” or “Old” License);
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+  https://choosealicense.com/licenses/bsd-4-clause/
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+ WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+ License for the specific language governing permissions and limitations under
+ the License.
+
+ If you use this software, please cite it using the metadata from the
+ CITATION.cff file.
+
+"""
+
+
+# Description: Splitting a day's packages into capacity- and mass-feasible truck loads
+# Date: 29 Apr 2023
+#
+# The distance table has no coordinates, so destinations are first embedded in the plane
+# with FastMap, which places points using only O(n) distances per dimension. The packages
+# are then partitioned either by a sweep around the hub, or by capacity-constrained
+# k-means started from the sweep. Both keep every cluster within its truck's package
+# capacity and, if the truck has one, its mass limit.
+from bisect import bisect_left
+import math
+from sys import intern
+
+import model
+
+SWEEP = 'sweep'
+KMEANS = 'kmeans'
+
+
+def fastmap(city_map: model.Graph, indices: list, dimensions: int = 2) -> dict:
+    """
+    Embeds vertices in a plane (or more dimensions) so straight-line distances approximate the distance matrix.
+
+    Each dimension is the projection onto the line through two far-apart pivot vertices,
+    using the distances left over after the earlier dimensions (Faloutsos and Lin's FastMap).
+    Road distances are not Euclidean, so the embedding is an approximation; it only has to
+    keep nearby destinations together.
+
+    Parameters
+    ----------
+    city_map : model.Graph
+        The graph containing the distances between the vertices.
+    indices : list of int
+        The vertex indices to embed; the first is used to find the first pivots.
+    dimensions : int, optional
+        The number of coordinates per vertex (default is 2).
+
+    Returns
+    -------
+    dict
+        {vertex index: list of coordinates}
+    """
+    matrix = city_map.distance_matrix
+    coordinates = {index: [] for index in indices}
+    if not coordinates:
+        return coordinates
+
+    def residual_row(pivot: int) -> dict:
+        # squared distances from pivot with the earlier dimensions projected out
+        row = matrix.row(pivot).tolist()
+        pivot_point = coordinates[pivot]
+        return {index: max(0.0, row[index] ** 2 - sum((a - b) ** 2 for a, b in zip(point, pivot_point)))
+                for index, point in coordinates.items()}
+
+    for _ in range(dimensions):
+        # a far-apart pivot pair: the vertex furthest from the first, and the one furthest from that
+        squared_from_first = residual_row(indices[0])
+        pivot_a = max(squared_from_first, key=squared_from_first.__getitem__)
+        squared_from_a = residual_row(pivot_a)
+        pivot_b = max(squared_from_a, key=squared_from_a.__getitem__)
+        squared_from_b = residual_row(pivot_b)
+        squared_between = squared_from_a[pivot_b]
+        if squared_between == 0.0:
+            for point in coordinates.values():
+                point.append(0.0)
+            continue
+        between = math.sqrt(squared_between)
+        for index, point in coordinates.items():
+            point.append((squared_from_a[index] + squared_between - squared_from_b[index]) / (2 * between))
+    return coordinates
+
+
+class SpatialIndex:
+    """
+    A uniform grid over the FastMap embedding of some vertices, for nearest-neighbor queries.
+
+    Candidates come from the grid cells around a vertex, nearest ring of cells first, and
+    are ranked by their real distances from the distance matrix; the embedding only decides
+    which vertices are looked at. Queries therefore touch a few cells instead of every
+    vertex, at the price of being approximate: a vertex the embedding places badly can be
+    missed. Besides the indexed vertices, the index keeps a changing set of members (e.g.
+    the destinations that still have packages waiting) for nearest_member queries.
+
+    Parameters
+    ----------
+    city_map : model.Graph
+        The graph containing the distances between the vertices.
+    indices : list of int
+        The vertex indices to index.
+    per_cell : int, optional
+        The average number of vertices per grid cell (default is 2).
+
+    Methods
+    -------
+    nearest(from_index: int, count: int) -> List[int]
+        Returns about the count indexed vertices closest to from_index, nearest first.
+    add(index: int) -> None
+        Adds an indexed vertex to the members.
+    discard(index: int) -> None
+        Removes a vertex from the members, if it is one.
+    nearest_member(from_index: int) -> int
+        Returns the member closest to from_index, or None if there are no members.
+    nearest_members(from_index: int, count: int) -> List[int]
+        Returns about the count members closest to from_index, nearest first.
+    """
+
+    def __init__(self, city_map: model.Graph, indices: list, per_cell: int = 2):
+        self.city_map = city_map
+        coordinates = fastmap(city_map, list(indices))
+        xs = [point[0] for point in coordinates.values()] or [0.0]
+        ys = [point[1] for point in coordinates.values()] or [0.0]
+        self._min_x, self._min_y = min(xs), min(ys)
+        width, height = max(xs) - self._min_x, max(ys) - self._min_y
+        cells_wanted = max(1, len(coordinates) // per_cell)
+        self._cell_size = math.sqrt(width * height / cells_wanted) if width * height > 0 \
+            else max(width, height, 1.0) / cells_wanted
+        self._cell_size = max(self._cell_size, 1e-9)
+        self._cell_of = {index: self._cell(point) for index, point in coordinates.items()}
+        self._columns = self._cell((max(xs), 0.0))[0] + 1
+        self._rows = self._cell((0.0, max(ys)))[1] + 1
+        self._cells = {}
+        for index, cell in self._cell_of.items():
+            self._cells.setdefault(cell, []).append(index)
+        self._member_cells = {}
+        self._member_count = 0
+
+    def _cell(self, point) -> tuple:
+        return int((point[0] - self._min_x) / self._cell_size), int((point[1] - self._min_y) / self._cell_size)
+
+    def _ring(self, center: tuple, radius: int):
+        """
+        Yields the cells at Chebyshev distance radius from center, inside the grid.
+        """
+        center_x, center_y = center
+        if radius == 0:
+            yield center
+            return
+        for x in range(max(0, center_x - radius), min(self._columns, center_x + radius + 1)):
+            for y in (center_y - radius, center_y + radius):
+                if 0 <= y < self._rows:
+                    yield x, y
+        for y in range(max(0, center_y - radius + 1), min(self._rows, center_y + radius)):
+            for x in (center_x - radius, center_x + radius):
+                if 0 <= x < self._columns:
+                    yield x, y
+
+    def _candidates(self, from_index: int, cells: dict, enough: int) -> list:
+        """
+        Collects the vertices in rings of cells around from_index until at least enough are
+        found, plus one more ring, since the embedding only approximates the real distances.
+        """
+        center = self._cell_of[from_index]
+        max_radius = max(self._columns, self._rows)
+        candidates = []
+        last_radius = max_radius
+        radius = 0
+        while radius <= last_radius:
+            for cell in self._ring(center, radius):
+                members = cells.get(cell)
+                if members:
+                    candidates.extend(members)
+            if len(candidates) >= enough and last_radius == max_radius:
+                last_radius = radius + 1
+            radius += 1
+        return candidates
+
+    def nearest(self, from_index: int, count: int) -> list:
+        """
+        Returns about the count indexed vertices closest to from_index (itself included), nearest first.
+        """
+        row = self.city_map.distance_matrix.row(from_index)
+        return sorted(self._candidates(from_index, self._cells, count), key=row.__getitem__)[:count]
+
+    def add(self, index: int):
+        """
+        Adds an indexed vertex to the members.
+        """
+        members = self._member_cells.setdefault(self._cell_of[index], set())
+        if index not in members:
+            members.add(index)
+            self._member_count += 1
+
+    def discard(self, index: int):
+        """
+        Removes a vertex from the members, if it is one.
+        """
+        cell = self._cell_of[index]
+        members = self._member_cells.get(cell)
+        if members and index in members:
+            members.remove(index)
+            self._member_count -= 1
+            if not members:
+                del self._member_cells[cell]
+
+    def nearest_member(self, from_index: int):
+        """
+        Returns the member closest to from_index, or None if there are no members.
+        """
+        if not self._member_count:
+            return None
+        row = self.city_map.distance_matrix.row(from_index)
+        return min(self._candidates(from_index, self._member_cells, 1), key=lambda index: (row[index], index))
+
+    def nearest_members(self, from_index: int, count: int) -> list:
+        """
+        Returns about the count members closest to from_index, nearest first.
+        """
+        if not self._member_count:
+            return []
+        row = self.city_map.distance_matrix.row(from_index)
+        return sorted(self._candidates(from_index, self._member_cells, count),
+                      key=lambda index: (row[index], index))[:count]
+
+
+class _Group:
+    """
+    Packages for one destination that are always loaded together, with their embedded position.
+    """
+    __slots__ = ('packages', 'count', 'mass', 'x', 'y')
+
+    def __init__(self, packages: list, point: list):
+        self.packages = packages
+        self.count = len(packages)
+        self.mass = sum(package.mass_kg for package in packages)
+        self.x, self.y = point[0], point[1]
+
+
+def _limits(truck: model.DeliveryTruck) -> tuple:
+    """
+    Returns the package count and mass a truck can still take.
+    """
+    max_mass = math.inf if truck.max_mass_kg is None else truck.max_mass_kg
+    return truck.capacity - len(truck.inventory), max_mass - sum(package.mass_kg for package in truck.inventory)
+
+
+def _groups(packages: list, coordinates: dict, max_count: int, max_mass: float) -> list:
+    """
+    Groups packages by destination, earliest deadline first, split so every group fits in any of the trucks.
+    """
+    by_destination = {}
+    for package in sorted(packages, key=lambda package: package.deadline):
+        by_destination.setdefault(package.destination.index, []).append(package)
+    groups = []
+    for index, destination_packages in by_destination.items():
+        group = []
+        group_mass = 0.0
+        for package in destination_packages:
+            if group and (len(group) == max_count or group_mass + package.mass_kg > max_mass):
+                groups.append(_Group(group, coordinates[index]))
+                group, group_mass = [], 0.0
+            group.append(package)
+            group_mass += package.mass_kg
+        groups.append(_Group(group, coordinates[index]))
+    return groups
+
+
+def _sweep(groups: list, hub_point: list, limits: list) -> tuple:
+    """
+    Cuts the groups, in angular order around the hub, into consecutive clusters that fit the trucks in turn.
+
+    Returns
+    -------
+    tuple
+        (groups in sweep order, and the cluster number of each, or -1 if no truck had room)
+    """
+    hub_x, hub_y = hub_point[0], hub_point[1]
+    angles = [math.atan2(group.y - hub_y, group.x - hub_x) for group in groups]
+    order = sorted(range(len(groups)), key=lambda position: (angles[position], (groups[position].x - hub_x) ** 2
+                                                             + (groups[position].y - hub_y) ** 2))
+    # start the sweep after the widest empty sector, so no cluster straddles it
+    if len(order) > 1:
+        gaps = [(angles[order[position]] - angles[order[position - 1]]) % (2 * math.pi)
+                for position in range(len(order))]
+        start = max(range(len(order)), key=gaps.__getitem__)
+        order = order[start:] + order[:start]
+
+    assignment = [-1] * len(groups)
+    cluster = 0
+    room_count, room_mass = limits[0] if limits else (0, 0.0)
+    for position in order:
+        group = groups[position]
+        if group.count > room_count or group.mass > room_mass:
+            # move on to the next truck with room for the group; if none has, leave it at the hub
+            # and keep filling the current truck with the groups that follow
+            next_cluster = next((later for later in range(cluster + 1, len(limits))
+                                 if group.count <= limits[later][0] and group.mass <= limits[later][1]), None)
+            if next_cluster is None:
+                continue
+            cluster = next_cluster
+            room_count, room_mass = limits[cluster]
+        assignment[position] = cluster
+        room_count -= group.count
+        room_mass -= group.mass
+    return [groups[position] for position in order], [assignment[position] for position in order]
+
+
+def _centroids(groups: list, assignment: list, cluster_count: int, previous: list = None) -> list:
+    """
+    Returns the package-weighted mean position of every cluster; an empty cluster keeps its previous centroid.
+    """
+    sums = [[0.0, 0.0, 0] for _ in range(cluster_count)]
+    for group, cluster in zip(groups, assignment):
+        if cluster >= 0:
+            cluster_sum = sums[cluster]
+            cluster_sum[0] += group.x * group.count
+            cluster_sum[1] += group.y * group.count
+            cluster_sum[2] += group.count
+    return [(x / count, y / count) if count else (previous[cluster] if previous else (0.0, 0.0))
+            for cluster, (x, y, count) in enumerate(sums)]
+
+
+def _nearest_with_room(x: float, y: float, xs: list, by_x: list, centroids: list, fits) -> tuple:
+    """
+    Finds the nearest centroid for which fits(cluster) is true, scanning outward from x along the centroids sorted by x.
+
+    Returns
+    -------
+    tuple
+        (cluster number or -1, squared distance)
+    """
+    best, best_squared = -1, math.inf
+    left = bisect_left(xs, x) - 1
+    right = left + 1
+    while left >= 0 or right < len(xs):
+        # take the closer side in x; stop once both sides are further in x alone than the best
+        left_dx = x - xs[left] if left >= 0 else math.inf
+        right_dx = xs[right] - x if right < len(xs) else math.inf
+        if left_dx <= right_dx:
+            dx, cluster = left_dx, by_x[left]
+            left -= 1
+        else:
+            dx, cluster = right_dx, by_x[right]
+            right += 1
+        if dx * dx >= best_squared:
+            break
+        if fits(cluster):
+            centroid_x, centroid_y = centroids[cluster]
+            squared = (x - centroid_x) ** 2 + (y - centroid_y) ** 2
+            if squared < best_squared:
+                best, best_squared = cluster, squared
+    return best, best_squared
+
+
+def _kmeans(groups: list, assignment: list, limits: list, iterations: int) -> list:
+    """
+    Improves a feasible assignment of groups to clusters with capacity-constrained k-means.
+
+    Every iteration computes the cluster centroids, then reassigns the groups closest to a
+    centroid first, each to the nearest centroid whose cluster still has room. If some group
+    finds no room, the previous assignment is kept. Stops early once nothing moves.
+
+    Returns
+    -------
+    list of int
+        The cluster number of every group (-1 where the starting assignment had none).
+    """
+    cluster_count = len(limits)
+    centroids = None
+    for _ in range(iterations):
+        centroids = _centroids(groups, assignment, cluster_count, centroids)
+        by_x = sorted(range(cluster_count), key=lambda cluster: centroids[cluster][0])
+        xs = [centroids[cluster][0] for cluster in by_x]
+
+        # groups that are closest to a centroid choose first
+        nearest = [_nearest_with_room(group.x, group.y, xs, by_x, centroids, lambda cluster: True)[1]
+                   if cluster >= 0 else math.inf for group, cluster in zip(groups, assignment)]
+        room_count = [count for count, _ in limits]
+        room_mass = [mass for _, mass in limits]
+        new_assignment = list(assignment)
+        feasible = True
+        for position in sorted(range(len(groups)), key=nearest.__getitem__):
+            if assignment[position] < 0:
+                continue
+            group = groups[position]
+            cluster, _ = _nearest_with_room(
+                group.x, group.y, xs, by_x, centroids,
+                lambda candidate: group.count <= room_count[candidate] and group.mass <= room_mass[candidate])
+            if cluster < 0:
+                feasible = False
+                break
+            new_assignment[position] = cluster
+            room_count[cluster] -= group.count
+            room_mass[cluster] -= group.mass
+        if not feasible or new_assignment == assignment:
+            break
+        assignment = new_assignment
+    return assignment
+
+
+def partition_packages(trucks: list, city_map: model.Graph, packages, method: str = SWEEP,
+                       iterations: int = 10) -> list:
+    """
+    Loads the trucks with the packages split into one cluster of nearby destinations per truck.
+
+    Every truck takes at most its capacity in packages and, if it has a max_mass_kg, at most
+    that mass. Packages for the same destination stay together unless they would not fit in
+    one truck. With SWEEP, the destinations are taken in angular order around the hub (the
+    trucks' current address) and cut into consecutive clusters, one truck after another;
+    with KMEANS, the sweep clusters are then improved by capacity-constrained k-means. Both
+    run on a FastMap embedding of the destinations, so partitioning n packages over k
+    trucks costs O(n log n) for the sweep and about O(n sqrt(k)) per k-means iteration.
+
+    Arrival times are not considered: every package given is assumed to be at the hub.
+    The packages are marked as loaded at each truck's departure time.
+
+    Parameters
+    ----------
+    trucks : list of model.DeliveryTruck
+        The delivery trucks, at the hub; packages already in a truck count against its limits.
+    city_map : model.Graph
+        The graph object representing the city map.
+    packages : Iterable[model.PackageWGUPS]
+        The packages to load.
+    method : str, optional
+        SWEEP (default) or KMEANS.
+    iterations : int, optional
+        The most k-means iterations (default is 10).
+
+    Returns
+    -------
+    list of model.PackageWGUPS
+        The packages that did not fit in any truck.
+    """
+    packages = list(packages)
+    if not trucks or not packages:
+        return packages
+    if method not in (SWEEP, KMEANS):
+        raise ValueError('unknown partitioning method ' + repr(method))
+
+    hub = trucks[0].current_address
+    limits = [_limits(truck) for truck in trucks]
+    destinations = [hub.index] + sorted({package.destination.index for package in packages} - {hub.index})
+    coordinates = fastmap(city_map, destinations)
+    groups = _groups(packages, coordinates, max(1, min(count for count, _ in limits)),
+                     min(mass for _, mass in limits))
+
+    groups, assignment = _sweep(groups, coordinates[hub.index], limits)
+    if method == KMEANS:
+        assignment = _kmeans(groups, assignment, limits, iterations)
+
+    leftover = []
+    for group, cluster in zip(groups, assignment):
+        if cluster < 0:
+            leftover.extend(group.packages)
+            continue
+        truck = trucks[cluster]
+        status_loaded = intern(truck.label + " En Route")
+        for package in group.packages:
+            package.time_loaded = truck.departure_time
+            package.status_loaded = status_loaded
+        truck.inventory.extend(group.packages)
+    return leftover
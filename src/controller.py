@@ -19,30 +19,330 @@ __copyright__ = """Copyright 2023 Joseph Curtis
 
 """
 
+from array import array
+from bisect import bisect_right
 from datetime import datetime, time
 import datetime
-
+from functools import partial
+import heapq
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+import sys
+from sys import intern
+
+import clustering
 import model
-from utilities import ChainingHashTable
+import routing
+from utilities import ChainingHashTable, DistanceMatrix, PackedDistanceMatrix
 
 
 # Date: 29 Apr 2023
 
 
-def truck_load_packages(truck: model.DeliveryTruck, city_map: model.Graph, hub_inventory):
-    for _ in range(truck.capacity):
-        try:
-            next_stop = model.min_distance_address_from(truck.current_address, city_map, hub_inventory)
+def truck_load_packages(truck: model.DeliveryTruck, city_map: model.Graph, hub_inventory: list):
+    """
+    Loads one truck up to its capacity with packages waiting at the hub, nearby destinations together.
 
-            closest_package = hub_inventory.__iter__().__next__()
-            for item in hub_inventory:
-                model.min_distance_address_from(truck.current_address, city_map)
-        except StopIteration:
-            return truck
+    Parameters
+    ----------
+    truck : model.DeliveryTruck
+        The delivery truck to load.
+    city_map : model.Graph
+        The graph object representing the city map.
+    hub_inventory : list of model.PackageWGUPS
+        The packages waiting at the hub. Loaded packages are removed from the list.
 
+    Returns
+    -------
+    model.DeliveryTruck
+        The loaded delivery truck.
+    """
+    fill_trucks([truck], city_map, hub_inventory)
+    loaded = set(package.package_id for package in truck.inventory)
+    hub_inventory[:] = [package for package in hub_inventory if package.package_id not in loaded]
     return truck
 
 
+class HubLoader:
+    """
+    The packages waiting at the hub, loaded onto trucks as they depart in time order.
+
+    A truck only takes packages that have arrived at the hub by its departure time. Each
+    truck starts a cluster at the waiting package with the earliest deadline, then
+    repeatedly moves to the nearest destination that still has waiting packages and loads
+    them (earliest deadline first) until full.
+
+    Nearest destinations come from a clustering.SpatialIndex over all destinations, built
+    once in O(D) for D destinations and shared by all trucks. Each destination's list of its
+    neighbor_count closest destinations is taken from the index the first time a truck is
+    there; when every listed neighbor has been emptied, the index's set of destinations with
+    packages waiting is searched instead of scanning them all. Loading n packages costs
+    O(n log n) plus a few grid cells per stop. The index is approximate: it ranks
+    candidates by real distance, but may miss a destination the embedding places badly.
+
+    Methods
+    -------
+    load(truck: model.DeliveryTruck) -> model.DeliveryTruck:
+        Loads one truck up to its capacity at its departure time.
+    next_arrival_time() -> datetime.time:
+        Returns when the next package still on its way arrives at the hub.
+    """
+    def __init__(self, city_map: model.Graph, hub_inventory, neighbor_count: int = 16):
+        """
+        Initializes a HubLoader with the packages that will pass through the hub.
+
+        Parameters
+        ----------
+        city_map : model.Graph
+            The graph object representing the city map.
+        hub_inventory : Iterable[model.PackageWGUPS]
+            The packages waiting at the hub; packages already loaded (time_loaded set) are skipped.
+        neighbor_count : int, optional
+            How many nearest destinations to index per destination (default is 16).
+        """
+        self.city_map = city_map
+        self.neighbor_count = neighbor_count
+        # packages still at the hub, in the order they arrive there
+        self._arrivals = sorted((package for package in hub_inventory if package.time_loaded is None),
+                                key=lambda package: package.time_arrived)
+        # with no packages to load there is nothing to index, and load leaves trucks unchanged
+        self._index = clustering.SpatialIndex(city_map, {package.destination.index for package in self._arrivals}) \
+            if self._arrivals else None
+        self._next_arrival = 0
+
+        # destination index -> heap of (deadline, arrival number, package) for the packages that have arrived
+        self._waiting = {}
+        # heap of (deadline, arrival number, package) for choosing where to start a cluster; it holds
+        # at least the most urgent waiting package of every destination, plus loaded ones dropped lazily
+        self._deadlines = []
+        self._neighbor_lists = {}
+
+    def next_arrival_time(self):
+        """
+        Returns when the next package still on its way arrives at the hub, or None if all have arrived.
+        """
+        if self._next_arrival < len(self._arrivals):
+            return self._arrivals[self._next_arrival].time_arrived
+        return None
+
+    def _nearest_waiting_destination(self, from_index: int):
+        """
+        Returns the closest destination index with packages waiting, or None if there are none.
+        """
+        neighbors = self._neighbor_lists.get(from_index)
+        if neighbors is None:
+            neighbors = self._index.nearest(from_index, self.neighbor_count + 1)
+            self._neighbor_lists[from_index] = neighbors
+        waiting = self._waiting
+        for index in neighbors:
+            if index in waiting:
+                return index
+        return self._index.nearest_member(from_index)
+
+    def _load_destination(self, truck: model.DeliveryTruck, index: int):
+        """
+        Loads the packages waiting for one destination, earliest deadline first, while the truck has room.
+        """
+        packages_here = self._waiting[index]
+        room = min(truck.capacity - len(truck.inventory), len(packages_here))
+        status_loaded = intern(truck.label + " En Route")
+        for _ in range(room):
+            package = heapq.heappop(packages_here)[2]
+            package.time_loaded = truck.departure_time
+            package.status_loaded = status_loaded
+            truck.inventory.append(package)
+        if packages_here:
+            heapq.heappush(self._deadlines, packages_here[0])
+        else:
+            del self._waiting[index]
+            self._index.discard(index)
+
+    def load(self, truck: model.DeliveryTruck) -> model.DeliveryTruck:
+        """
+        Loads one truck up to its capacity with the packages at the hub by its departure time.
+
+        Trucks must be loaded in order of departure time.
+
+        Parameters
+        ----------
+        truck : model.DeliveryTruck
+            The delivery truck to load, with its departure time set.
+
+        Returns
+        -------
+        model.DeliveryTruck
+            The loaded delivery truck.
+        """
+        if self._index is None:
+            return truck
+
+        # packages that arrived by this truck's departure become available
+        arrivals = self._arrivals
+        deadlines = self._deadlines
+        waiting = self._waiting
+        first_arrival = self._next_arrival
+        self._next_arrival = bisect_right(arrivals, truck.departure_time, first_arrival,
+                                          key=lambda package: package.time_arrived)
+        for arrival_number in range(first_arrival, self._next_arrival):
+            package = arrivals[arrival_number]
+            entry = (package.deadline, arrival_number, package)
+            packages_here = waiting.get(package.destination.index)
+            if packages_here is None:
+                packages_here = waiting[package.destination.index] = []
+                self._index.add(package.destination.index)
+            heapq.heappush(packages_here, entry)
+            if packages_here[0] is entry:
+                heapq.heappush(deadlines, entry)
+
+        while len(truck.inventory) < truck.capacity:
+            # start a cluster at the most urgent package still waiting
+            while deadlines and deadlines[0][2].time_loaded is not None:
+                heapq.heappop(deadlines)
+            if not deadlines:
+                break
+            current_index = deadlines[0][2].destination.index
+            self._load_destination(truck, current_index)
+
+            while len(truck.inventory) < truck.capacity:
+                current_index = self._nearest_waiting_destination(current_index)
+                if current_index is None:
+                    break
+                self._load_destination(truck, current_index)
+
+        return truck
+
+
+def fill_trucks(trucks: list, city_map: model.Graph, hub_inventory, neighbor_count: int = 16):
+    """
+    Greedily loads each truck up to its capacity, clustering packages with nearby destinations.
+
+    Trucks are loaded in order of departure time, as described for HubLoader.
+
+    Parameters
+    ----------
+    trucks : list of model.DeliveryTruck
+        The delivery trucks to load, each with its departure time set.
+    city_map : model.Graph
+        The graph object representing the city map.
+    hub_inventory : Iterable[model.PackageWGUPS]
+        The packages waiting at the hub; packages already loaded (time_loaded set) are skipped.
+    neighbor_count : int, optional
+        How many nearest destinations to index per destination (default is 16).
+
+    Returns
+    -------
+    list of model.DeliveryTruck
+        The loaded delivery trucks, in the order given.
+    """
+    loader = HubLoader(city_map, hub_inventory, neighbor_count)
+    for truck in sorted(trucks, key=lambda delivery_truck: delivery_truck.departure_time):
+        loader.load(truck)
+    return trucks
+
+
+def load_trucks_auto(starting_address: model.Vertex, packages: ChainingHashTable, city_map: model.Graph):
+    """
+    Load the delivery trucks automatically with fill_trucks, on the same schedule as load_trucks_manual.
+
+    Special handling notes on packages (required truck, delivered together) are not considered.
+
+    Parameters
+    ----------
+    starting_address: model.Vertex
+        The starting address of the delivery trucks.
+    packages: ChainingHashTable
+        The package hash table that contains all the packages to be loaded on the trucks.
+    city_map : model.Graph
+        The graph object representing the city map.
+
+    Returns
+    -------
+    tuple of model.DeliveryTruck
+        A tuple of four delivery trucks, each loaded with packages.
+    """
+    truck1a = model.DeliveryTruck(starting_address, "Truck 1", time(hour=8, minute=0))
+    truck1b = model.DeliveryTruck(starting_address, "Truck 1", time(hour=9, minute=37))
+    truck2a = model.DeliveryTruck(starting_address, "Truck 2", time(hour=8, minute=0))
+    truck2b = model.DeliveryTruck(starting_address, "Truck 2", time(hour=10, minute=20))
+
+    fill_trucks([truck1a, truck2a, truck1b, truck2b], city_map, (package for _, package in packages))
+    return truck1a, truck1b, truck2a, truck2b
+
+
+def partition_trucks(trucks: list, city_map: model.Graph, hub_inventory, method: str = clustering.SWEEP) -> list:
+    """
+    Loads the trucks by clustering, one departure time after another (see clustering.partition_packages).
+
+    The trucks leaving at the same time share the packages that have arrived at the hub by
+    then and are not loaded yet. If there are more than those trucks can carry, the ones
+    with the earliest deadlines are partitioned and the rest wait for later trucks.
+
+    Parameters
+    ----------
+    trucks : list of model.DeliveryTruck
+        The delivery trucks to load, each with its departure time set.
+    city_map : model.Graph
+        The graph object representing the city map.
+    hub_inventory : Iterable[model.PackageWGUPS]
+        The packages waiting at the hub; packages already loaded (time_loaded set) are skipped.
+    method : str, optional
+        clustering.SWEEP (default) or clustering.KMEANS.
+
+    Returns
+    -------
+    list of model.PackageWGUPS
+        The packages no truck took.
+    """
+    waiting = sorted((package for package in hub_inventory if package.time_loaded is None),
+                     key=lambda package: (package.deadline, package.time_arrived))
+    departures = sorted({truck.departure_time for truck in trucks})
+    for departure_time in departures:
+        wave = [truck for truck in trucks if truck.departure_time == departure_time]
+        arrived = [package for package in waiting if package.time_arrived <= departure_time]
+        room = sum(truck.capacity - len(truck.inventory) for truck in wave)
+        leftover = clustering.partition_packages(wave, city_map, arrived[:room], method)
+        loaded = set(package.package_id for package in arrived[:room]) \
+            - set(package.package_id for package in leftover)
+        waiting = [package for package in waiting if package.package_id not in loaded]
+    return waiting
+
+
+def load_trucks_clustered(starting_address: model.Vertex, packages: ChainingHashTable, city_map: model.Graph,
+                          method: str = clustering.SWEEP):
+    """
+    Load the delivery trucks by clustering with partition_trucks, on the same schedule as load_trucks_manual.
+
+    Special handling notes on packages (required truck, delivered together) are not considered.
+
+    Parameters
+    ----------
+    starting_address: model.Vertex
+        The starting address of the delivery trucks.
+    packages: ChainingHashTable
+        The package hash table that contains all the packages to be loaded on the trucks.
+    city_map : model.Graph
+        The graph object representing the city map.
+    method : str, optional
+        clustering.SWEEP (default) or clustering.KMEANS.
+
+    Returns
+    -------
+    tuple of model.DeliveryTruck
+        A tuple of four delivery trucks, each loaded with packages.
+    """
+    truck1a = model.DeliveryTruck(starting_address, "Truck 1", time(hour=8, minute=0))
+    truck1b = model.DeliveryTruck(starting_address, "Truck 1", time(hour=9, minute=37))
+    truck2a = model.DeliveryTruck(starting_address, "Truck 2", time(hour=8, minute=0))
+    truck2b = model.DeliveryTruck(starting_address, "Truck 2", time(hour=10, minute=20))
+
+    left_at_hub = partition_trucks([truck1a, truck2a, truck1b, truck2b], city_map,
+                                   (package for _, package in packages), method)
+    if left_at_hub:
+        print('Warning: ' + str(len(left_at_hub)) + ' package(s) did not fit on any truck, package ID: '
+              + ', '.join(str(package.package_id) for package in left_at_hub), file=sys.stderr)
+    return truck1a, truck1b, truck2a, truck2b
+
+
 def load_trucks_manual(starting_address: model.Vertex, packages: ChainingHashTable):
     """
     Load the delivery trucks manually with the given packages.
@@ -73,51 +373,99 @@ def load_trucks_manual(starting_address: model.Vertex, packages: ChainingHashTab
     truck2b = model.DeliveryTruck(starting_address, "Truck 2", load_time_truck2b)
 
     # Load the packages on each truck manually and update package statuses
-    truck1a.inventory = \
-        [packages.get(13), packages.get(14), packages.get(15), packages.get(16), packages.get(19),
-         packages.get(20), packages.get(21), packages.get(34), packages.get(39),
-         packages.get(27), packages.get(35), ]
+    truck1a.inventory = packages.get_many([13, 14, 15, 16, 19, 20, 21, 34, 39, 27, 35])
     for package in truck1a.inventory:
         package.time_loaded = load_time_truck1a
-        package.status_loaded = truck1a.label + " En Route"
+        package.status_loaded = intern(truck1a.label + " En Route")
 
-    truck2a.inventory = \
-        [packages.get(1), packages.get(3), packages.get(4), packages.get(7), packages.get(8),
-         packages.get(18), packages.get(29), packages.get(30), packages.get(31), packages.get(36),
-         packages.get(37), packages.get(38), packages.get(40), ]
+    truck2a.inventory = packages.get_many([1, 3, 4, 7, 8, 18, 29, 30, 31, 36, 37, 38, 40])
     for package in truck2a.inventory:
         package.time_loaded = load_time_truck2a
-        package.status_loaded = truck2a.label + " En Route"
+        package.status_loaded = intern(truck2a.label + " En Route")
 
-    truck1b.inventory = \
-        [packages.get(6), packages.get(25), packages.get(26), packages.get(28), packages.get(32),
-         packages.get(11), packages.get(12), packages.get(17), packages.get(22), packages.get(23), ]
+    truck1b.inventory = packages.get_many([6, 25, 26, 28, 32, 11, 12, 17, 22, 23])
     for package in truck1b.inventory:
         package.time_loaded = load_time_truck1b
-        package.status_loaded = truck1b.label + " En Route"
+        package.status_loaded = intern(truck1b.label + " En Route")
 
-    truck2b.inventory = \
-        [packages.get(5), packages.get(9),
-         packages.get(2), packages.get(10), packages.get(24), packages.get(33), ]
+    truck2b.inventory = packages.get_many([5, 9, 2, 10, 24, 33])
     for package in truck2b.inventory:
         package.time_loaded = load_time_truck2b
-        package.status_loaded = truck2b.label + " En Route"
+        package.status_loaded = intern(truck2b.label + " En Route")
 
     # Return a tuple of the four delivery trucks
     return truck1a, truck1b, truck2a, truck2b
 
 
-def truck_deliver_packages(truck: model.DeliveryTruck, city_map: model.Graph):
+def plan_stops(truck: model.DeliveryTruck, city_map: model.Graph, current_time: datetime.time,
+               improve_route: bool = False, time_budget: float = 0.05, deadline_aware: bool = False):
+    """
+    Plans the order of a truck's stops from its current address, or leaves it to be chosen stop by stop.
+
+    With improve_route, the stop order is planned and shortened with 2-opt and Or-opt moves
+    (see routing.improved_stop_order). With deadline_aware, it is planned by deadline-feasible
+    insertion (see routing.deadline_aware_stop_order); combined with improve_route, the
+    shorter order is only used if it makes no more packages late.
+
+    Parameters
+    ----------
+    truck : model.DeliveryTruck
+        The loaded delivery truck.
+    city_map : model.Graph
+        The graph object representing the city map.
+    current_time : datetime.time
+        When the truck sets off from its current address.
+    improve_route : bool, optional
+        Whether to improve the nearest-neighbor route with local search (default is False).
+    time_budget : float, optional
+        The most seconds to spend improving the route (default is 0.05).
+    deadline_aware : bool, optional
+        Whether to plan the route around package deadlines (default is False).
+
+    Returns
+    -------
+    Iterator[model.Vertex] or None
+        The stops in order, or None if the truck should always drive to the closest remaining destination.
+    """
+    starting_address = truck.current_address
+    if deadline_aware:
+        stops, late = routing.deadline_aware_stop_order(starting_address, truck.inventory, city_map,
+                                                        current_time, truck.speed_mi_hr)
+        if improve_route:
+            improved_stops = routing.improve_stops(starting_address, stops, city_map, time_budget)
+            if len(routing.late_packages_on(improved_stops, starting_address, truck.inventory, city_map,
+                                            current_time, truck.speed_mi_hr)) <= len(late):
+                stops = improved_stops
+        return iter(stops)
+    elif improve_route:
+        return iter(routing.improved_stop_order(starting_address, truck.inventory, city_map, time_budget))
+    return None
+
+
+def truck_deliver_packages(truck: model.DeliveryTruck, city_map: model.Graph,
+                           improve_route: bool = False, time_budget: float = 0.05, deadline_aware: bool = False,
+                           return_address: model.Vertex = None):
     """
     Delivers all packages on the given delivery truck by traveling to each package destination in the inventory
     and unloading the packages at each destination.
 
+    By default the truck always drives to the closest remaining destination. With improve_route
+    or deadline_aware, the whole stop order is planned first (see plan_stops), then driven in that order.
+
     Parameters
     ----------
     truck : model.DeliveryTruck
         The delivery truck object containing the packages to be delivered and the current location.
     city_map : model.Graph
         The graph object representing the city map.
+    improve_route : bool, optional
+        Whether to improve the nearest-neighbor route with local search (default is False).
+    time_budget : float, optional
+        The most seconds to spend improving this truck's route (default is 0.05).
+    deadline_aware : bool, optional
+        Whether to plan the route around package deadlines (default is False).
+    return_address : model.Vertex, optional
+        Where the truck goes after its last delivery (default is the truck's current address).
 
     Returns
     -------
@@ -139,12 +487,15 @@ def truck_deliver_packages(truck: model.DeliveryTruck, city_map: model.Graph):
         None
         """
         if next_stop is None:
-            next_stop = model.min_distance_address_from(truck.current_address, city_map, truck.inventory)
-        truck.miles_traveled += model.distance_between(truck.current_address, next_stop, city_map)
+            next_stop, distance = model.nearest_vertex_from(truck.current_address, city_map, packages_at)
+        else:
+            distance = model.distance_between(truck.current_address, next_stop, city_map)
+        truck.miles_traveled += distance
         delivery_time_hours = truck.miles_traveled / truck.speed_mi_hr
         truck.travel_delta = datetime.timedelta(hours=delivery_time_hours)
 
-        truck.route_list.append(next_stop)
+        # On a shortest path closure the roads driven may pass through other vertices on the way
+        truck.route_list.extend(city_map.path_between(truck.current_address, next_stop)[1:])
         truck.current_address = next_stop
 
     def unload_packages():
@@ -155,26 +506,333 @@ def truck_deliver_packages(truck: model.DeliveryTruck, city_map: model.Graph):
         -------
         None
         """
-        for package in truck.inventory:
-            if package.destination == truck.current_address:
-                # convert departure time to datetime.datetime object
-                departure_datetime = datetime.datetime.combine(datetime.date.today(), truck.departure_time)
-                # add travel delta to departure time
-                delivery_datetime = departure_datetime + truck.travel_delta
-                # extract time component from delivery datetime
-                delivery_time = delivery_datetime.time()
-
-                package.time_delivered = delivery_time
-                package.status_delivered = truck.label + " Delivered " + str(delivery_time)
-                truck.inventory.remove(package)
+        delivered = packages_at.pop(truck.current_address.index, None)
+        if delivered is None:
+            return
+        # add travel delta to departure time, and extract the time component
+        delivery_time = (departure_datetime + truck.travel_delta).time()
+        status_delivered = truck.label + " Delivered " + str(delivery_time)
+        for package in delivered:
+            package.time_delivered = delivery_time
+            package.status_delivered = status_delivered
 
     # Main delivery loop
     starting_address = truck.current_address
-    # repeat travel and delivery for each item in the truck
-    for _ in range(len(truck.inventory)):
-        go_to_next_stop()
+    if return_address is None:
+        return_address = starting_address
+    # convert departure time to datetime.datetime object
+    departure_datetime = datetime.datetime.combine(datetime.date.today(), truck.departure_time)
+    # a truck re-planned part way through its route sets off from where it is now
+    current_time = (departure_datetime + truck.travel_delta).time()
+    truck.manifest.extend(truck.inventory)
+    planned_stops = plan_stops(truck, city_map, current_time, improve_route, time_budget, deadline_aware)
+    # The inventory by destination, in the order each destination first appears in the truck:
+    # arriving at a stop pops all of its packages at once
+    packages_at = {}
+    for package in truck.inventory:
+        packages_at.setdefault(package.destination.index, []).append(package)
+
+    # repeat travel and delivery until the truck is empty
+    while packages_at:
+        go_to_next_stop(None if planned_stops is None else next(planned_stops))
         unload_packages()
+    truck.inventory.clear()
 
     # Return to starting location
-    go_to_next_stop(starting_address)
+    go_to_next_stop(return_address)
     return truck
+
+
+def replan_truck(truck: model.DeliveryTruck, city_map: model.Graph, update_time: datetime.time,
+                 changed_packages: list = (), improve_route: bool = False, time_budget: float = 0.05,
+                 deadline_aware: bool = False):
+    """
+    Re-plans the rest of a delivered truck's route after some of its packages changed at update_time.
+
+    The truck keeps the part of its route driven by update_time, including the stop it is
+    driving to then. From that stop, the packages it has not delivered yet are delivered
+    again as by truck_deliver_packages, and the truck returns to where its route started.
+    A changed package that has not reached the hub by the truck's departure (its time_arrived
+    was moved later) is taken off the truck and returned, to be loaded on a later truck.
+    Only this truck's stops are recomputed, so an update costs one delivery of the
+    remaining packages rather than a new simulation of the fleet.
+
+    Parameters
+    ----------
+    truck : model.DeliveryTruck
+        A truck that has already been through truck_deliver_packages.
+    city_map : model.Graph
+        The graph object representing the city map.
+    update_time : datetime.time
+        When the change became known.
+    changed_packages : list of model.PackageWGUPS, optional
+        The truck's packages whose destination or time_arrived changed; any not delivered by
+        update_time are delivered again even if their old delivery was later in the route.
+    improve_route : bool, optional
+        Whether to improve the new route with local search (default is False).
+    time_budget : float, optional
+        The most seconds to spend improving the new route (default is 0.05).
+    deadline_aware : bool, optional
+        Whether to plan the new route around package deadlines (default is False).
+
+    Returns
+    -------
+    list of model.PackageWGUPS
+        The packages taken off the truck because they arrive at the hub after it departs.
+    """
+    departure_datetime = datetime.datetime.combine(datetime.date.today(), truck.departure_time)
+    update_datetime = datetime.datetime.combine(datetime.date.today(), update_time)
+    elapsed_miles = max(0.0, (update_datetime - departure_datetime).total_seconds()) / 3600 * truck.speed_mi_hr
+
+    # Follow the route driven until the first vertex reached at or after update_time
+    route = truck.route_list
+    stop_number = 0
+    miles_traveled = 0.0
+    while stop_number + 1 < len(route) and miles_traveled < elapsed_miles:
+        miles_traveled += model.distance_between(route[stop_number], route[stop_number + 1], city_map)
+        stop_number += 1
+    travel_delta = datetime.timedelta(hours=miles_traveled / truck.speed_mi_hr)
+    arrival_time = (departure_datetime + travel_delta).time()
+
+    changed = set(package.package_id for package in changed_packages)
+    if update_datetime < departure_datetime:
+        returned = [package for package in changed_packages if package.time_arrived > truck.departure_time]
+    else:
+        returned = []
+    for package in returned:
+        package.time_loaded = None
+        package.status_loaded = "awaiting loading"
+        package.time_delivered = None
+        package.status_delivered = "not delivered"
+    returned_ids = set(package.package_id for package in returned)
+
+    delivered = []
+    remaining = []
+    for package in truck.manifest:
+        if package.package_id in returned_ids:
+            continue
+        if package.time_delivered is not None and (package.time_delivered < update_time or (
+                package.package_id not in changed and package.time_delivered <= arrival_time)):
+            delivered.append(package)
+        else:
+            remaining.append(package)
+
+    return_address = route[0]
+    truck.current_address = route[stop_number]
+    truck.route_list = route[:stop_number + 1]
+    truck.miles_traveled = miles_traveled
+    truck.travel_delta = travel_delta
+    truck.manifest = delivered
+
+    # Packages for the stop the truck is at (or driving to) are unloaded there on arrival
+    status_delivered = truck.label + " Delivered " + str(arrival_time)
+    truck.inventory = []
+    for package in remaining:
+        if package.destination.index == truck.current_address.index:
+            package.time_delivered = arrival_time
+            package.status_delivered = status_delivered
+            truck.manifest.append(package)
+        else:
+            truck.inventory.append(package)
+
+    truck_deliver_packages(truck, city_map, improve_route, time_budget, deadline_aware, return_address)
+    return returned
+
+
+def late_packages(packages: ChainingHashTable) -> list:
+    """
+    Finds the packages that were delivered after their deadline.
+
+    Parameters
+    ----------
+    packages : ChainingHashTable
+        The package hash table (or any iterable of (package_id, package) pairs), after the trucks have delivered.
+
+    Returns
+    -------
+    list of model.PackageWGUPS
+        The late packages, in hash table order.
+    """
+    return [package for _, package in packages
+            if package.time_delivered is not None and package.time_delivered > package.deadline]
+
+
+def share_city_map(city_map: model.Graph, with_paths: bool = False):
+    """
+    Copies the distance matrix of a city map into a new shared memory block, for worker processes.
+
+    Parameters
+    ----------
+    city_map : model.Graph
+        The graph object representing the city map.
+    with_paths : bool, optional
+        Whether the workers also need the shortest-path predecessors of a closure (default is False).
+        They are copied into the same block, after the matrix, so no worker gets its own copy.
+
+    Returns
+    -------
+    tuple
+        The SharedMemory block, which the caller must close and unlink when the workers are
+        done, and the picklable description of the map that attach_city_map rebuilds it from.
+    """
+    matrix = city_map.distance_matrix
+    predecessors = city_map.predecessors if with_paths else None
+    matrix_bytes = matrix.buffer.cast('B')
+    paths_offset = len(matrix_bytes) if predecessors is not None else None
+    paths_size = predecessors.itemsize * len(predecessors) if predecessors is not None else 0
+    shared_memory = SharedMemory(create=True, size=max(1, len(matrix_bytes) + paths_size))
+    try:
+        shared_memory.buf[:len(matrix_bytes)] = matrix_bytes
+        if predecessors is not None:
+            shared_memory.buf[paths_offset:paths_offset + paths_size] = memoryview(predecessors).cast('B')
+    finally:
+        matrix_bytes.release()
+    vertex_rows = [(vertex.label, vertex.address, vertex.zipcode) for vertex in city_map.vertex_list]
+    description = (shared_memory.name, isinstance(matrix, PackedDistanceMatrix), matrix.size,
+                   getattr(matrix, 'capacity', matrix.size), vertex_rows,
+                   paths_offset, predecessors.typecode if predecessors is not None else None)
+    return shared_memory, description
+
+
+def attach_city_map(shared_memory_name: str, packed: bool, size: int, capacity: int, vertex_rows: list,
+                    paths_offset: int = None, paths_typecode: str = None):
+    """
+    Rebuilds a city map shared by share_city_map on top of its shared distance matrix.
+
+    Parameters
+    ----------
+    shared_memory_name : str
+        The name of the shared memory block holding the distance matrix.
+    packed : bool
+        True if the block holds a PackedDistanceMatrix, False for a DistanceMatrix.
+    size : int
+        The number of rows (and columns) of the matrix.
+    capacity : int
+        The row stride of a DistanceMatrix (ignored for a PackedDistanceMatrix).
+    vertex_rows : list of tuple
+        (label, address, zipcode) of every vertex, in matrix index order.
+    paths_offset : int, optional
+        Where the shortest-path predecessors of a closure start in the block, if shared.
+    paths_typecode : str, optional
+        The array typecode of the shared predecessors.
+
+    Returns
+    -------
+    tuple
+        The model.Graph, and the SharedMemory block it maps, which must stay open while the graph is used.
+    """
+    shared_memory = SharedMemory(name=shared_memory_name)
+    if packed:
+        matrix = PackedDistanceMatrix.from_buffer(shared_memory.buf[:8 * (size * (size + 1) // 2)], size)
+    else:
+        matrix = DistanceMatrix.from_buffer(shared_memory.buf[:8 * capacity * capacity], size, capacity)
+    city_map = model.Graph(distance_matrix=matrix)
+    for label, address, zipcode in vertex_rows:
+        city_map.add_vertex(model.Vertex(label, address, zipcode))
+    if paths_offset is not None:
+        # a read-only view of the shared predecessors, indexed like the array it was copied from
+        paths_bytes = shared_memory.buf[paths_offset:]
+        item_size = array(paths_typecode).itemsize
+        city_map.predecessors = paths_bytes[:item_size * size * size].cast(paths_typecode)
+    return city_map, shared_memory
+
+
+# Read-only graph shared by the deliveries run in one worker process of simulate_fleet
+_worker_city_map = None
+_worker_shared_memory = None
+
+
+def _init_fleet_worker(*description):
+    """
+    Rebuilds the city map in a worker process of simulate_fleet on top of the shared distance matrix.
+
+    Parameters
+    ----------
+    *description
+        The description of the city map returned by share_city_map.
+    """
+    global _worker_city_map, _worker_shared_memory
+    _worker_city_map, _worker_shared_memory = attach_city_map(*description)
+
+
+def _deliver_in_worker(truck: model.DeliveryTruck, improve_route: bool = False, time_budget: float = 0.05,
+                       deadline_aware: bool = False):
+    """
+    Runs truck_deliver_packages in a worker process of simulate_fleet.
+
+    Returns
+    -------
+    tuple
+        miles traveled, travel delta, route as vertex indices, and (package_id, time_delivered,
+        status_delivered) for every package the truck carried.
+    """
+    carried = list(truck.inventory)
+    truck = truck_deliver_packages(truck, _worker_city_map, improve_route, time_budget, deadline_aware)
+    return truck.miles_traveled, truck.travel_delta, [stop.index for stop in truck.route_list], \
+        [(package.package_id, package.time_delivered, package.status_delivered) for package in carried]
+
+
+def simulate_fleet(trucks: list, city_map: model.Graph, packages: ChainingHashTable, processes: int = None,
+                   improve_route: bool = False, time_budget: float = 0.05, deadline_aware: bool = False):
+    """
+    Delivers the packages of every truck, running the trucks in parallel across a process pool.
+
+    The distance matrix is copied once into shared memory that every worker maps, instead of
+    pickling the Graph for each truck. Each worker sends back only the truck's route and
+    mileage and its packages' delivery status, which are merged into the trucks and
+    the package hash table here. With one process (or one truck) the trucks are delivered
+    in this process instead.
+
+    Parameters
+    ----------
+    trucks : list of model.DeliveryTruck
+        The loaded delivery trucks.
+    city_map : model.Graph
+        The graph object representing the city map.
+    packages : ChainingHashTable
+        The package hash table that holds every package carried by the trucks.
+    processes : int, optional
+        The number of worker processes (default is the number of CPUs).
+    improve_route : bool, optional
+        Whether to improve each truck's route with local search (default is False).
+    time_budget : float, optional
+        The most seconds to spend improving each truck's route (default is 0.05).
+    deadline_aware : bool, optional
+        Whether to plan each truck's route around package deadlines (default is False).
+
+    Returns
+    -------
+    list of model.DeliveryTruck
+        The delivery trucks after completing all deliveries, in the same order.
+    """
+    trucks = list(trucks)
+    if processes == 1 or len(trucks) < 2:
+        return [truck_deliver_packages(truck, city_map, improve_route, time_budget, deadline_aware)
+                for truck in trucks]
+
+    # routes are expanded through the closure paths here, so the workers need only the distances
+    shared_memory, init_args = share_city_map(city_map)
+    try:
+        with Pool(processes, initializer=_init_fleet_worker, initargs=init_args) as pool:
+            results = pool.map(partial(_deliver_in_worker, improve_route=improve_route, time_budget=time_budget,
+                                       deadline_aware=deadline_aware), trucks)
+    finally:
+        shared_memory.close()
+        shared_memory.unlink()
+
+    # Merge each truck's route and its packages' delivery status back into this process
+    for truck, (miles_traveled, travel_delta, route_indices, delivered) in zip(trucks, results):
+        truck.miles_traveled = miles_traveled
+        truck.travel_delta = travel_delta
+        route = [city_map.vertex_list[index] for index in route_indices]
+        truck.route_list = route[:1]
+        for from_vertex, to_vertex in zip(route, route[1:]):
+            truck.route_list.extend(city_map.path_between(from_vertex, to_vertex)[1:])
+        truck.current_address = truck.route_list[-1]
+        truck.inventory = []
+        truck.manifest = packages.get_many(package_id for package_id, _, _ in delivered)
+        for package, (_, time_delivered, status_delivered) in zip(truck.manifest, delivered):
+            package.time_delivered = time_delivered
+            package.status_delivered = status_delivered
+
+    return trucks
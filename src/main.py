@@ -30,21 +30,74 @@ __copyright__ = """Copyright 2023 Joseph Curtis
 #          Lysecky, R., & Vahid, F. (2018, June).
 #          C950: Data Structures and Algorithms II. zyBooks.
 #           [https://learn.zybooks.com/zybook/WGUC950AY20182019]
+import asyncio
 import csv
+import sys
 from argparse import ArgumentParser
 from datetime import datetime
 
+import profiling
 import view
-from model import Vertex, Graph, PackageWGUPS
-from controller import load_trucks_manual, truck_deliver_packages
-from utilities import ChainingHashTable
+from model import Vertex, Graph, PackageWGUPS, PackageStore, DeliveryTruck, PackageStatusTimeline, address_key
+from controller import late_packages, load_trucks_auto, load_trucks_clustered, load_trucks_manual, simulate_fleet
+from utilities import ChainingHashTable, PackedDistanceMatrix
+from server import StatusService, serve
+from simulation import apply_package_updates, simulate_fleet_events
+from table_cache import file_hash, read_table_cache, write_table_cache
 
 parser = ArgumentParser(description='Process Daily Local Deliveries.')
 parser.add_argument('--table', '-t', required=False, default='data/distance-table.csv',
                     help='The file used for the distance table that describes the distances to each node')
 parser.add_argument('--packages', '-p', required=False, default='data/package-file.csv',
                     help='The file that includes all packages that will be delivered in the same day.')
-args = parser.parse_args()
+parser.add_argument('--cache', '-c', required=False, default=None,
+                    help='The compiled distance table cache file (default is the table file name + ".cache")')
+parser.add_argument('--no-cache', required=False, action='store_true',
+                    help='Always parse the distance table CSV, without reading or writing the cache.')
+parser.add_argument('--auto-load', required=False, action='store_true',
+                    help='Load the trucks automatically by destination and deadline instead of the manual lists.')
+parser.add_argument('--cluster', required=False, choices=('sweep', 'kmeans'), default=None,
+                    help='Load the trucks by partitioning the packages into capacity-feasible clusters '
+                         '(sweep around the hub, or k-means) instead of the manual lists.')
+parser.add_argument('--improve-routes', required=False, action='store_true',
+                    help='Shorten each nearest-neighbor truck route with 2-opt and Or-opt local search.')
+parser.add_argument('--route-time-budget', required=False, type=float, default=0.05,
+                    help='The most seconds spent improving each truck route (default is 0.05).')
+parser.add_argument('--deadline-aware', required=False, action='store_true',
+                    help='Plan each truck route by deadline-feasible insertion instead of nearest neighbor.')
+parser.add_argument('--processes', required=False, type=int, default=1,
+                    help='The number of worker processes used to deliver the trucks in parallel (default is 1).')
+parser.add_argument('--columnar', required=False, action='store_true',
+                    help='Keep the packages in a column-oriented PackageStore instead of a hash table.')
+parser.add_argument('--profile', required=False, action='store_true',
+                    help='Print stage timings and lookup counters to stderr when the program exits.')
+parser.add_argument('--profile-json', required=False, default=None, metavar='FILE',
+                    help='Write stage timings and lookup counters to FILE as JSON ("-" for stdout) on exit.')
+parser.add_argument('--event-driven', required=False, action='store_true',
+                    help='Simulate the day as events: both trucks leave at 8:00 and reload automatically on return.')
+parser.add_argument('--report-times', required=False, nargs='+', default=None, metavar='HHMM',
+                    help='Write the package statuses at these times (HHMM) and exit, instead of showing the menu.')
+parser.add_argument('--report-packages', required=False, nargs='+', default=['all'], metavar='ID',
+                    help='The package IDs to report with --report-times, or "all" (default).')
+parser.add_argument('--report-format', required=False, choices=('csv', 'json'), default='csv',
+                    help='The format of the --report-times output (default is csv).')
+parser.add_argument('--report-output', required=False, default='-', metavar='FILE',
+                    help='The file --report-times writes to (default is "-", standard output).')
+parser.add_argument('--updates', '-u', required=False, default=None, metavar='FILE',
+                    help='A CSV file of package delays and address corrections learned during the day '
+                         '(columns: Time, Package ID, Address, Zip, Arrival); the affected trucks are re-planned.')
+parser.add_argument('--serve', required=False, action='store_true',
+                    help='Answer package status queries over HTTP instead of showing the menu.')
+parser.add_argument('--host', required=False, default='127.0.0.1',
+                    help='The address --serve listens on (default is 127.0.0.1).')
+parser.add_argument('--port', required=False, type=int, default=8080,
+                    help='The TCP port --serve listens on (default is 8080).')
+# Exceptions of the sample day's package file (see load_package_data)
+SAMPLE_DAY_DELAYED_IDS = (6, 25, 28, 32)
+SAMPLE_DAY_WRONG_ADDRESS_ID = 9
+
+# Imported as a module (e.g. by the benchmarks), the command line belongs to the importer: use the defaults
+args = parser.parse_args() if __name__ == '__main__' else parser.parse_args([])
 
 
 def main():
@@ -58,31 +111,150 @@ def main():
     Returns:
         None
     """
+    if args.report_times:
+        report_times, package_ids = parse_report_arguments(args.report_times, args.report_packages)
+
+    if args.profile or args.profile_json:
+        profiling.enable()
+
     # Load distance data, package data, and hub address
-    salt_lake_city_graph, vertex_list, hub_address = load_distance_data()
-    all_packages_hash_table = load_package_data(vertex_list)
+    with profiling.stage('load_distance_data'):
+        if args.no_cache:
+            salt_lake_city_graph, vertex_list, hub_address = load_distance_data()
+        else:
+            salt_lake_city_graph, vertex_list, hub_address = load_cached_distance_data()
+        if not salt_lake_city_graph.is_complete():
+            # Missing table cells are routed through other addresses instead of being unreachable
+            salt_lake_city_graph = salt_lake_city_graph.shortest_path_closure()
+            if not salt_lake_city_graph.is_complete():
+                parser.error('--table: some addresses cannot be reached from the others')
+    with profiling.stage('load_package_data'):
+        address_index = build_address_index(vertex_list)
+        all_packages_hash_table = load_package_data(vertex_list, address_index, args.columnar)
+        # Packages that cannot be routed would fail the loaders and the route planning later on
+        if any(package.destination.index is None for _, package in all_packages_hash_table):
+            parser.error('--packages: every package address must be in the distance table '
+                         + args.table + ' (see the package IDs above)')
+        if args.updates:
+            updates = load_package_updates(args.updates, all_packages_hash_table, vertex_list, address_index)
 
     # Create trucks to deliver packages
     # Load each truck with packages, and determine route
-    truck1a, truck1b, truck2a, truck2b = load_trucks_manual(hub_address, all_packages_hash_table)
-
-    # Deliver packages using the created trucks
-    truck1a = truck_deliver_packages(truck1a, salt_lake_city_graph)
-    truck2a = truck_deliver_packages(truck2a, salt_lake_city_graph)
-    truck1b = truck_deliver_packages(truck1b, salt_lake_city_graph)
-    truck2b = truck_deliver_packages(truck2b, salt_lake_city_graph)
-
-    # Store trucks in a list
-    truck_list = [truck1a, truck1b, truck2a, truck2b]
-
-    # Show main menu to hand off control
-    view.main_menu(all_packages_hash_table, truck_list)
+    if args.event_driven:
+        with profiling.stage('simulate_fleet_events'):
+            truck_list = simulate_fleet_events([DeliveryTruck(hub_address, "Truck 1"),
+                                                DeliveryTruck(hub_address, "Truck 2")],
+                                               salt_lake_city_graph,
+                                               (package for _, package in all_packages_hash_table),
+                                               args.improve_routes, args.route_time_budget, args.deadline_aware)
+    else:
+        with profiling.stage('load_trucks'):
+            if args.cluster:
+                truck1a, truck1b, truck2a, truck2b = load_trucks_clustered(hub_address, all_packages_hash_table,
+                                                                           salt_lake_city_graph, args.cluster)
+            elif args.auto_load:
+                truck1a, truck1b, truck2a, truck2b = load_trucks_auto(hub_address, all_packages_hash_table,
+                                                                      salt_lake_city_graph)
+            else:
+                truck1a, truck1b, truck2a, truck2b = load_trucks_manual(hub_address, all_packages_hash_table)
+
+        # Deliver packages using the created trucks
+        with profiling.stage('simulate_fleet'):
+            truck1a, truck2a, truck1b, truck2b = simulate_fleet([truck1a, truck2a, truck1b, truck2b],
+                                                                salt_lake_city_graph, all_packages_hash_table,
+                                                                args.processes, args.improve_routes,
+                                                                args.route_time_budget, args.deadline_aware)
+
+        # Store trucks in a list
+        truck_list = [truck1a, truck1b, truck2a, truck2b]
+
+    # Re-plan the trucks hit by the delays and address corrections learned during the day
+    if args.updates:
+        with profiling.stage('apply_package_updates'):
+            left_at_hub = apply_package_updates(truck_list, salt_lake_city_graph, updates, args.improve_routes,
+                                                args.route_time_budget, args.deadline_aware)
+        if left_at_hub:
+            print('Warning: ' + str(len(left_at_hub)) + ' package(s) now reach the hub after their truck departs '
+                  'and were not delivered, package ID: '
+                  + ', '.join(str(package.package_id) for package in left_at_hub), file=sys.stderr)
+
+    # Report packages that missed their deadline
+    late = late_packages(all_packages_hash_table)
+    if late:
+        print('Warning: ' + str(len(late)) + ' package(s) delivered after their deadline, package ID: '
+              + ', '.join(str(package.package_id) for package in late), file=sys.stderr)
+
+    # Index when each package changes status, for the time-based menu queries
+    with profiling.stage('PackageStatusTimeline'):
+        timeline = PackageStatusTimeline(package for _, package in all_packages_hash_table)
+
+    # Show main menu to hand off control; the menu ends the program with sys.exit
+    try:
+        if args.report_times:
+            if package_ids is not None:
+                unknown_ids = [str(package_id) for package_id in package_ids
+                               if all_packages_hash_table.get(package_id) is None]
+                if unknown_ids:
+                    parser.error('--report-packages: no package with ID ' + ', '.join(unknown_ids))
+            with profiling.stage('write_status_reports'):
+                view.write_status_reports(all_packages_hash_table, timeline, report_times, package_ids,
+                                          args.report_output, args.report_format)
+            return
+        if args.serve:
+            try:
+                asyncio.run(serve(StatusService(all_packages_hash_table, truck_list, timeline),
+                                  args.host, args.port))
+            except KeyboardInterrupt:
+                pass
+            return
+        view.main_menu(all_packages_hash_table, truck_list, timeline)
+    finally:
+        if profiling.enabled:
+            profiling.disable()
+            profiling.report(args.profile_json)
+
+
+def parse_report_arguments(time_texts: list, package_texts: list):
+    """
+    Validates the --report-times and --report-packages arguments, exiting with a usage error if invalid.
 
+    Parameters
+    ----------
+    time_texts : list of str
+        The report times in HHMM format.
+    package_texts : list of str
+        The package IDs to report, or ['all'].
 
-def load_distance_data():
+    Returns
+    -------
+    tuple
+        (list of datetime.time, list of int package IDs or None for all packages)
+    """
+    try:
+        report_times = [view.parse_report_time(text) for text in time_texts]
+    except ValueError:
+        parser.error('--report-times: times must be in HHMM format, example: 1325 for 1:25pm')
+    if [text.lower() for text in package_texts] == ['all']:
+        return report_times, None
+    try:
+        return report_times, [int(text) for text in package_texts]
+    except ValueError:
+        parser.error('--report-packages: expected package IDs (integers) or "all"')
+
+
+def load_distance_data(table_file: str = None):
     """
     Load distance data from a CSV file and create a graph representing each address as a Vertex.
 
+    The table is streamed row by row: the header gives the number of addresses, so the
+    packed lower-triangle matrix is allocated once and each row's distances are parsed
+    straight into it. No intermediate copy of the table is built.
+
+    Parameters
+    ----------
+    table_file : str, optional
+        The distance table CSV file. Defaults to the --table command line argument.
+
     Returns
     -------
     salt_lake_city_graph : Graph
@@ -92,16 +264,15 @@ def load_distance_data():
     hub_address : Vertex
         Starting point address where warehouse is located
     """
-    salt_lake_city_graph = Graph()
-    vertex_list = list()
-
     # Open the CSV file and read the distance table
-    with open(args.table, 'r') as distance_file:
+    with open(table_file or args.table, 'r') as distance_file:
         d_table = csv.reader(distance_file, delimiter=',')
-        next(d_table, None)  # skip the first row (column labels) in the table
+        header = next(d_table)  # first row (column labels): LABEL, ADDRESS, then one column per address
+
+        # The table is symmetric, so only the lower triangle is stored
+        salt_lake_city_graph = Graph(distance_matrix=PackedDistanceMatrix(len(header) - 2))
 
-        row_index = 0
-        for row in d_table:
+        for row_index, row in enumerate(d_table):
             # Extract the label, address and zip code from the row
             # full address is in row[1]
             label = row[0]
@@ -111,37 +282,20 @@ def load_distance_data():
             zipcode = row[1][start_zip + 2:end_zip]
 
             # Create a new vertex and add it to the graph
-            new_vertex = Vertex(label, address, zipcode)
-            vertex_list.append(new_vertex)
-            salt_lake_city_graph.add_vertex(new_vertex)
-
-            # If this is the first row, create an empty distance array
-            if row_index == 0:
-                dist_array = [[] for _ in range(len(row) - 2)]
-
-            col_index = 0
-            # Add the distances to the distance array
-            for value in row[2:]:
-                if value == '':
-                    dist_array[row_index].append(None)
-                else:
-                    dist_array[row_index].append(float(value))
-                col_index += 1
-
-            row_index += 1
+            salt_lake_city_graph.add_vertex(Vertex(label, address, zipcode))
 
-    # Make sure the vertex list and distance array have the same length
-    assert len(vertex_list) == len(dist_array)
+            # Add the distances up to and including the diagonal; an empty cell means no edge
+            distances = row[2:row_index + 3]
+            try:
+                salt_lake_city_graph.distance_matrix.set_row(row_index, map(float, distances))
+            except ValueError:
+                salt_lake_city_graph.distance_matrix.set_row(
+                    row_index, (float(value) if value != '' else PackedDistanceMatrix.NO_EDGE
+                                for value in distances))
 
-    # Add the vertices from the list, and distances from 2-dim array:
-    # Add the distances to the graph
-    for i in range(len(dist_array)):
-        for j in range(len(dist_array[i])):
-            if j > i:
-                # Since the distance matrix is symmetric, fill in the other half of the matrix
-                dist_array[i][j] = dist_array[j][i]
-            # Add a directed edge between the two vertices with the distance as the weight
-            salt_lake_city_graph.add_directed_edge(vertex_list[i], vertex_list[j], dist_array[i][j])
+    vertex_list = salt_lake_city_graph.vertex_list
+    # Make sure every address in the header has a row
+    assert len(vertex_list) == salt_lake_city_graph.distance_matrix.size
 
     # Set the hub vertex
     hub_address = vertex_list[0]
@@ -149,58 +303,217 @@ def load_distance_data():
     return salt_lake_city_graph, vertex_list, hub_address
 
 
-def load_package_data(vertex_list):
+def load_cached_distance_data(table_file: str = None, cache_file: str = None):
+    """
+    Load distance data from the compiled cache of a distance table, building the cache if needed.
+
+    The cache is rebuilt whenever the SHA-256 digest of the CSV no longer matches the one
+    recorded in the cache. Otherwise its distance matrix is memory-mapped, not parsed.
+
+    Parameters
+    ----------
+    table_file : str, optional
+        The distance table CSV file. Defaults to the --table command line argument.
+    cache_file : str, optional
+        The cache file. Defaults to the --cache command line argument, or the table file name + ".cache".
+
+    Returns
+    -------
+    salt_lake_city_graph : Graph
+        A graph of all destination address vertexes with distance data
+    vertex_list : list of Vertex
+        An array of all package destinations
+    hub_address : Vertex
+        Starting point address where warehouse is located
+    """
+    table_file = table_file or args.table
+    cache_file = cache_file or args.cache or table_file + '.cache'
+    source_hash = file_hash(table_file)
+
+    salt_lake_city_graph = read_table_cache(cache_file, source_hash)
+    if salt_lake_city_graph is None:
+        salt_lake_city_graph, vertex_list, hub_address = load_distance_data(table_file)
+        try:
+            write_table_cache(cache_file, salt_lake_city_graph, source_hash)
+        except OSError as error:
+            print('Could not write distance table cache ' + cache_file + ': ' + str(error))
+        return salt_lake_city_graph, vertex_list, hub_address
+
+    vertex_list = salt_lake_city_graph.vertex_list
+    return salt_lake_city_graph, vertex_list, vertex_list[0]
+
+
+def build_address_index(vertex_list):
+    """
+    Builds a hashed index from normalized (address, zipcode) to position in the vertex list.
+
+    Parameters
+    ----------
+    vertex_list : list
+        List of Vertex objects representing delivery addresses.
+
+    Returns
+    -------
+    address_index : dict
+        {address_key(address, zipcode): index into vertex_list}
+    """
+    return {address_key(node.address, node.zipcode): index for index, node in enumerate(vertex_list)}
+
+
+def load_package_updates(update_file: str, packages, vertex_list, address_index=None) -> list:
+    """
+    Reads the package delays and address corrections learned during the day from a CSV file.
+
+    Each row after the column labels holds the time the change became known (HHMM), the
+    package ID, the corrected address and zip code (both empty if unchanged), and the new
+    time the package reaches the hub (HHMM, empty if unchanged).
+
+    Parameters
+    ----------
+    update_file : str
+        The update CSV file.
+    packages : ChainingHashTable or PackageStore
+        The packages of the day, keyed by package ID.
+    vertex_list : list
+        List of Vertex objects representing delivery addresses.
+    address_index : dict, optional
+        Index from build_address_index(vertex_list). Built here if not given.
+
+    Returns
+    -------
+    list of tuple
+        (update time, package, new destination or None, new hub arrival time or None) per row,
+        as taken by simulation.apply_package_updates.
+    """
+    if address_index is None:
+        address_index = build_address_index(vertex_list)
+    updates = []
+    with open(update_file, 'r') as updates_csv:
+        update_table = csv.reader(updates_csv, delimiter=',')
+        next(update_table, None)  # skip the first row (column labels) in the table
+        for line_number, row in enumerate(update_table, start=2):
+            if not row:
+                continue
+            try:
+                update_time_text, package_id, address, zipcode, arrival_text = (row + [''] * 5)[:5]
+                update_time = view.parse_report_time(update_time_text)
+                time_arrived = view.parse_report_time(arrival_text) if arrival_text.strip() else None
+                package = packages.get(int(package_id))
+            except ValueError:
+                parser.error('--updates: line ' + str(line_number) + ' of ' + update_file
+                             + ' needs a time (HHMM), a package ID, an address, a zip code and an arrival (HHMM)')
+            if package is None:
+                parser.error('--updates: no package with ID ' + package_id + ' (line ' + str(line_number) + ')')
+            destination = None
+            if address.strip() or zipcode.strip():
+                node_index = address_index.get(address_key(address, zipcode))
+                if node_index is None:
+                    parser.error('--updates: address ' + address + ' ' + zipcode + ' is not in the distance table '
+                                 '(line ' + str(line_number) + ')')
+                destination = vertex_list[node_index]
+            updates.append((update_time, package, destination, time_arrived))
+    return updates
+
+
+def load_package_data(vertex_list, address_index=None, columnar=False, package_file=None, sample_day=True):
     """
     Reads package data from a CSV file and creates PackageWGUPS objects for each package.
 
+    With sample_day, the exceptions of the sample day's manifest are applied: packages
+    SAMPLE_DAY_DELAYED_IDS arrive late on a delayed flight and package SAMPLE_DAY_WRONG_ADDRESS_ID
+    waits for its address to be corrected. Without it, every package is at the hub at 8:00.
+
+    With columnar, the packages are stored column by column in a PackageStore instead.
+
+    Each package address is resolved to its Vertex with one lookup in the address index.
+    Packages whose address is not in the distance table are reported on standard error, and
+    get an 'unknown' Vertex without an index; callers must leave them out of truck loading
+    (as batch.plan_day does) or stop (as main does).
+
     Parameters
     ----------
     vertex_list : list
         List of Vertex objects representing delivery addresses.
         This should be all vertexes in the main salt_lake_city_graph
+    address_index : dict, optional
+        Index from build_address_index(vertex_list). Built here if not given.
+    columnar : bool, optional
+        Whether to return a PackageStore instead of a hash table of PackageWGUPS (default is False).
+    package_file : str, optional
+        The package CSV file. Defaults to the --packages command line argument.
+    sample_day : bool, optional
+        Whether to apply the sample day's delayed and wrong-address packages (default is True).
 
     Returns
     -------
-    all_packages_hashtable : ChainingHashTable
+    all_packages_hashtable : ChainingHashTable or PackageStore
         A hashtable of all packages at the beginning of delivery day, with package ID as keys.
     """
-    all_packages_hashtable = ChainingHashTable(41)
-    with open(args.packages, 'r') as package_file:
-        pak_table = csv.reader(package_file, delimiter=',')
+    if address_index is None:
+        address_index = build_address_index(vertex_list)
+    unresolved_ids = []
+
+    package_records = []
+    package_store = PackageStore(vertex_list) if columnar else None
+    deadlines = {}
+    hub_arrival = datetime.strptime('08:00', '%H:%M').time()
+    delayed_arrival = datetime.strptime('09:05', '%H:%M').time()
+    corrected_arrival = datetime.strptime('10:20', '%H:%M').time()
+    with open(package_file or args.packages, 'r') as packages_csv:
+        pak_table = csv.reader(packages_csv, delimiter=',')
         next(pak_table, None)  # skip the first row (column labels) in the table
         for row in pak_table:
             package_id = int(row[0])
 
-            address_lbl = Vertex('unknown', row[1], row[4])
-            destination = address_lbl
-            for node in vertex_list:
-                if node == address_lbl:
-                    destination = node
+            node_index = address_index.get(address_key(row[1], row[4]))
+            if node_index is None:
+                destination = Vertex('unknown', row[1], row[4])
+                unresolved_ids.append(package_id)
+            else:
+                destination = vertex_list[node_index]
 
             city = row[2]
             state = row[3]
             deadline_str = row[5]
 
-            if row[5] == 'EOD':
-                deadline = datetime.strptime('23:59:59.999999', '%H:%M:%S.%f').time()
-            else:
-                deadline = datetime.strptime(row[5], '%I:%M %p').time()
+            # packages with the same deadline share one parsed time
+            deadline = deadlines.get(deadline_str)
+            if deadline is None:
+                if deadline_str == 'EOD':
+                    deadline = datetime.strptime('23:59:59.999999', '%H:%M:%S.%f').time()
+                else:
+                    deadline = datetime.strptime(deadline_str, '%I:%M %p').time()
+                deadlines[deadline_str] = deadline
             mass_lb = float(row[6])
             note = row[7]
 
-            if package_id in [6, 25, 28, 32]:
+            if sample_day and package_id in SAMPLE_DAY_DELAYED_IDS:
                 status = "Delayed on flight"
-                time_arrived = datetime.strptime('09:05', '%H:%M').time()
-            elif package_id == 9:
+                time_arrived = delayed_arrival
+            elif sample_day and package_id == SAMPLE_DAY_WRONG_ADDRESS_ID:
                 status = "Wrong address listed"
-                time_arrived = datetime.strptime('10:20', '%H:%M').time()
+                time_arrived = corrected_arrival
             else:
                 status = "waiting at HUB"
-                time_arrived = datetime.strptime('08:00', '%H:%M').time()
+                time_arrived = hub_arrival
 
+            if columnar:
+                package_store.add(package_id, city, state, mass_lb, note, destination,
+                                  deadline_str, deadline, status, time_arrived)
+                continue
             package = PackageWGUPS(package_id, city, state, mass_lb, note, destination,
                                    deadline_str, deadline, status, time_arrived)
-            all_packages_hashtable.insert(package_id, package)
+            package_records.append((package_id, package))
+
+    if columnar:
+        all_packages_hashtable = package_store
+    else:
+        all_packages_hashtable = ChainingHashTable(41)
+        all_packages_hashtable.insert_many(package_records)
+
+    if unresolved_ids:
+        print('Warning: ' + str(len(unresolved_ids)) + ' package(s) have an address not found in the distance table, '
+              'package ID: ' + ', '.join(str(package_id) for package_id in unresolved_ids), file=sys.stderr)
 
     return all_packages_hashtable
 
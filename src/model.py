@@ -20,9 +20,19 @@ __copyright__ = """Copyright 2023 Joseph Curtis
 """
 
 # Date: 29 Apr 2023
+from array import array
+from bisect import bisect_right
 from datetime import datetime, timedelta
+import heapq
+from sys import intern
 from typing import Optional
 
+from utilities import DistanceMatrix, PackedDistanceMatrix
+
+# Default package times, shared by every package that uses them
+START_OF_DAY = datetime.strptime('08:00', '%H:%M').time()
+END_OF_DAY = datetime.strptime('23:59:59.999999', '%H:%M:%S.%f').time()
+
 
 class Vertex:
     """
@@ -40,7 +50,16 @@ class Vertex:
         The distance from the starting vertex (default is infinity).
     prev_vertex : Vertex
         A Vertex object representing the previous vertex in the shortest path to this vertex.
+    index : int
+        Position of this vertex in its Graph's distance matrix (None until added to a Graph).
+        A vertex keeps the same index for life, so it can only be shared by graphs that give
+        it the same position, e.g. a graph and its shortest_path_closure.
+
+    The label, address and zipcode are not expected to change once the vertex is made:
+    its hash is computed from them once, at construction.
     """
+    __slots__ = ('label', 'address', 'zipcode', 'distance', 'prev_vertex', 'index', '_hash')
+
     def __init__(self, label: str, address: str, zipcode: str = ''):
         """
         Initializes a new Vertex object.
@@ -59,6 +78,21 @@ class Vertex:
         self.zipcode = zipcode
         self.distance = float('inf')
         self.prev_vertex = None
+        self.index = None
+        self._hash = hash(label + address + zipcode)
+
+    def __getstate__(self):
+        """
+        Returns the attributes to pickle; the hash is left out, as string hashes differ between processes.
+        """
+        return self.label, self.address, self.zipcode, self.distance, self.prev_vertex, self.index
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled Vertex and recomputes its hash in this process.
+        """
+        self.label, self.address, self.zipcode, self.distance, self.prev_vertex, self.index = state
+        self._hash = hash(self.label + self.address + self.zipcode)
 
     def __eq__(self, other):
         """
@@ -87,7 +121,7 @@ class Vertex:
         int
             The hash value of the object.
         """
-        return hash(self.label + self.address + self.zipcode)
+        return self._hash
 
     def __repr__(self):
         """
@@ -112,6 +146,103 @@ class Vertex:
         return f'({self.label}: {self.address}; {self.zipcode})'
 
 
+class EdgeWeights:
+    """
+    A dictionary-style adapter over a Graph's distance matrix.
+
+    Keeps the ``{(vertex_a, vertex_b): weight}`` interface of the original edge
+    dictionary while storing every weight in the Graph's DistanceMatrix.
+
+    Parameters
+    ----------
+    graph : Graph
+        The graph whose distance matrix is exposed.
+    """
+    def __init__(self, graph: 'Graph'):
+        """
+        Initializes the adapter for the given graph.
+
+        Parameters
+        ----------
+        graph : Graph
+            The graph whose distance matrix is exposed.
+        """
+        self._graph = graph
+
+    def __getitem__(self, key):
+        """
+        Returns the weight of the edge (vertex_a, vertex_b).
+
+        Raises
+        ------
+        KeyError
+            If either vertex is not in the graph or the edge has no weight.
+        """
+        vertex_a, vertex_b = key
+        if vertex_a.index is None or vertex_b.index is None:
+            raise KeyError(key)
+        weight = self._graph.distance_matrix[vertex_a.index, vertex_b.index]
+        if weight == DistanceMatrix.NO_EDGE:
+            raise KeyError(key)
+        return weight
+
+    def __setitem__(self, key, value):
+        """
+        Sets the weight of the edge (vertex_a, vertex_b).
+        """
+        vertex_a, vertex_b = key
+        self._graph.distance_matrix[vertex_a.index, vertex_b.index] = value
+
+    def __contains__(self, key):
+        """
+        Returns True if the edge (vertex_a, vertex_b) has a weight.
+        """
+        try:
+            self[key]
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __iter__(self):
+        """
+        Iterates over the (vertex_a, vertex_b) keys of all weighted edges.
+        """
+        return (key for key, _ in self.items())
+
+    def __len__(self):
+        """
+        Returns the number of weighted edges.
+        """
+        return sum(1 for _ in self.items())
+
+    def __repr__(self):
+        """
+        Returns the edges as a dictionary string.
+        """
+        return repr(dict(self.items()))
+
+    def get(self, key, default=None):
+        """
+        Returns the weight of the edge, or default if it has none.
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        """
+        Yields ((vertex_a, vertex_b), weight) for every weighted edge, in vertex order.
+        """
+        vertex_list = self._graph.vertex_list
+        for vertex_a in vertex_list:
+            row = self._graph.distance_matrix.row(vertex_a.index)
+            for vertex_b in vertex_list:
+                weight = row[vertex_b.index]
+                if weight != DistanceMatrix.NO_EDGE:
+                    yield (vertex_a, vertex_b), weight
+
+
 class Graph:
     """
     A class representing a graph.
@@ -119,9 +250,16 @@ class Graph:
     Attributes
     ----------
     adjacency_list : dict
-        The graph's vertices and their neighbors.
-    edge_weights : dict
-        The graph's edges and their weights.
+        The graph's vertices and the neighbors added with add_directed_edge.
+    vertex_list : list
+        The graph's vertices, in the order of their distance matrix index.
+    distance_matrix : DistanceMatrix or PackedDistanceMatrix
+        The weights of the graph's edges, addressed by vertex index.
+    edge_weights : EdgeWeights
+        The graph's edges and their weights, as a dictionary-style view of distance_matrix.
+    predecessors : array, optional
+        For a graph made by shortest_path_closure: entry [i * n + j] is the index of the vertex
+        before vertex j on the shortest path from vertex i (-1 if none); otherwise None.
 
     Methods
     -------
@@ -131,22 +269,47 @@ class Graph:
         Adds a new directed edge to the graph with a given weight.
     add_undirected_edge(vertex_a: Vertex, vertex_b: Vertex, weight=1.0):
         Adds a new undirected edge to the graph with a given weight.
+    add_edges(edges, directed=False):
+        Adds a list of weighted edges to the graph.
+    dijkstra_shortest_path(start_vertex: Vertex):
+        Sets every vertex's distance and prev_vertex along the shortest paths from start_vertex.
+    shortest_path_closure() -> Graph:
+        Returns a complete graph of the shortest path distances between every pair of vertices.
+    path_between(from_vertex: Vertex, to_vertex: Vertex) -> list:
+        Returns the vertices along the path driven between two vertices.
     """
-    def __init__(self, adjacency_list=None, edge_weights=None):
+    def __init__(self, adjacency_list=None, edge_weights=None, distance_matrix=None):
         """
-        Initializes a Graph object with an empty adjacency list and edge weights dictionary.
+        Initializes a Graph object with an empty adjacency list and distance matrix.
 
         Parameters
         ----------
         adjacency_list : dict, optional
-            A dictionary to store the vertices and their neighbors.
+            A dictionary of vertices and their neighbors to start from.
         edge_weights : dict, optional
-            A dictionary to store the weights of the edges.
+            A dictionary of {(vertex_a, vertex_b): weight} edges to start from.
+        distance_matrix : DistanceMatrix or PackedDistanceMatrix, optional
+            A preallocated matrix to store the weights in. Row i belongs to the i-th vertex added.
         """
-        if adjacency_list is None:
-            self.adjacency_list = {}  # vertex dictionary {key:value}
-        if edge_weights is None:
-            self.edge_weights = {}  # edge dictionary {key:value}
+        self.adjacency_list = {}  # vertex dictionary {key:value}
+        self.vertex_list = []
+        self.distance_matrix = DistanceMatrix() if distance_matrix is None else distance_matrix
+        self.edge_weights = EdgeWeights(self)  # edge dictionary view {key:value}
+        self.predecessors = None
+        self._edge_lists = None
+
+        if (adjacency_list or edge_weights) and isinstance(self.distance_matrix, DistanceMatrix):
+            # every vertex gets a row: allocate them at once instead of doubling
+            self.distance_matrix.reserve(len(set(adjacency_list or {}).union(*(adjacency_list or {}).values(),
+                                                                             *(edge_weights or {}))))
+        for vertex, neighbors in (adjacency_list or {}).items():
+            self.add_vertex(vertex)
+            for neighbor in neighbors:
+                self.add_vertex(neighbor)
+        for (from_vertex, to_vertex), weight in (edge_weights or {}).items():
+            self.add_vertex(from_vertex)
+            self.add_vertex(to_vertex)
+            self.add_directed_edge(from_vertex, to_vertex, weight)
 
     def __repr__(self):
         """
@@ -177,15 +340,29 @@ class Graph:
 
     def add_vertex(self, new_vertex: Vertex):
         """
-        Adds a new vertex to the graph.
+        Adds a new vertex to the graph and assigns it the next distance matrix index.
 
         Parameters
         ----------
         new_vertex : Vertex
             The new vertex to be added to the graph.
+
+        Raises
+        ------
+        ValueError
+            If the vertex already has a different index in another graph; reassigning it would
+            break every lookup of the vertex in that graph.
         """
         if not (new_vertex in self.adjacency_list):
+            if new_vertex.index is not None and new_vertex.index != len(self.vertex_list):
+                raise ValueError(str(new_vertex) + ' already has index ' + str(new_vertex.index)
+                                 + ' in another Graph; add a copy of it instead')
             self.adjacency_list[new_vertex] = []  # {vertex_1: [], vertex_2: [], ...}
+            new_vertex.index = len(self.vertex_list)
+            self.vertex_list.append(new_vertex)
+            if len(self.vertex_list) > self.distance_matrix.size:
+                self.distance_matrix.resize(len(self.vertex_list))
+            self._edge_lists = None
 
     def add_directed_edge(self, from_vertex: Vertex, to_vertex: Vertex, weight=1.0):
         """
@@ -200,10 +377,11 @@ class Graph:
         weight : float, optional
             The weight of the edge. Default is 1.0.
         """
-        self.edge_weights[(from_vertex, to_vertex)] = weight
-        # {(vertex_1,vertex_2): 484, (vertex_1,vertex_3): 626, (vertex_2,vertex_6): 1306, ...}
+        self.distance_matrix[from_vertex.index, to_vertex.index] = weight
+        # [[0.0, 484, 626, ...], [484, 0.0, 1306, ...], ...] addressed by vertex index
         self.adjacency_list[from_vertex].append(to_vertex)
         # {vertex_1: [vertex_2, vertex_3], vertex_2: [vertex_6], ...}
+        self._edge_lists = None
 
     def add_undirected_edge(self, vertex_a: Vertex, vertex_b: Vertex, weight=1.0):
         """Adds an undirected edge between vertex_a and vertex_b to the graph.
@@ -220,6 +398,158 @@ class Graph:
         self.add_directed_edge(vertex_a, vertex_b, weight)
         self.add_directed_edge(vertex_b, vertex_a, weight)
 
+    def add_edges(self, edges, directed: bool = False):
+        """
+        Adds a list of weighted edges to the graph, adding their vertices first if needed.
+
+        Parameters
+        ----------
+        edges : Iterable[Tuple[Vertex, Vertex, float]]
+            (vertex_a, vertex_b, weight) for every edge, e.g. the road segments of a sparse road graph.
+        directed : bool, optional
+            Whether each edge only goes from vertex_a to vertex_b. Default is False.
+        """
+        for vertex_a, vertex_b, weight in edges:
+            self.add_vertex(vertex_a)
+            self.add_vertex(vertex_b)
+            if directed:
+                self.add_directed_edge(vertex_a, vertex_b, weight)
+            else:
+                self.add_undirected_edge(vertex_a, vertex_b, weight)
+
+    def is_complete(self) -> bool:
+        """
+        Returns True if there is an edge between every ordered pair of vertices.
+        """
+        matrix = self.distance_matrix
+        if isinstance(matrix, PackedDistanceMatrix):
+            # the packed triangle has no unused cells
+            return DistanceMatrix.NO_EDGE not in matrix.buffer
+        # a grown DistanceMatrix has unused capacity after each row, filled with NO_EDGE
+        return all(DistanceMatrix.NO_EDGE not in matrix.row(index) for index in range(len(matrix)))
+
+    def edge_lists(self) -> list:
+        """
+        Returns the outgoing edges of every vertex, as [(neighbor index, weight), ...] per vertex index.
+
+        The edges of every vertex are the weighted cells of its distance matrix row, which
+        holds the edges added with add_directed_edge as well as those loaded in bulk from a
+        distance table. The lists are cached until the next vertex or edge is added.
+        """
+        if self._edge_lists is None:
+            matrix = self.distance_matrix
+            no_edge = DistanceMatrix.NO_EDGE
+            size = len(self.vertex_list)
+            self._edge_lists = []
+            for vertex in self.vertex_list:
+                row = matrix.row(vertex.index)
+                self._edge_lists.append([(index, row[index]) for index in range(size)
+                                         if index != vertex.index and row[index] != no_edge])
+        return self._edge_lists
+
+    def dijkstra_shortest_path(self, start_vertex: Vertex):
+        """
+        Finds the shortest paths from start_vertex to every vertex, with Dijkstra's algorithm on a binary heap.
+
+        Sets each vertex's distance (infinity if unreachable) and prev_vertex (the vertex before
+        it on the shortest path, None for start_vertex and unreachable vertices).
+
+        Parameters
+        ----------
+        start_vertex : Vertex
+            The vertex the paths start from.
+        """
+        for vertex in self.vertex_list:
+            vertex.distance = float('inf')
+            vertex.prev_vertex = None
+        start_vertex.distance = 0.0
+
+        vertex_list = self.vertex_list
+        edge_lists = self.edge_lists()
+        unvisited_queue = [(0.0, start_vertex.index)]
+        while unvisited_queue:
+            distance, index = heapq.heappop(unvisited_queue)
+            current_vertex = vertex_list[index]
+            if distance > current_vertex.distance:
+                continue  # a shorter path to this vertex was already taken from the queue
+            for neighbor_index, weight in edge_lists[index]:
+                alternative_path_distance = distance + weight
+                neighbor = vertex_list[neighbor_index]
+                if alternative_path_distance < neighbor.distance:
+                    neighbor.distance = alternative_path_distance
+                    neighbor.prev_vertex = current_vertex
+                    heapq.heappush(unvisited_queue, (alternative_path_distance, neighbor_index))
+
+    def shortest_path_closure(self) -> 'Graph':
+        """
+        Returns a complete graph whose edge weights are the shortest path distances of this graph.
+
+        Runs dijkstra_shortest_path from every vertex once and caches the result as a matrix:
+        afterwards any distance is one O(1) lookup, and path_between recovers the roads driven.
+        The new graph holds the same Vertex objects, at the same indices.
+
+        Returns
+        -------
+        Graph
+            The closure, with predecessors set. Unreachable pairs have no edge.
+        """
+        size = len(self.vertex_list)
+        if isinstance(self.distance_matrix, PackedDistanceMatrix):
+            closure = Graph(distance_matrix=PackedDistanceMatrix(size))
+        else:
+            closure = Graph(distance_matrix=DistanceMatrix(size))
+        for vertex in self.vertex_list:
+            closure.add_vertex(vertex)
+
+        predecessors = array('l', [-1]) * (size * size)
+        for start_vertex in self.vertex_list:
+            self.dijkstra_shortest_path(start_vertex)
+            start = start_vertex.index
+            for vertex in self.vertex_list:
+                closure.distance_matrix[start, vertex.index] = vertex.distance
+                if vertex.prev_vertex is not None:
+                    predecessors[start * size + vertex.index] = vertex.prev_vertex.index
+        closure.predecessors = predecessors
+        return closure
+
+    def path_between(self, from_vertex: Vertex, to_vertex: Vertex) -> list:
+        """
+        Returns the vertices along the path driven from one vertex to another.
+
+        Parameters
+        ----------
+        from_vertex : Vertex
+            The starting vertex.
+        to_vertex : Vertex
+            The destination vertex.
+
+        Returns
+        -------
+        list of Vertex
+            [from_vertex, ..., to_vertex]: the shortest path if this graph was made by
+            shortest_path_closure, otherwise the direct edge.
+
+        Raises
+        ------
+        ValueError
+            If this graph was made by shortest_path_closure and to_vertex cannot be reached from from_vertex.
+        """
+        if self.predecessors is None or from_vertex.index == to_vertex.index:
+            return [from_vertex, to_vertex]
+        size = len(self.vertex_list)
+        row = from_vertex.index * size
+        path = [to_vertex]
+        index = self.predecessors[row + to_vertex.index]
+        if index < 0:
+            raise ValueError('There is no path from ' + str(from_vertex) + ' to ' + str(to_vertex))
+        while index >= 0:
+            path.append(self.vertex_list[index])
+            if index == from_vertex.index:
+                break
+            index = self.predecessors[row + index]
+        path.reverse()
+        return path
+
 
 class PackageWGUPS:
     """
@@ -255,7 +585,15 @@ class PackageWGUPS:
         The loading time of the package. Defaults to None.
     time_delivered : datetime.time, optional
         The delivery time of the package. Defaults to None.
+
+    Attributes are kept in slots rather than a per-instance dictionary, and the short strings
+    that repeat across packages (city, state, deadline and statuses) are interned, so a
+    million packages share one copy of each.
     """
+    __slots__ = ('package_id', 'city', 'state', 'mass_kg', 'notes', 'destination', 'deadline_str', 'deadline',
+                 'status_arrival', 'status_loaded', 'status_delivered', 'time_arrived', 'time_loaded',
+                 'time_delivered')
+
     def __init__(self, package_id: int, city: str, state: str, mass_kg: float, notes: str,
                  destination: Vertex, deadline_str: str,
                  deadline: Optional[datetime.time] = None,
@@ -288,17 +626,17 @@ class PackageWGUPS:
             The arrival time of the package. Defaults to 08:00.
         """
         self.package_id = package_id
-        self.city = city
-        self.state = state
+        self.city = intern(city)
+        self.state = intern(state)
         self.mass_kg = mass_kg
         self.notes = notes
         self.destination = destination
-        self.deadline_str = deadline_str
-        self.deadline = deadline or datetime.time(hour=23, minute=59, second=59, microsecond=999999)
-        self.status_arrival = status_arrival
+        self.deadline_str = intern(deadline_str)
+        self.deadline = deadline or END_OF_DAY
+        self.status_arrival = intern(status_arrival)
         self.status_loaded = "awaiting loading"
         self.status_delivered = "not delivered"
-        self.time_arrived = time_arrived or datetime.time(hour=8, minute=0)
+        self.time_arrived = time_arrived or START_OF_DAY
         self.time_loaded = None
         self.time_delivered = None
 
@@ -340,7 +678,7 @@ class PackageWGUPS:
         bool
             True if the packages are equal, False otherwise.
         """
-        return isinstance(other, PackageWGUPS) \
+        return isinstance(other, (PackageWGUPS, PackageRow)) \
             and self.package_id == other.package_id
 
     def __hash__(self):
@@ -371,15 +709,23 @@ class DeliveryTruck:
         The speed of the truck in miles per hour, by default 18.0.
     capacity : int, optional
         The maximum number of packages the truck can carry, by default 16.
+    max_mass_kg : float, optional
+        The maximum total mass of the packages the truck can carry, by default None (no limit).
+    manifest : list
+        The packages the truck has set off to deliver, kept after they are unloaded.
 
     Methods
     -------
     deliver_package(package: Package) -> None:
         Delivers a package to the destination address.
     """
+    __slots__ = ('current_address', 'label', 'miles_traveled', 'speed_mi_hr', 'capacity', 'max_mass_kg',
+                 'departure_time', 'travel_delta', 'route_list', 'inventory', 'manifest')
+
     def __init__(self, current_address: Vertex, label: str,
                  departure_time: datetime.time = datetime.strptime('08:00', '%H:%M').time(),
-                 miles_traveled: float = 0.0, speed_mi_hr: float = 18.0, capacity: int = 16):
+                 miles_traveled: float = 0.0, speed_mi_hr: float = 18.0, capacity: int = 16,
+                 max_mass_kg: float = None):
         """
         Initializes a DeliveryTruck object with the given attributes.
 
@@ -397,16 +743,41 @@ class DeliveryTruck:
             The speed of the truck in miles per hour, by default 18.0.
         capacity : int, optional
             The maximum number of packages the truck can carry, by default 16.
+        max_mass_kg : float, optional
+            The maximum total mass of the packages the truck can carry, by default None (no limit).
         """
         self.current_address = current_address
-        self.label = label
+        self.label = intern(label)
         self.miles_traveled = miles_traveled
         self.speed_mi_hr = speed_mi_hr
         self.capacity = capacity
+        self.max_mass_kg = max_mass_kg
         self.departure_time = departure_time
         self.travel_delta = timedelta(0)
         self.route_list = [current_address]
         self.inventory = []
+        self.manifest = []
+
+
+def address_key(address: str, zipcode: str = ''):
+    """
+    Normalizes an address and zipcode into a key for matching package addresses to vertices.
+
+    Letter case and runs of whitespace are ignored, so "410 S  State St" matches "410 S State St".
+
+    Parameters
+    ----------
+    address : str
+        USPS formatted address
+    zipcode : str, optional
+        The zipcode of the address.
+
+    Returns
+    -------
+    tuple of (str, str)
+        The normalized (address, zipcode) key.
+    """
+    return ' '.join(address.split()).casefold(), zipcode.strip()
 
 
 def distance_between(address1: Vertex, address2: Vertex, city_map: Graph):
@@ -425,18 +796,13 @@ def distance_between(address1: Vertex, address2: Vertex, city_map: Graph):
     Returns
     -------
     float
-        The distance between the two addresses.
-
-    Raises
-    ------
-    KeyError
-        If the edge between the two addresses is not found in the graph.
+        The distance between the two addresses, or None if the edge is not found in the graph.
     """
-    try:
-        distance = city_map.edge_weights[(address1, address2)]
-        return distance
-    except KeyError:
-        print('Edge not found in Graph between: ' + address1.label + ', AND: ' + address2.label)
+    if address1.index is not None and address2.index is not None:
+        distance = city_map.distance_matrix[address1.index, address2.index]
+        if distance != DistanceMatrix.NO_EDGE:
+            return distance
+    print('Edge not found in Graph between: ' + address1.label + ', AND: ' + address2.label)
 
 
 def min_distance_address_from(from_address: Vertex, city_map: Graph, truck_packages: list):
@@ -457,11 +823,557 @@ def min_distance_address_from(from_address: Vertex, city_map: Graph, truck_packa
     Vertex
         The address of the package destination that is closest to the given address.
     """
-    closest_address = from_address
-    closest_distance = float('inf')
-    for item in truck_packages:
-        if distance_between(from_address, item.destination, city_map) < closest_distance:
-            closest_address = item.destination
-            closest_distance = distance_between(from_address, item.destination, city_map)
-
+    closest_address, _ = nearest_destination_from(from_address, city_map, truck_packages)
     return closest_address
+
+
+def nearest_destination_from(from_address: Vertex, city_map: Graph, truck_packages: list):
+    """
+    Finds the package destination closest to a given address, and the distance to it.
+
+    The destination indices of all packages are gathered first, then the closest one is
+    picked with a single ``min`` over one row of the distance matrix.
+
+    Parameters
+    ----------
+    from_address : Vertex
+        The address to find the closest package destination to.
+    city_map : Graph
+        The graph containing the addresses and distances between them.
+    truck_packages : list
+        The list of packages to search through.
+
+    Returns
+    -------
+    tuple of (Vertex, float)
+        The closest package destination and its distance from the given address,
+        or from_address and its distance to itself if there are no packages.
+    """
+    return nearest_vertex_from(from_address, city_map, [item.destination.index for item in truck_packages])
+
+
+def nearest_vertex_from(from_address: Vertex, city_map: Graph, vertex_indices):
+    """
+    Finds the vertex closest to a given address among some vertex indices, and the distance to it.
+
+    Parameters
+    ----------
+    from_address : Vertex
+        The address to find the closest vertex to.
+    city_map : Graph
+        The graph containing the addresses and distances between them.
+    vertex_indices : Iterable[int]
+        The distance matrix indices of the candidate vertices. Ties go to the first one.
+
+    Returns
+    -------
+    tuple of (Vertex, float)
+        The closest vertex and its distance from the given address,
+        or from_address and its distance to itself if there are no candidates.
+    """
+    # one row of the matrix holds the distance to every possible destination
+    distances_from = city_map.distance_matrix.row(from_address.index)
+    closest_index = min(vertex_indices, key=distances_from.__getitem__, default=None)
+    if closest_index is None:
+        return from_address, distances_from[from_address.index]
+    return city_map.vertex_list[closest_index], distances_from[closest_index]
+
+
+class PackageStatusTimeline:
+    """
+    An index of when every package changes status, for answering "status at time T" queries.
+
+    Each package passes three transitions during the day: arrived at the hub, loaded on a
+    truck, and delivered. For each transition the packages are kept sorted by its time, so a
+    binary search finds how many have passed it by T. The index keeps a cursor at the last
+    queried time and, when moved, only updates the packages whose transitions lie between
+    the old and new time. Scrubbing through the day costs O(log n + packages changed) per query.
+
+    Build it after the trucks have delivered their packages; it does not see later changes.
+
+    Parameters
+    ----------
+    packages : Iterable[PackageWGUPS]
+        The packages to index, in the order statuses_at should list them.
+
+    Methods
+    -------
+    status_at(package_id: int, chosen_time: datetime.time) -> str
+        Returns the status of one package at the given time.
+    statuses_at(chosen_time: datetime.time) -> List[Tuple[PackageWGUPS, str]]
+        Returns every package and its status at the given time.
+    """
+    WAITING_AT_HUB = "waiting at HUB"
+
+    def __init__(self, packages):
+        """
+        Builds the sorted transition index for the given packages.
+
+        Parameters
+        ----------
+        packages : Iterable[PackageWGUPS]
+            The packages to index.
+        """
+        self.packages = list(packages)
+        self._position_of = {package.package_id: position for position, package in enumerate(self.packages)}
+
+        # per transition: package positions sorted by transition time, and those sorted times
+        self._order = []
+        self._times = []
+        for attribute in ('time_arrived', 'time_loaded', 'time_delivered'):
+            seconds = [self._seconds(getattr(package, attribute)) for package in self.packages]
+            order = sorted(range(len(seconds)), key=seconds.__getitem__)
+            self._order.append(order)
+            self._times.append([seconds[position] for position in order])
+
+        # bit k of a package's mask is set once transition k has passed at the cursor time
+        self._masks = bytearray(len(self.packages))
+        self._passed = [0, 0, 0]
+
+    @staticmethod
+    def _seconds(time_of_day) -> float:
+        """
+        Converts a datetime.time to seconds after midnight; None (never happens) becomes infinity.
+        """
+        if time_of_day is None:
+            return float('inf')
+        return time_of_day.hour * 3600 + time_of_day.minute * 60 + time_of_day.second \
+            + time_of_day.microsecond / 1e6
+
+    def _status(self, package, mask: int) -> str:
+        """
+        Returns the status of a package given which of its transitions have passed.
+        """
+        if not mask & 1:
+            return package.status_arrival
+        if not mask & 2:
+            return self.WAITING_AT_HUB
+        if not mask & 4:
+            return package.status_loaded
+        return package.status_delivered
+
+    def _move_cursor(self, chosen_time):
+        """
+        Updates the transition masks of the packages whose status changes between the cursor and chosen_time.
+        """
+        seconds = self._seconds(chosen_time)
+        masks = self._masks
+        for transition in range(3):
+            bit = 1 << transition
+            passed = bisect_right(self._times[transition], seconds)
+            previously_passed = self._passed[transition]
+            if passed > previously_passed:
+                for position in self._order[transition][previously_passed:passed]:
+                    masks[position] |= bit
+            elif passed < previously_passed:
+                for position in self._order[transition][passed:previously_passed]:
+                    masks[position] &= ~bit
+            self._passed[transition] = passed
+
+    def status_at(self, package_id: int, chosen_time) -> str:
+        """
+        Returns the status of one package at the given time.
+
+        Parameters
+        ----------
+        package_id : int
+            The ID of the package.
+        chosen_time : datetime.time
+            The time of day to report the status at.
+
+        Returns
+        -------
+        str
+            The package status at chosen_time.
+        """
+        package = self.packages[self._position_of[package_id]]
+        seconds = self._seconds(chosen_time)
+        mask = 0
+        for transition, attribute in enumerate(('time_arrived', 'time_loaded', 'time_delivered')):
+            if seconds >= self._seconds(getattr(package, attribute)):
+                mask |= 1 << transition
+        return self._status(package, mask)
+
+    def statuses_at(self, chosen_time):
+        """
+        Returns every package and its status at the given time.
+
+        Parameters
+        ----------
+        chosen_time : datetime.time
+            The time of day to report the statuses at.
+
+        Returns
+        -------
+        List[Tuple[PackageWGUPS, str]]
+            (package, status) for every package, in the order the timeline was built with.
+        """
+        self._move_cursor(chosen_time)
+        status = self._status
+        return [(package, status(package, mask)) for package, mask in zip(self.packages, self._masks)]
+
+
+def _microseconds(time_of_day) -> int:
+    """
+    Converts a datetime.time to microseconds after midnight; None becomes -1.
+    """
+    if time_of_day is None:
+        return -1
+    return ((time_of_day.hour * 60 + time_of_day.minute) * 60 + time_of_day.second) * 1000000 \
+        + time_of_day.microsecond
+
+
+def _time_of_day(microseconds: int):
+    """
+    Converts microseconds after midnight back to a datetime.time; -1 becomes None.
+    """
+    if microseconds < 0:
+        return None
+    return (datetime.min + timedelta(microseconds=microseconds)).time()
+
+
+def _column_property(column: str, load=None, store=None, doc: str = None) -> property:
+    """
+    Returns a property of PackageRow that reads and writes one column of its PackageStore.
+
+    Parameters
+    ----------
+    column : str
+        The name of the PackageStore attribute holding the column.
+    load : Callable, optional
+        Converts (store, stored value) to the attribute value. Default returns the stored value.
+    store : Callable, optional
+        Converts (store, attribute value) to the stored value. Default stores the value as is.
+    doc : str, optional
+        The property's docstring.
+    """
+    def getter(row):
+        value = getattr(row._store, column)[row._row]
+        return value if load is None else load(row._store, value)
+
+    def setter(row, value):
+        getattr(row._store, column)[row._row] = value if store is None else store(row._store, value)
+
+    return property(getter, setter, doc=doc)
+
+
+class PackageStore:
+    """
+    Packages stored column by column in parallel arrays, for manifests of millions of packages.
+
+    Each package is one row across typed arrays: id, destination index, deadline and the
+    arrival, loading and delivery times (as microseconds after midnight, -1 for none), mass,
+    and codes into a shared string table for the text fields and statuses. A package costs
+    about 80 bytes instead of a PackageWGUPS object and its attributes.
+
+    The store has the lookup API of the package hash tables (get, get_many, insert, iteration
+    over (package_id, package) pairs), and hands out PackageRow views with the attributes of
+    PackageWGUPS, so the controller, the timeline and the menus work on it unchanged.
+    Scans over a whole column (late_at, total_mass) run over the arrays without making views.
+
+    Attributes
+    ----------
+    vertex_list : list of Vertex
+        The graph's vertices, by distance matrix index, that destination indices refer to.
+
+    Methods
+    -------
+    add(package_id, city, state, mass_kg, notes, destination, deadline_str, ...) -> PackageRow:
+        Appends a package, with the same parameters as PackageWGUPS.
+    insert(key, package):
+        Appends a copy of a package (or updates the package with that id).
+    get(key) -> PackageRow:
+        Returns the package with the given id.
+    get_many(keys) -> List[PackageRow]:
+        Returns the packages with the given ids.
+    late_at(chosen_time) -> List[PackageRow]:
+        Returns the packages whose deadline has passed at chosen_time without them being delivered by it.
+    total_mass(packages) -> float:
+        Returns the total mass of the given packages.
+    """
+    def __init__(self, vertex_list: list):
+        """
+        Initializes an empty PackageStore.
+
+        Parameters
+        ----------
+        vertex_list : list of Vertex
+            The graph's vertices, by distance matrix index.
+        """
+        self.vertex_list = vertex_list
+        self._package_ids = array('q')
+        self._destinations = array('i')
+        self._deadlines = array('q')
+        self._times_arrived = array('q')
+        self._times_loaded = array('q')
+        self._times_delivered = array('q')
+        self._masses = array('d')
+        self._cities = array('I')
+        self._states = array('I')
+        self._notes = array('I')
+        self._deadline_strs = array('I')
+        self._statuses_arrival = array('I')
+        self._statuses_loaded = array('I')
+        self._statuses_delivered = array('I')
+        self._strings = []  # string table: code -> string
+        self._codes = {}  # string -> code
+        self._other_destinations = {}  # row -> destination Vertex that is not in vertex_list
+        self._row_of = None  # package id -> row, only built if ids are not added in increasing order
+
+    def __len__(self):
+        """
+        Returns the number of packages in the store.
+        """
+        return len(self._package_ids)
+
+    def __iter__(self):
+        """
+        Iterates over (package_id, package view) pairs, in the order the packages were added.
+        """
+        for row, package_id in enumerate(self._package_ids):
+            yield package_id, PackageRow(self, row)
+
+    def _code(self, text: str) -> int:
+        """
+        Returns the string table code for text, adding it to the table if new.
+        """
+        code = self._codes.get(text)
+        if code is None:
+            code = len(self._strings)
+            self._strings.append(text)
+            self._codes[text] = code
+        return code
+
+    def _destination_of(self, row: int, index: int) -> Vertex:
+        """
+        Returns the destination Vertex of a row from its stored destination index.
+        """
+        if index < 0:
+            return self._other_destinations[row]
+        return self.vertex_list[index]
+
+    def _set_destination(self, row: int, destination: Vertex) -> int:
+        """
+        Returns the destination index to store for a row, remembering vertices not in vertex_list.
+        """
+        index = destination.index
+        if index is None or index >= len(self.vertex_list) or self.vertex_list[index] is not destination:
+            self._other_destinations[row] = destination
+            return -1
+        self._other_destinations.pop(row, None)
+        return index
+
+    def _row(self, key: int):
+        """
+        Returns the row of the package with the given id, or None if there is none.
+        """
+        if self._row_of is not None:
+            return self._row_of.get(key)
+        package_ids = self._package_ids
+        row = bisect_right(package_ids, key) - 1
+        if row >= 0 and package_ids[row] == key:
+            return row
+        return None
+
+    def add(self, package_id: int, city: str, state: str, mass_kg: float, notes: str,
+            destination: Vertex, deadline_str: str,
+            deadline: Optional[datetime.time] = None,
+            status_arrival: str = "waiting at HUB",
+            time_arrived: Optional[datetime.time] = None) -> 'PackageRow':
+        """
+        Appends a package, with the same parameters and defaults as PackageWGUPS.
+
+        Returns
+        -------
+        PackageRow
+            A view of the new package.
+        """
+        row = len(self._package_ids)
+        if row and package_id <= self._package_ids[-1] and self._row_of is None:
+            # ids no longer increase: switch from binary search to a dictionary
+            self._row_of = {key: position for position, key in enumerate(self._package_ids)}
+        if self._row_of is not None:
+            self._row_of[package_id] = row
+        self._package_ids.append(package_id)
+        self._destinations.append(self._set_destination(row, destination))
+        self._deadlines.append(_microseconds(deadline or END_OF_DAY))
+        self._times_arrived.append(_microseconds(time_arrived or START_OF_DAY))
+        self._times_loaded.append(-1)
+        self._times_delivered.append(-1)
+        self._masses.append(mass_kg)
+        self._cities.append(self._code(city))
+        self._states.append(self._code(state))
+        self._notes.append(self._code(notes))
+        self._deadline_strs.append(self._code(deadline_str))
+        self._statuses_arrival.append(self._code(status_arrival))
+        self._statuses_loaded.append(self._code("awaiting loading"))
+        self._statuses_delivered.append(self._code("not delivered"))
+        return PackageRow(self, row)
+
+    def insert(self, key: int, package):
+        """
+        Copies a package into the store, replacing the package with the same id if there is one.
+
+        Parameters
+        ----------
+        key : int
+            The package id.
+        package : PackageWGUPS or PackageRow
+            The package to copy.
+        """
+        row = self._row(key)
+        if row is None:
+            row = self.add(key, package.city, package.state, package.mass_kg, package.notes,
+                           package.destination, package.deadline_str, package.deadline,
+                           package.status_arrival, package.time_arrived)._row
+        target = PackageRow(self, row)
+        for attribute in PackageRow.attributes:
+            setattr(target, attribute, getattr(package, attribute))
+
+    def insert_many(self, items):
+        """
+        Copies many (package_id, package) pairs into the store.
+        """
+        for key, package in items:
+            self.insert(key, package)
+
+    def get(self, key: int):
+        """
+        Returns a view of the package with the given id, or None if there is none.
+        """
+        row = self._row(key)
+        return None if row is None else PackageRow(self, row)
+
+    def get_many(self, keys) -> list:
+        """
+        Returns views of the packages with the given ids, in the order of the ids (None where not found).
+        """
+        return [self.get(key) for key in keys]
+
+    def late_at(self, chosen_time) -> list:
+        """
+        Returns the packages whose deadline has passed at chosen_time without them being delivered by it.
+
+        Parameters
+        ----------
+        chosen_time : datetime.time
+            The time of day to check.
+
+        Returns
+        -------
+        List[PackageRow]
+            The late packages, in the order they were added.
+        """
+        now = _microseconds(chosen_time)
+        return [PackageRow(self, row) for row, deadline, delivered
+                in zip(range(len(self._deadlines)), self._deadlines, self._times_delivered)
+                if deadline < now and not 0 <= delivered <= deadline]
+
+    def total_mass(self, packages=None) -> float:
+        """
+        Returns the total mass of the given packages (e.g. a truck's inventory), or of every package.
+
+        Parameters
+        ----------
+        packages : Iterable[PackageRow], optional
+            Views of packages in this store. Default is every package.
+
+        Returns
+        -------
+        float
+            The total mass in kilograms.
+        """
+        if packages is None:
+            return sum(self._masses)
+        return sum(map(self._masses.__getitem__, (package._row for package in packages)))
+
+
+class PackageRow:
+    """
+    A view of one package in a PackageStore, with the attributes of PackageWGUPS.
+
+    Reading an attribute reads the store's column; setting it writes the column, so every
+    view of the same package sees the change. Views compare and hash by package id, like
+    PackageWGUPS.
+    """
+    __slots__ = ('_store', '_row')
+
+    # the attributes copied by PackageStore.insert
+    attributes = ('package_id', 'city', 'state', 'mass_kg', 'notes', 'destination', 'deadline_str', 'deadline',
+                  'status_arrival', 'status_loaded', 'status_delivered', 'time_arrived', 'time_loaded',
+                  'time_delivered')
+
+    def __init__(self, store: PackageStore, row: int):
+        """
+        Initializes a view of one row of a PackageStore.
+        """
+        self._store = store
+        self._row = row
+
+    package_id = _column_property('_package_ids', doc='The ID of the package.')
+    mass_kg = _column_property('_masses', doc='The mass of the package in kilograms.')
+    city = _column_property('_cities', lambda store, code: store._strings[code], PackageStore._code,
+                            'The city where the package is to be delivered.')
+    state = _column_property('_states', lambda store, code: store._strings[code], PackageStore._code,
+                             'The state where the package is to be delivered.')
+    notes = _column_property('_notes', lambda store, code: store._strings[code], PackageStore._code,
+                             'Any notes associated with the package.')
+    deadline_str = _column_property('_deadline_strs', lambda store, code: store._strings[code], PackageStore._code,
+                                    'The deadline for the package in string format.')
+    status_arrival = _column_property('_statuses_arrival', lambda store, code: store._strings[code],
+                                      PackageStore._code, 'The arrival status of the package.')
+    status_loaded = _column_property('_statuses_loaded', lambda store, code: store._strings[code],
+                                     PackageStore._code, 'The loading status of the package.')
+    status_delivered = _column_property('_statuses_delivered', lambda store, code: store._strings[code],
+                                        PackageStore._code, 'The delivery status of the package.')
+    deadline = _column_property('_deadlines', lambda store, value: _time_of_day(value),
+                                lambda store, value: _microseconds(value),
+                                'The deadline for the package as a datetime.time object.')
+    time_arrived = _column_property('_times_arrived', lambda store, value: _time_of_day(value),
+                                    lambda store, value: _microseconds(value), 'The arrival time of the package.')
+    time_loaded = _column_property('_times_loaded', lambda store, value: _time_of_day(value),
+                                   lambda store, value: _microseconds(value), 'The loading time of the package.')
+    time_delivered = _column_property('_times_delivered', lambda store, value: _time_of_day(value),
+                                      lambda store, value: _microseconds(value), 'The delivery time of the package.')
+
+    @property
+    def destination(self) -> Vertex:
+        """
+        The destination vertex for the package.
+        """
+        return self._store._destination_of(self._row, self._store._destinations[self._row])
+
+    @destination.setter
+    def destination(self, destination: Vertex):
+        self._store._destinations[self._row] = self._store._set_destination(self._row, destination)
+
+    __repr__ = PackageWGUPS.__repr__
+    __str__ = PackageWGUPS.__str__
+
+    def __reduce__(self):
+        """
+        Pickles the view as a PackageWGUPS copy of the package, rather than with its whole store.
+        """
+        return _package_copy, tuple(getattr(self, attribute) for attribute in PackageRow.attributes)
+
+    def __eq__(self, other):
+        """
+        Checks if this package is equal to another package (a PackageRow or PackageWGUPS) by id.
+        """
+        return isinstance(other, (PackageRow, PackageWGUPS)) and self.package_id == other.package_id
+
+    def __hash__(self):
+        """
+        Returns the hash value of the package.
+        """
+        return hash(self.package_id)
+
+
+def _package_copy(*values) -> PackageWGUPS:
+    """
+    Returns a PackageWGUPS with the given values of PackageRow.attributes, for unpickling a PackageRow.
+    """
+    package = PackageWGUPS(*values[:10])
+    for attribute, value in zip(PackageRow.attributes, values):
+        setattr(package, attribute, value)
+    return package
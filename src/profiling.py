@@ -0,0 +1,283 @@
+__author__ = "Joseph Curtis"
+__license__ = "BSD 4-Clause"
+__copyright__ = """Copyright 2023 Joseph Curtis 
+
+ Licensed under the BSD 4-Clause License, (the “Original” or “Old” License);
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+  https://choosealicense.com/licenses/bsd-4-clause/
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+ WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+ License for the specific language governing permissions and limitations under
+ the License.
+
+ If you use this software, please cite it using the metadata from the
+ CITATION.cff file.
+
+"""
+
+
+# Description: Stage timers and hot-path counters for the planning pipeline
+# Date: 29 Apr 2023
+#
+# Instrumentation is switched on by enable(), which swaps counting wrappers in for the
+# instrumented functions and methods, and switched off by disable(), which puts the
+# originals back. While disabled nothing is wrapped, so the hot paths run exactly the
+# code they would without this module; stage() costs one flag check per pipeline stage.
+# Counters cover this process only: deliveries run in worker processes (--processes > 1)
+# are timed as a stage but their lookups are not counted.
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from functools import wraps
+import json
+import sys
+import time
+
+import controller
+import model
+from utilities import ChainingHashTable, DistanceMatrix, OpenAddressingHashTable, PackedDistanceMatrix
+
+enabled = False
+stage_seconds = defaultdict(float)  # stage name -> total seconds
+stage_calls = Counter()  # stage name -> times entered
+counters = Counter()  # counter name -> count
+histograms = defaultdict(Counter)  # histogram name -> {value: occurrences}
+_originals = []  # (owner, attribute name, original) for every wrapper installed by enable()
+_no_stage = nullcontext()
+
+
+class _Stage:
+    """
+    A context manager that adds the time spent inside it to a named stage.
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        stage_seconds[self.name] += time.perf_counter() - self.start
+        stage_calls[self.name] += 1
+        return False
+
+
+def stage(name: str):
+    """
+    Returns a context manager timing a pipeline stage, or a shared no-op one while disabled.
+
+    Parameters
+    ----------
+    name : str
+        The stage name, e.g. "load_distance_data".
+    """
+    return _Stage(name) if enabled else _no_stage
+
+
+def _install(owner, attribute: str, make_wrapper):
+    """
+    Replaces owner.attribute with make_wrapper(original), remembering the original for disable().
+    """
+    original = getattr(owner, attribute)
+    _originals.append((owner, attribute, original))
+    setattr(owner, attribute, wraps(original)(make_wrapper(original)))
+
+
+def _timed(name: str):
+    """
+    Returns a wrapper factory that times every call as the stage name.
+    """
+    def make_wrapper(original):
+        def wrapper(*args, **kwargs):
+            with _Stage(name):
+                return original(*args, **kwargs)
+        return wrapper
+    return make_wrapper
+
+
+def _count_chain(table: ChainingHashTable, key):
+    """
+    Counts the probes (records compared) to find key in a ChainingHashTable, and the length of its chain.
+    """
+    bucket = table.hash_table[hash(key) % table.bucket_number]
+    probes = len(bucket)
+    for position, (record_key, _) in enumerate(bucket):
+        if record_key == key:
+            probes = position + 1
+            break
+    counters['hash_table_lookups'] += 1
+    counters['hash_table_probes'] += probes
+    histograms['hash_table_chain_length'][len(bucket)] += 1
+
+
+def _count_chaining(original):
+    def wrapper(self, key, *args):
+        _count_chain(self, key)
+        return original(self, key, *args)
+    return wrapper
+
+
+def _count_chaining_get_many(original):
+    def wrapper(self, keys):
+        keys = list(keys)
+        for key in keys:
+            _count_chain(self, key)
+        return original(self, keys)
+    return wrapper
+
+
+def _count_chaining_insert_many(original):
+    def wrapper(self, items):
+        items = list(items)
+        for key, _ in items:
+            _count_chain(self, key)
+        return original(self, items)
+    return wrapper
+
+
+def _count_open_addressing(original):
+    def wrapper(self, key):
+        slot, free_slot = original(self, key)
+        mask = self.bucket_number - 1
+        end = slot if slot >= 0 else free_slot
+        probes = ((end - (hash(key) & mask)) & mask) + 1
+        counters['hash_table_lookups'] += 1
+        counters['hash_table_probes'] += probes
+        histograms['hash_table_probe_length'][probes] += 1
+        return slot, free_slot
+    return wrapper
+
+
+def _counted(name: str):
+    """
+    Returns a wrapper factory that counts every call under the counter name.
+    """
+    def make_wrapper(original):
+        def wrapper(*args, **kwargs):
+            counters[name] += 1
+            return original(*args, **kwargs)
+        return wrapper
+    return make_wrapper
+
+
+def _count_nearest(original):
+    def wrapper(from_address, city_map, vertex_indices):
+        counters['nearest_neighbor_searches'] += 1
+        counters['nearest_neighbor_evaluations'] += len(vertex_indices)
+        return original(from_address, city_map, vertex_indices)
+    return wrapper
+
+
+def _count_unloads(original):
+    def wrapper(truck, *args, **kwargs):
+        with _Stage('truck_deliver_packages'):
+            truck = original(truck, *args, **kwargs)
+        # a stop is one visit to a destination, where all of its packages are unloaded together
+        per_stop = Counter((package.destination.index, package.time_delivered) for package in truck.manifest)
+        counters['stops'] += len(per_stop)
+        counters['packages_unloaded'] += sum(per_stop.values())
+        histograms['packages_unloaded_per_stop'].update(per_stop.values())
+        return truck
+    return wrapper
+
+
+def enable():
+    """
+    Starts counting: installs the counting wrappers and clears earlier results.
+    """
+    global enabled
+    if enabled:
+        return
+    reset()
+    enabled = True
+    for matrix_type in (DistanceMatrix, PackedDistanceMatrix):
+        _install(matrix_type, '__getitem__', _counted('distance_lookups'))
+        _install(matrix_type, 'row', _counted('distance_row_fetches'))
+    _install(model, 'nearest_vertex_from', _count_nearest)
+    _install(ChainingHashTable, 'get', _count_chaining)
+    _install(ChainingHashTable, 'insert', _count_chaining)
+    _install(ChainingHashTable, 'remove', _count_chaining)
+    _install(ChainingHashTable, 'get_many', _count_chaining_get_many)
+    _install(ChainingHashTable, 'insert_many', _count_chaining_insert_many)
+    _install(OpenAddressingHashTable, '_find_slot', _count_open_addressing)
+    _install(controller, 'truck_deliver_packages', _count_unloads)
+    _install(model.PackageStatusTimeline, 'status_at', _timed('status_at'))
+    _install(model.PackageStatusTimeline, 'statuses_at', _timed('statuses_at'))
+
+
+def disable():
+    """
+    Stops counting: puts back every original function and method. The results are kept.
+    """
+    global enabled
+    while _originals:
+        owner, attribute, original = _originals.pop()
+        setattr(owner, attribute, original)
+    enabled = False
+
+
+def reset():
+    """
+    Clears every timer, counter and histogram.
+    """
+    stage_seconds.clear()
+    stage_calls.clear()
+    counters.clear()
+    histograms.clear()
+
+
+def summary() -> dict:
+    """
+    Returns the results as a JSON-serializable dictionary.
+    """
+    return {
+        'stages': {name: {'seconds': stage_seconds[name], 'calls': stage_calls[name]} for name in stage_seconds},
+        'counters': dict(counters),
+        'histograms': {name: {str(value): occurrences for value, occurrences in sorted(histogram.items())}
+                       for name, histogram in histograms.items()},
+    }
+
+
+def report(json_file: str = None, out=sys.stderr):
+    """
+    Prints a summary of the results, or writes them as JSON.
+
+    Parameters
+    ----------
+    json_file : str, optional
+        The file to write the JSON results to ("-" for standard output). Default prints a text summary.
+    out : file, optional
+        Where the text summary is printed (default is standard error).
+    """
+    results = summary()
+    if json_file == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+    if json_file:
+        with open(json_file, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+        return
+
+    print('Profile: stages', file=out)
+    for name, stage_result in results['stages'].items():
+        print(f'  {name:28} {stage_result["seconds"] * 1000:10.3f} ms  {stage_result["calls"]:8} calls', file=out)
+    print('Profile: counters', file=out)
+    for name, count in results['counters'].items():
+        print(f'  {name:28} {count:10}', file=out)
+    if counters['hash_table_lookups']:
+        print(f'  {"mean hash table probes":28} {counters["hash_table_probes"] / counters["hash_table_lookups"]:10.2f}',
+              file=out)
+    if counters['nearest_neighbor_searches']:
+        print(f'  {"mean nearest candidates":28} '
+              f'{counters["nearest_neighbor_evaluations"] / counters["nearest_neighbor_searches"]:10.2f}', file=out)
+    for name, histogram in results['histograms'].items():
+        print('Profile: ' + name + ' (value: occurrences)', file=out)
+        print('  ' + ', '.join(value + ': ' + str(occurrences) for value, occurrences in histogram.items()), file=out)
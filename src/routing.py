@@ -0,0 +1,555 @@
+__author__ = "Joseph Curtis"
+__license__ = "BSD 4-Clause"
+__copyright__ = """Copyright 2023 Joseph Curtis 
+
+ Licensed under the BSD 4-Clause License, (the “Original” or “Old” License);
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+  https://choosealicense.com/licenses/bsd-4-clause/
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+ WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+ License for the specific language governing permissions and limitations under
+ the License.
+
+ If you use this software, please cite it using the metadata from the
+ CITATION.cff file.
+
+"""
+
+
+# Description: Route improvement (local search) over a Graph's distance matrix
+# Date: 29 Apr 2023
+from bisect import bisect_right
+import heapq
+import time
+
+import clustering
+import model
+
+# tours with more stops than this take their neighbor lists from a clustering.SpatialIndex
+EXACT_NEIGHBOR_STOPS = 64
+
+
+def neighbor_lists(tour: list, city_map: model.Graph, neighbor_count: int) -> dict:
+    """
+    Finds, for every vertex index on a tour, the closest other vertex indices on the same tour.
+
+    Tours of up to EXACT_NEIGHBOR_STOPS stops are searched exactly, comparing every pair of
+    stops: O(s^2 log k) for s stops and k neighbors. Longer tours take their lists from a
+    clustering.SpatialIndex over the stops, built in O(s) and queried in a few grid cells
+    per stop, so the setup of improve_tour does not grow quadratically with the tour
+    either. Those lists are approximate, like the index; they only limit which moves are
+    tried.
+
+    Parameters
+    ----------
+    tour : list of int
+        The vertex indices on the tour.
+    city_map : model.Graph
+        The graph containing the distances between the vertices.
+    neighbor_count : int
+        How many neighbors to keep per vertex.
+
+    Returns
+    -------
+    dict
+        {vertex index: [closest vertex indices on the tour, nearest first]}
+    """
+    stops = set(tour)
+    lists = {}
+    if len(stops) > EXACT_NEIGHBOR_STOPS:
+        spatial_index = clustering.SpatialIndex(city_map, list(stops))
+        for stop in stops:
+            nearest = spatial_index.nearest(stop, neighbor_count + 1)
+            lists[stop] = [other for other in nearest if other != stop][:neighbor_count]
+        return lists
+    for stop in stops:
+        row = city_map.distance_matrix.row(stop)
+        lists[stop] = heapq.nsmallest(neighbor_count, (other for other in stops if other != stop),
+                                      key=row.__getitem__)
+    return lists
+
+
+def tour_length(tour: list, city_map: model.Graph) -> float:
+    """
+    Returns the length of a closed tour, including the edge from the last stop back to the first.
+
+    Parameters
+    ----------
+    tour : list of int
+        The vertex indices on the tour, in visiting order.
+    city_map : model.Graph
+        The graph containing the distances between the vertices.
+    """
+    matrix = city_map.distance_matrix
+    return sum(matrix[tour[position - 1], tour[position]] for position in range(len(tour)))
+
+
+def improve_tour(tour: list, city_map: model.Graph, time_budget: float = 0.05,
+                 neighbor_count: int = 8, max_segment: int = 3) -> list:
+    """
+    Shortens a closed tour with 2-opt and Or-opt moves, keeping its first stop (the hub) in place.
+
+    A 2-opt move replaces two edges by reconnecting their ends, reversing the stops between.
+    An Or-opt move takes a run of up to max_segment stops and reinserts it elsewhere, in
+    either direction. Moves are only tried between a stop and its neighbor_count nearest
+    stops, and each is priced by the change of the three or four edges involved, so a pass
+    costs O(stops * neighbor_count) evaluations instead of O(stops^2). Passes repeat until
+    no move shortens the tour or time_budget runs out. The neighbor lists are set up by
+    neighbor_lists, exactly for short tours and from a spatial index for long ones.
+
+    Distances are assumed symmetric, as loaded from the distance table; on a table that is
+    not, the result is checked with tour_length and the given tour is returned if the
+    moves made it longer.
+
+    Parameters
+    ----------
+    tour : list of int
+        The vertex indices of the stops in visiting order; tour[0] is the hub, and the tour
+        returns to it after the last stop. Each vertex index must appear only once.
+    city_map : model.Graph
+        The graph containing the distances between the stops.
+    time_budget : float, optional
+        The most seconds to spend improving the tour (default is 0.05).
+    neighbor_count : int, optional
+        How many nearest stops to try moves with (default is 8).
+    max_segment : int, optional
+        The longest run of stops moved by Or-opt (default is 3).
+
+    Returns
+    -------
+    list of int
+        The improved tour, starting with the same hub and never longer than the given one.
+    """
+    original = tour
+    tour = list(tour)
+    if len(tour) < 4:
+        return tour
+
+    original_length = tour_length(tour, city_map)
+    deadline = time.perf_counter() + time_budget
+    matrix = city_map.distance_matrix
+    rows = {index: matrix.row(index) for index in tour}
+    neighbors = neighbor_lists(tour, city_map, neighbor_count)
+    size = len(tour)
+    position = {index: place for place, index in enumerate(tour)}
+    epsilon = 1e-9
+
+    def reverse(start: int, end: int):
+        """
+        Reverses tour[start..end] in place and updates the positions.
+        """
+        tour[start:end + 1] = tour[start:end + 1][::-1]
+        for place in range(start, end + 1):
+            position[tour[place]] = place
+
+    def try_two_opt(a: int) -> bool:
+        """
+        Tries 2-opt moves adding an edge from stop a to one of its neighbors.
+        """
+        place_a = position[a]
+        for a_next, c_step in ((tour[(place_a + 1) % size], 1), (tour[place_a - 1], -1)):
+            distance_a = rows[a][a_next]
+            for c in neighbors[a]:
+                distance_ac = rows[a][c]
+                if distance_ac >= distance_a:
+                    break  # neighbors are sorted; no further neighbor can gain
+                place_c = position[c]
+                c_next = tour[(place_c + c_step) % size]
+                if c_next == a:
+                    continue
+                delta = distance_ac + rows[a_next][c_next] - distance_a - rows[c][c_next]
+                if delta < -epsilon:
+                    if c_step == 1:
+                        # edges (a, a_next) and (c, c_next) -> (a, c) and (a_next, c_next)
+                        first, second = sorted((place_a, place_c))
+                        reverse(first + 1, second)
+                    else:
+                        # edges (a_prev, a) and (c_prev, c) -> (a, c) and (a_prev, c_prev)
+                        first, second = sorted((place_a, place_c))
+                        reverse(first, second - 1)
+                    if tour[0] != hub:  # keep the hub first
+                        rotate = position[hub]
+                        tour[:] = tour[rotate:] + tour[:rotate]
+                        for place, index in enumerate(tour):
+                            position[index] = place
+                    return True
+        return False
+
+    def try_or_opt(a: int) -> bool:
+        """
+        Tries moving a run of stops starting at stop a next to one of its neighbors.
+        """
+        place_a = position[a]
+        for length in range(1, max_segment + 1):
+            end = place_a + length - 1
+            if place_a == 0 or end >= size:
+                return False  # the hub never moves
+            segment = tour[place_a:end + 1]
+            prev_stop = tour[place_a - 1]
+            next_stop = tour[(end + 1) % size]
+            last = segment[-1]
+            removed_gain = rows[prev_stop][a] + rows[last][next_stop] - rows[prev_stop][next_stop]
+            for c in neighbors[a]:
+                place_c = position[c]
+                if place_a - 1 <= place_c <= end:
+                    continue
+                # insert between c and the stop after it, or between the stop before c and c
+                for left, right in ((c, tour[(place_c + 1) % size]), (tour[place_c - 1], c)):
+                    if place_a <= position[left] <= end or place_a <= position[right] <= end:
+                        continue
+                    forward = rows[left][a] + rows[last][right]
+                    backward = rows[left][last] + rows[a][right]
+                    added = min(forward, backward) - rows[left][right]
+                    if added - removed_gain < -epsilon:
+                        rest = tour[:place_a] + tour[end + 1:]
+                        insert_at = rest.index(left) + 1
+                        moved = segment if forward <= backward else segment[::-1]
+                        tour[:] = rest[:insert_at] + moved + rest[insert_at:]
+                        for place, index in enumerate(tour):
+                            position[index] = place
+                        return True
+        return False
+
+    hub = tour[0]
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for stop in list(tour):
+            if try_two_opt(stop) or try_or_opt(stop):
+                improved = True
+            if time.perf_counter() >= deadline:
+                break
+
+    # moves are priced as if the table were symmetric; never hand back a longer tour
+    if tour_length(tour, city_map) > original_length:
+        return list(original)
+    return tour
+
+
+def nearest_neighbor_tour(start: model.Vertex, packages: list, city_map: model.Graph) -> list:
+    """
+    Orders the distinct destinations of some packages by repeatedly visiting the closest one.
+
+    Parameters
+    ----------
+    start : model.Vertex
+        The address the tour starts (and ends) at.
+    packages : list of model.PackageWGUPS
+        The packages to deliver.
+    city_map : model.Graph
+        The graph containing the addresses and distances between them.
+
+    Returns
+    -------
+    list of int
+        start's vertex index followed by the destination indices in visiting order.
+    """
+    matrix = city_map.distance_matrix
+    remaining = {package.destination.index for package in packages}
+    remaining.discard(start.index)
+    tour = [start.index]
+    while remaining:
+        row = matrix.row(tour[-1])
+        # ties go to the lowest vertex index so the order does not depend on set iteration
+        closest = min(remaining, key=lambda index: (row[index], index))
+        remaining.remove(closest)
+        tour.append(closest)
+    return tour
+
+
+def improve_stops(start: model.Vertex, stops: list, city_map: model.Graph, time_budget: float = 0.05) -> list:
+    """
+    Shortens a planned order of stops with improve_tour.
+
+    Parameters
+    ----------
+    start : model.Vertex
+        The address the truck starts from and returns to.
+    stops : list of model.Vertex
+        The distinct stops in visiting order, without the return to start.
+    city_map : model.Graph
+        The graph containing the addresses and distances between them.
+    time_budget : float, optional
+        The most seconds to spend improving the tour (default is 0.05).
+
+    Returns
+    -------
+    list of model.Vertex
+        The same stops in the improved visiting order. Starts with start itself if stops did.
+    """
+    stops_at_start = [stop for stop in stops if stop.index == start.index]
+    tour = improve_tour([start.index] + [stop.index for stop in stops if stop.index != start.index],
+                        city_map, time_budget)
+    return stops_at_start + [city_map.vertex_list[index] for index in tour[1:]]
+
+
+def improved_stop_order(start: model.Vertex, packages: list, city_map: model.Graph,
+                        time_budget: float = 0.05) -> list:
+    """
+    Plans the order of a truck's stops: a nearest-neighbor tour shortened with improve_tour.
+
+    Parameters
+    ----------
+    start : model.Vertex
+        The address the truck starts from and returns to.
+    packages : list of model.PackageWGUPS
+        The packages on the truck.
+    city_map : model.Graph
+        The graph containing the addresses and distances between them.
+    time_budget : float, optional
+        The most seconds to spend improving the tour (default is 0.05).
+
+    Returns
+    -------
+    list of model.Vertex
+        The package destinations in visiting order, without the return to start. Starts with
+        start itself if any package is addressed to it.
+    """
+    tour = nearest_neighbor_tour(start, packages, city_map)
+    stops = [city_map.vertex_list[index] for index in tour[1:]]
+    if any(package.destination.index == start.index for package in packages):
+        stops.insert(0, start)
+    return improve_stops(start, stops, city_map, time_budget)
+
+
+def late_packages_on(stops: list, start: model.Vertex, packages: list, city_map: model.Graph,
+                     departure_time, speed_mi_hr: float) -> list:
+    """
+    Returns the packages that would be delivered after their deadline if the stops were driven in order.
+
+    Parameters
+    ----------
+    stops : list of model.Vertex
+        The stops in visiting order, without the return to start.
+    start : model.Vertex
+        The address the truck starts from.
+    packages : list of model.PackageWGUPS
+        The packages on the truck.
+    city_map : model.Graph
+        The graph containing the addresses and distances between them.
+    departure_time : datetime.time
+        The time the truck leaves start.
+    speed_mi_hr : float
+        The speed of the truck in miles per hour.
+    """
+    matrix = city_map.distance_matrix
+    seconds_per_mile = 3600.0 / speed_mi_hr
+    arrival = _seconds(departure_time)
+    arrival_at = {}
+    previous = start.index
+    for stop in stops:
+        arrival += matrix[previous, stop.index] * seconds_per_mile
+        arrival_at.setdefault(stop.index, arrival)
+        previous = stop.index
+    return [package for package in packages
+            if arrival_at.get(package.destination.index, float('inf')) > _seconds(package.deadline)]
+
+
+def _seconds(time_of_day) -> float:
+    """
+    Converts a datetime.time to seconds after midnight.
+    """
+    return time_of_day.hour * 3600 + time_of_day.minute * 60 + time_of_day.second + time_of_day.microsecond / 1e6
+
+
+class TimeWindowRoute:
+    """
+    A route from the hub with a deadline at every stop, supporting O(1) insertion feasibility checks.
+
+    For every stop the route keeps its arrival time and its slack: how much later the truck
+    could arrive there without any stop from there on missing its deadline. Because trucks never
+    wait, a detour before stop k delays every later stop by the same amount, so inserting a stop
+    is feasible exactly when it meets its own deadline and its extra travel time fits in the slack
+    of the stop after it. A stop that is already late does not limit the slack: delaying it
+    further costs nothing more, so it never blocks insertions before it.
+
+    Parameters
+    ----------
+    hub : int
+        The vertex index the route starts from.
+    departure : float
+        The departure time from the hub, in seconds after midnight.
+    seconds_per_mile : float
+        The travel time per mile of distance.
+    city_map : model.Graph
+        The graph containing the distances between the stops.
+
+    Attributes
+    ----------
+    stops : list of int
+        The vertex indices on the route; stops[0] is the hub.
+    deadlines : list of float
+        The deadline of each stop, in seconds after midnight.
+    arrivals : list of float
+        The arrival time at each stop, in seconds after midnight.
+    slack : list of float
+        The latest delay at each stop that keeps every following on-time stop on time.
+    place_of : dict
+        {vertex index: its position in stops}
+    """
+    def __init__(self, hub: int, departure: float, seconds_per_mile: float, city_map: model.Graph):
+        """
+        Starts an empty route at the hub.
+        """
+        self.stops = [hub]
+        self.deadlines = [float('inf')]
+        self.arrivals = [departure]
+        self.slack = [float('inf')]
+        self.place_of = {hub: 0}
+        self._seconds_per_mile = seconds_per_mile
+        self._matrix = city_map.distance_matrix
+
+    def travel_time(self, from_index: int, to_index: int) -> float:
+        """
+        Returns the seconds needed to drive between two vertex indices.
+        """
+        return self._matrix[from_index, to_index] * self._seconds_per_mile
+
+    def insertion(self, stop: int, deadline: float, position: int):
+        """
+        Prices inserting a stop right after route position ``position``, in O(1).
+
+        Returns
+        -------
+        tuple of (float, bool)
+            The added travel seconds, and whether every stop would still meet its deadline.
+        """
+        before = self.stops[position]
+        arrival = self.arrivals[position] + self.travel_time(before, stop)
+        if position + 1 == len(self.stops):
+            return self.travel_time(before, stop), arrival <= deadline
+        after = self.stops[position + 1]
+        added = self.travel_time(before, stop) + self.travel_time(stop, after) - self.travel_time(before, after)
+        return added, arrival <= deadline and added <= self.slack[position + 1]
+
+    def _margin(self, place: int) -> float:
+        """
+        Returns how much later the stop at place could be reached on time; unlimited if it is already late.
+        """
+        margin = self.deadlines[place] - self.arrivals[place]
+        return margin if margin >= 0.0 else float('inf')
+
+    def insert(self, stop: int, deadline: float, position: int):
+        """
+        Inserts a stop right after route position ``position`` and updates the arrivals and slack.
+
+        Every later stop is shifted by the added travel time. If that fits in their slack, no
+        later stop changes between on time and late, so their slack shrinks by the same amount
+        and only the slack before the new stop is recomputed, stopping at the first stop it
+        leaves unchanged.
+        """
+        added, _ = self.insertion(stop, deadline, position)
+        place = position + 1
+        # no later stop turns late (or on time) when the delay is within the slack after the new stop
+        shifts_within_slack = added >= 0.0 and (place == len(self.stops) or added <= self.slack[place])
+        self.stops.insert(place, stop)
+        self.deadlines.insert(place, deadline)
+        self.arrivals.insert(place, self.arrivals[position] + self.travel_time(self.stops[position], stop))
+        self.slack.insert(place, 0.0)
+        self.place_of[stop] = place
+        for later in range(place + 1, len(self.stops)):
+            self.place_of[self.stops[later]] = later
+            self.arrivals[later] += added
+            self.slack[later] -= added
+
+        if shifts_within_slack:
+            following = self.slack[place + 1] if place + 1 < len(self.stops) else float('inf')
+            first = place
+        else:
+            # later stops may have become late (or, on a table that breaks the triangle
+            # inequality, on time again): recompute all of the slack
+            following = float('inf')
+            first = len(self.stops) - 1
+        for at in range(first, 0, -1):
+            following = min(following, self._margin(at))
+            if at < place and following == self.slack[at]:
+                break
+            self.slack[at] = following
+
+
+def deadline_aware_stop_order(start: model.Vertex, packages: list, city_map: model.Graph,
+                              departure_time, speed_mi_hr: float, neighbor_count: int = 8):
+    """
+    Plans the order of a truck's stops by cheapest feasible insertion, most urgent deadline first.
+
+    Stops are inserted in order of their earliest package deadline. Each one goes where it adds
+    the least travel while every stop still meets its deadline; positions next to its
+    neighbor_count nearest stops already on the route (found through a clustering.SpatialIndex of
+    the stops) are tried first, and every position the stop could still be reached on time from
+    only if none of those is feasible. A stop that fits nowhere on time is inserted next to a
+    nearby stop or at the end, where it adds the least travel without making another stop
+    late, and reported late.
+
+    Parameters
+    ----------
+    start : model.Vertex
+        The address the truck starts from and returns to.
+    packages : list of model.PackageWGUPS
+        The packages on the truck.
+    city_map : model.Graph
+        The graph containing the addresses and distances between them.
+    departure_time : datetime.time
+        The time the truck leaves start.
+    speed_mi_hr : float
+        The speed of the truck in miles per hour.
+    neighbor_count : int, optional
+        How many nearby route stops to try inserting next to first (default is 8).
+
+    Returns
+    -------
+    tuple of (list of model.Vertex, list of model.PackageWGUPS)
+        The package destinations in visiting order (without the return to start), and the
+        packages the plan expects to deliver late.
+    """
+    deadlines = {}
+    for package in packages:
+        index = package.destination.index
+        deadlines[index] = min(deadlines.get(index, float('inf')), _seconds(package.deadline))
+    hub_packages = start.index in deadlines
+    deadlines.pop(start.index, None)
+
+    route = TimeWindowRoute(start.index, _seconds(departure_time), 3600.0 / speed_mi_hr, city_map)
+    matrix = city_map.distance_matrix
+    on_route = clustering.SpatialIndex(city_map, [start.index] + list(deadlines))
+    on_route.add(start.index)
+    for stop in sorted(deadlines, key=lambda index: (deadlines[index], matrix[start.index, index], index)):
+        deadline = deadlines[stop]
+        candidates = set()
+        for index in on_route.nearest_members(stop, neighbor_count):
+            place = route.place_of[index]
+            candidates.add(place)
+            if place > 0:
+                candidates.add(place - 1)
+
+        # arrivals only grow along the route, so the stop is late after any later position
+        on_time_positions = bisect_right(route.arrivals, deadline)
+        best = None
+        for positions in (sorted(candidates), range(on_time_positions)):
+            for position in positions:
+                added, feasible = route.insertion(stop, deadline, position)
+                if feasible and (best is None or added < best[0]):
+                    best = (added, position)
+            if best is not None:
+                break
+        if best is None:
+            # late whatever happens: add the least travel next to a nearby stop without making
+            # any other stop late, which is always possible at the end of the route
+            last = len(route.stops) - 1
+            for position in sorted(candidates | {last}):
+                added = route.insertion(stop, deadline, position)[0]
+                if (position == last or added <= route.slack[position + 1]) and (best is None or added < best[0]):
+                    best = (added, position)
+        route.insert(stop, deadline, best[1])
+        on_route.add(stop)
+
+    arrival_at = dict(zip(route.stops[1:], route.arrivals[1:]))
+    arrival_at[start.index] = route.arrivals[0]
+    late = [package for package in packages if arrival_at[package.destination.index] > _seconds(package.deadline)]
+    stops = [city_map.vertex_list[index] for index in route.stops[1:]]
+    if hub_packages:
+        stops.insert(0, start)
+    return stops, late
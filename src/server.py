@@ -0,0 +1,262 @@
+__author__ = "Joseph Curtis"
+__license__ = "BSD 4-Clause"
+__copyright__ = """Copyright 2023 Joseph Curtis 
+
+ Licensed under the BSD 4-Clause License, (the “Original” or “Old” License);
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+  https://choosealicense.com/licenses/bsd-4-clause/
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+ WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+ License for the specific language governing permissions and limitations under
+ the License.
+
+ If you use this software, please cite it using the metadata from the
+ CITATION.cff file.
+
+"""
+
+
+# Description: HTTP service answering package and fleet status queries from a planned day
+# Date: 29 Apr 2023
+#
+# Endpoints (all GET, all JSON; "at" is a time in HHMM format, default is the end of the day):
+#   /package/{id}?at=HHMM   one package and its status at the time
+#   /packages?at=HHMM       every package and its status at the time
+#   /trucks?at=HHMM         every truck trip, where it is at the time, and the total mileage
+import asyncio
+import datetime
+import json
+from urllib.parse import parse_qs, urlsplit
+
+from model import PackageStatusTimeline
+from view import parse_report_time
+
+END_OF_DAY = datetime.time(23, 59, 59)
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+class StatusService:
+    """
+    Answers status queries about one planned day, kept in memory between requests.
+
+    The day is loaded and simulated once by the caller; every query is answered from the
+    package table and the PackageStatusTimeline, so a request costs a table lookup (one
+    package) or a timeline scrub (every package), never a re-simulation. The fields of a
+    package that do not change during the day are encoded to JSON once, on first request.
+
+    Parameters
+    ----------
+    packages_hash_table : ChainingHashTable
+        The delivered packages, keyed by package ID.
+    truck_list : list of model.DeliveryTruck
+        Every truck trip of the day, after delivery.
+    timeline : model.PackageStatusTimeline, optional
+        The status index of the packages; built here if not given.
+
+    Methods
+    -------
+    respond(method: str, target: str) -> Tuple[int, bytes]
+        Returns the HTTP status code and JSON body answering a request.
+    """
+
+    def __init__(self, packages_hash_table, truck_list: list, timeline: PackageStatusTimeline = None):
+        self.packages_hash_table = packages_hash_table
+        self.truck_list = truck_list
+        self.timeline = timeline or PackageStatusTimeline(pkg for _, pkg in packages_hash_table)
+        self.total_miles = sum(truck.miles_traveled for truck in truck_list)
+        self._encoded = {}  # package ID -> JSON object members that do not change with time
+
+    def _package_members(self, pkg) -> str:
+        """
+        Returns the JSON members (without braces) of the fixed fields of a package.
+        """
+        members = self._encoded.get(pkg.package_id)
+        if members is None:
+            members = json.dumps({'package_id': pkg.package_id, 'address': pkg.destination.address,
+                                  'city': pkg.city, 'state': pkg.state, 'zip': pkg.destination.zipcode,
+                                  'deadline': pkg.deadline_str, 'mass_kg': pkg.mass_kg})[1:-1]
+            self._encoded[pkg.package_id] = members
+        return members
+
+    def _package(self, package_id: str, chosen_time) -> tuple:
+        """
+        Answers GET /package/{id}: one package and its status at the chosen time.
+
+        Parameters
+        ----------
+        package_id : str
+            The package ID from the request path.
+        chosen_time : datetime.time
+            The time of day to report the status at.
+
+        Returns
+        -------
+        tuple of (int, str or dict)
+            The HTTP status code, and the JSON body (404 with an error if there is no such package).
+        """
+        try:
+            pkg = self.packages_hash_table.get(int(package_id))
+        except ValueError:
+            pkg = None
+        if pkg is None:
+            return 404, {'error': 'no package with ID ' + package_id}
+        status = self.timeline.status_at(pkg.package_id, chosen_time)
+        return 200, '{"time": "' + str(chosen_time) + '", ' + self._package_members(pkg) \
+            + ', "status": ' + json.dumps(status) + '}'
+
+    def _packages(self, chosen_time) -> tuple:
+        """
+        Answers GET /packages: every package and its status at the chosen time.
+
+        Parameters
+        ----------
+        chosen_time : datetime.time
+            The time of day to report the statuses at.
+
+        Returns
+        -------
+        tuple of (int, str)
+            The HTTP status code and the JSON body, with the packages in the order of the timeline.
+        """
+        members = self._package_members
+        rows = ['{' + members(pkg) + ', "status": ' + json.dumps(status) + '}'
+                for pkg, status in self.timeline.statuses_at(chosen_time)]
+        return 200, '{"time": "' + str(chosen_time) + '", "packages": [' + ', '.join(rows) + ']}'
+
+    def _trucks(self, chosen_time) -> tuple:
+        """
+        Answers GET /trucks: each truck's schedule, mileage, packages and location at the chosen time.
+
+        Parameters
+        ----------
+        chosen_time : datetime.time
+            The time of day at which to locate the trucks.
+
+        Returns
+        -------
+        tuple of (int, dict)
+            The HTTP status code and the JSON body, with the fleet's total miles.
+        """
+        today = datetime.date.today()
+        trucks = []
+        for truck in self.truck_list:
+            departure = datetime.datetime.combine(today, truck.departure_time)
+            return_time = (departure + truck.travel_delta).time()
+            if chosen_time < truck.departure_time:
+                location = 'at HUB'
+            elif chosen_time < return_time:
+                location = 'en route'
+            else:
+                location = 'returned'
+            trucks.append({'label': truck.label, 'departure_time': str(truck.departure_time),
+                           'return_time': str(return_time), 'miles_traveled': round(truck.miles_traveled, 1),
+                           'location': location,
+                           'package_ids': [package.package_id for package in truck.manifest]})
+        return 200, {'time': str(chosen_time), 'total_miles': round(self.total_miles, 1), 'trucks': trucks}
+
+    def respond(self, method: str, target: str) -> tuple:
+        """
+        Returns the response to a request.
+
+        Parameters
+        ----------
+        method : str
+            The HTTP method; only GET is served.
+        target : str
+            The request target, e.g. "/package/9?at=1030".
+
+        Returns
+        -------
+        tuple of (int, bytes)
+            The HTTP status code and the JSON response body.
+        """
+        if method != 'GET':
+            code, body = 405, {'error': 'only GET is supported'}
+        else:
+            url = urlsplit(target)
+            path = url.path.rstrip('/').split('/')[1:]
+            at = parse_qs(url.query).get('at')
+            try:
+                chosen_time = parse_report_time(at[-1]) if at else END_OF_DAY
+            except ValueError:
+                chosen_time = None
+            if chosen_time is None:
+                code, body = 400, {'error': 'at must be a time in HHMM format, example: 1325 for 1:25pm'}
+            elif len(path) == 2 and path[0] == 'package':
+                code, body = self._package(path[1], chosen_time)
+            elif path == ['packages']:
+                code, body = self._packages(chosen_time)
+            elif path == ['trucks']:
+                code, body = self._trucks(chosen_time)
+            else:
+                code, body = 404, {'error': 'unknown path ' + url.path}
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        return code, body.encode()
+
+
+async def _serve_connection(service: StatusService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """
+    Answers the requests of one client connection, keeping it open between requests unless asked to close.
+    """
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+            lines = head.decode('latin-1').split('\r\n')
+            request_line = lines[0].split()
+            if len(request_line) != 3:
+                break
+            method, target, version = request_line
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip().lower()
+            # a request body is not used by any endpoint, but must be read past
+            body_length = int(headers.get('content-length') or 0)
+            if body_length:
+                await reader.readexactly(body_length)
+
+            keep_alive = headers.get('connection') != 'close' if version == 'HTTP/1.1' \
+                else headers.get('connection') == 'keep-alive'
+            code, body = service.respond(method, target)
+            writer.write(('HTTP/1.1 ' + str(code) + ' ' + REASONS[code] + '\r\n'
+                          'Content-Type: application/json\r\n'
+                          'Content-Length: ' + str(len(body)) + '\r\n'
+                          + ('' if keep_alive else 'Connection: close\r\n') + '\r\n').encode('latin-1') + body)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ValueError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service: StatusService, host: str = '127.0.0.1', port: int = 8080):
+    """
+    Serves status queries over HTTP until cancelled.
+
+    Requests are answered concurrently on one event loop; each answer is computed without
+    awaiting, so requests never see the timeline half way through a scrub.
+
+    Parameters
+    ----------
+    service : StatusService
+        The planned day to answer queries about.
+    host : str, optional
+        The address to listen on (default is 127.0.0.1, this machine only).
+    port : int, optional
+        The TCP port to listen on (default is 8080).
+    """
+    server = await asyncio.start_server(lambda reader, writer: _serve_connection(service, reader, writer),
+                                        host, port)
+    print('Serving package status on http://' + host + ':' + str(port) + ' (Ctrl+C to stop)')
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,273 @@
+__author__ = "Joseph Curtis"
+__license__ = "BSD 4-Clause"
+__copyright__ = """Copyright 2023 Joseph Curtis 
+
+ Licensed under the BSD 4-Clause License, (the “Original” or “Old” License);
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+  https://choosealicense.com/licenses/bsd-4-clause/
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+ WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+ License for the specific language governing permissions and limitations under
+ the License.
+
+ If you use this software, please cite it using the metadata from the
+ CITATION.cff file.
+
+"""
+
+
+# Description: Discrete-event simulation of a delivery fleet that reloads at the hub
+# Date: 29 Apr 2023
+import datetime
+import heapq
+from itertools import count
+
+import controller
+import model
+
+# Event kinds, in the order events at the same time are handled: deliveries before
+# returns, returning trucks before loading, so a truck back at 9:30 can load at 9:30,
+# and loading before packages arrive for trucks waiting at the hub
+ARRIVE = 0
+RETURN = 1
+LOAD = 2
+HUB_ARRIVAL = 3
+
+
+def simulate_fleet_events(trucks: list, city_map: model.Graph, hub_inventory,
+                          improve_route: bool = False, time_budget: float = 0.05, deadline_aware: bool = False,
+                          neighbor_count: int = 16) -> list:
+    """
+    Simulates a fleet through one day as a stream of events in time order, reloading trucks as they return.
+
+    Every truck starts empty at the hub at its departure time. Loading a truck (see
+    controller.HubLoader) starts a trip: the truck drives stop to stop (ARRIVE events),
+    unloads the packages for each stop, and drives back to the hub (a RETURN event), where
+    it is loaded again with the packages that have arrived by then. Trucks that find the
+    hub empty wait in line for the next packages to arrive (a HUB_ARRIVAL event), which
+    wakes only as many of them as there are packages for; once every package has been
+    loaded, trucks stay at the hub. Events wait in one binary heap for the whole fleet,
+    so each costs O(log t) for t trucks on the road.
+
+    Parameters
+    ----------
+    trucks : list of model.DeliveryTruck
+        The empty delivery trucks, at the hub, each with the time it is first available as its departure time.
+    city_map : model.Graph
+        The graph object representing the city map.
+    hub_inventory : Iterable[model.PackageWGUPS]
+        The packages that pass through the hub during the day.
+    improve_route : bool, optional
+        Whether to improve each trip's route with local search (default is False).
+    time_budget : float, optional
+        The most seconds to spend improving each trip's route (default is 0.05).
+    deadline_aware : bool, optional
+        Whether to plan each trip's route around package deadlines (default is False).
+    neighbor_count : int, optional
+        How many nearest destinations the loader indexes per destination (default is 16).
+
+    Returns
+    -------
+    list of model.DeliveryTruck
+        One record per trip, in order of departure: the first trip of each truck is the
+        truck given, later trips are new DeliveryTruck objects with the same label.
+    """
+    loader = controller.HubLoader(city_map, hub_inventory, neighbor_count)
+    today = datetime.date.today()
+    midnight = datetime.datetime.combine(today, datetime.time())
+    matrix = city_map.distance_matrix
+    expand_paths = city_map.predecessors is not None
+    trips = []
+    # heap of (seconds after midnight, kind, sequence, trip, seconds the trip departed,
+    # packages left by stop, planned stops); times are kept as float seconds until a package is stamped
+    events = []
+    sequence = count()
+    idle_trucks = []  # trucks waiting at the hub for packages, first come first loaded
+
+    def drive_on(trip, seconds_departed, packages_at, planned_stops):
+        """
+        Sends a trip on to its next destination, or back to the hub once it is empty, and schedules its arrival.
+        """
+        current_address = trip.current_address
+        if packages_at:
+            kind = ARRIVE
+            if planned_stops is None:
+                next_stop, distance = model.nearest_vertex_from(current_address, city_map, packages_at)
+            else:
+                next_stop = next(planned_stops)
+                distance = matrix[current_address.index, next_stop.index]
+        else:
+            kind = RETURN
+            next_stop = trip.route_list[0]
+            distance = matrix[current_address.index, next_stop.index]
+        trip.miles_traveled += distance
+        if expand_paths:
+            trip.route_list.extend(city_map.path_between(current_address, next_stop)[1:])
+        else:
+            trip.route_list.append(next_stop)
+        trip.current_address = next_stop
+        heapq.heappush(events, (seconds_departed + trip.miles_traveled * 3600.0 / trip.speed_mi_hr, kind,
+                                next(sequence), trip, seconds_departed, packages_at, planned_stops))
+
+    for truck in trucks:
+        seconds = (datetime.datetime.combine(today, truck.departure_time) - midnight).total_seconds()
+        heapq.heappush(events, (seconds, LOAD, next(sequence), truck, seconds, None, None))
+
+    def depart(trip, seconds):
+        """
+        Starts a trip from the hub with the truck's load.
+        """
+        trips.append(trip)
+        trip.manifest.extend(trip.inventory)
+        packages_at = {}
+        for package in trip.inventory:
+            packages_at.setdefault(package.destination.index, []).append(package)
+        planned_stops = controller.plan_stops(trip, city_map, trip.departure_time,
+                                              improve_route, time_budget, deadline_aware)
+        drive_on(trip, seconds, packages_at, planned_stops)
+
+    def wait_for_packages(trip):
+        """
+        Puts an empty truck in line at the hub, scheduling a HUB_ARRIVAL if none is due.
+        """
+        next_arrival = loader.next_arrival_time()
+        if next_arrival is None:
+            return  # nothing left to deliver: the truck stays at the hub
+        if not idle_trucks:
+            seconds = (datetime.datetime.combine(today, next_arrival) - midnight).total_seconds()
+            heapq.heappush(events, (seconds, HUB_ARRIVAL, next(sequence), None, seconds, None, None))
+        idle_trucks.append(trip)
+
+    while events:
+        seconds, kind, _, trip, seconds_departed, packages_at, planned_stops = heapq.heappop(events)
+
+        if kind == ARRIVE:
+            delivered = packages_at.pop(trip.current_address.index, None)
+            if delivered is not None:
+                trip.travel_delta = datetime.timedelta(hours=trip.miles_traveled / trip.speed_mi_hr)
+                delivery_time = (midnight + datetime.timedelta(seconds=seconds_departed) + trip.travel_delta).time()
+                status_delivered = trip.label + " Delivered " + str(delivery_time)
+                for package in delivered:
+                    package.time_delivered = delivery_time
+                    package.status_delivered = status_delivered
+            drive_on(trip, seconds_departed, packages_at, planned_stops)
+
+        elif kind == RETURN:
+            trip.travel_delta = datetime.timedelta(hours=trip.miles_traveled / trip.speed_mi_hr)
+            trip.inventory.clear()
+            next_trip = model.DeliveryTruck(trip.current_address, trip.label,
+                                            (midnight + datetime.timedelta(seconds=seconds)).time(),
+                                            speed_mi_hr=trip.speed_mi_hr, capacity=trip.capacity,
+                                            max_mass_kg=trip.max_mass_kg)
+            heapq.heappush(events, (seconds, LOAD, next(sequence), next_trip, seconds, None, None))
+
+        elif kind == LOAD:
+            loader.load(trip)
+            if trip.inventory:
+                depart(trip, seconds)
+            else:
+                wait_for_packages(trip)
+
+        else:
+            # packages arrive at the hub: load the waiting trucks in turn while there are packages for them
+            waiting_trucks = list(idle_trucks)
+            idle_trucks.clear()
+            departure_time = (midnight + datetime.timedelta(seconds=seconds)).time()
+            for position, trip in enumerate(waiting_trucks):
+                trip.departure_time = departure_time
+                loader.load(trip)
+                if not trip.inventory:
+                    for waiting_trip in waiting_trucks[position:]:
+                        wait_for_packages(waiting_trip)
+                    break
+                depart(trip, seconds)
+
+    return trips
+
+
+def apply_package_updates(trips: list, city_map: model.Graph, updates,
+                          improve_route: bool = False, time_budget: float = 0.05, deadline_aware: bool = False) -> list:
+    """
+    Applies delays and address corrections that became known during a simulated day, re-planning only the trips hit.
+
+    Updates are handled in time order. A package delivered before its update was known is
+    left as it was. Otherwise its destination and hub arrival time are changed and the trip
+    carrying it is re-planned from where that truck was at the update time (see
+    controller.replan_truck). A later trip of the same truck that left when the truck was
+    back at the hub is delayed, and re-planned from the hub, if the truck now returns after
+    it was due to leave; the other trucks are untouched.
+
+    Parameters
+    ----------
+    trips : list of model.DeliveryTruck
+        Every trip of the day, after delivery, as returned by simulate_fleet or simulate_fleet_events.
+    city_map : model.Graph
+        The graph object representing the city map.
+    updates : Iterable[tuple]
+        (update time, package, new destination or None, new hub arrival time or None) per change.
+    improve_route : bool, optional
+        Whether to improve each re-planned route with local search (default is False).
+    time_budget : float, optional
+        The most seconds to spend improving each re-planned route (default is 0.05).
+    deadline_aware : bool, optional
+        Whether to plan each re-planned route around package deadlines (default is False).
+
+    Returns
+    -------
+    list of model.PackageWGUPS
+        The packages taken off their truck because they now reach the hub after it departs;
+        they are left at the hub, undelivered.
+    """
+    today = datetime.date.today()
+
+    def return_time_of(trip):
+        """
+        Returns the time a delivered trip is back where it started.
+        """
+        return (datetime.datetime.combine(today, trip.departure_time) + trip.travel_delta).time()
+
+    trip_of = {package.package_id: trip for trip in trips for package in trip.manifest}
+    trips_of = {}  # truck label -> its trips in departure order
+    for trip in sorted(trips, key=lambda trip: trip.departure_time):
+        trips_of.setdefault(trip.label, []).append(trip)
+    left_at_hub = []
+
+    for update_time, package, destination, time_arrived in sorted(updates, key=lambda update: update[0]):
+        if package.time_delivered is not None and package.time_delivered < update_time:
+            continue  # delivered before the change was known
+        if destination is not None:
+            package.destination = destination
+        if time_arrived is not None:
+            if time_arrived > package.time_arrived:
+                package.status_arrival = "Delayed on flight"
+            package.time_arrived = time_arrived
+        trip = trip_of.get(package.package_id)
+        if trip is None:
+            continue  # already taken off its truck by an earlier update
+        old_return_time = return_time_of(trip)
+        returned = controller.replan_truck(trip, city_map, update_time, [package],
+                                           improve_route, time_budget, deadline_aware)
+        for returned_package in returned:
+            del trip_of[returned_package.package_id]
+            left_at_hub.append(returned_package)
+
+        # a later trip of the truck that waited for it to come back now leaves when it is back
+        truck_trips = trips_of[trip.label]
+        for later_trip in truck_trips[truck_trips.index(trip) + 1:]:
+            return_time = return_time_of(trip)
+            if not old_return_time <= later_trip.departure_time < return_time:
+                break
+            old_return_time = return_time_of(later_trip)
+            later_trip.departure_time = return_time
+            for later_package in later_trip.manifest:
+                later_package.time_loaded = return_time
+                later_package.time_delivered = None
+            controller.replan_truck(later_trip, city_map, return_time, later_trip.manifest,
+                                    improve_route, time_budget, deadline_aware)
+            trip = later_trip
+
+    return left_at_hub
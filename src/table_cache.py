@@ -0,0 +1,146 @@
+__author__ = "Joseph Curtis"
+__license__ = "BSD 4-Clause"
+__copyright__ = """Copyright 2023 Joseph Curtis 
+
+ Licensed under the BSD 4-Clause License, (the “Original” or “Old” License);
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+  https://choosealicense.com/licenses/bsd-4-clause/
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+ WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+ License for the specific language governing permissions and limitations under
+ the License.
+
+ If you use this software, please cite it using the metadata from the
+ CITATION.cff file.
+
+"""
+
+
+# Description: Compiled, memory-mapped cache of a parsed distance table
+# Date: 29 Apr 2023
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+from model import Vertex, Graph
+from utilities import PackedDistanceMatrix
+
+# File layout (header is little-endian, distances use the byte order recorded in the header):
+#   magic, version, byte order (0 little / 1 big), vertex count, SHA-256 of the source CSV,
+#   length of the vertex JSON, offset of the distances
+#   vertex JSON: [[label, address, zipcode], ...] in matrix index order
+#   padding up to an 8-byte boundary
+#   packed lower-triangle float64 distances, row after row
+CACHE_MAGIC = b'DRPT'
+CACHE_VERSION = 1
+_HEADER = struct.Struct('<4sHHI32sQQ')
+_BYTE_ORDER = 0 if sys.byteorder == 'little' else 1
+
+
+def file_hash(file_name: str) -> bytes:
+    """
+    Computes the SHA-256 digest of a file's content.
+
+    Parameters
+    ----------
+    file_name : str
+        The file to hash.
+
+    Returns
+    -------
+    bytes
+        The 32-byte digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as source_file:
+        for block in iter(lambda: source_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def write_table_cache(cache_file: str, city_map: Graph, source_hash: bytes):
+    """
+    Writes a graph's vertices and packed distance matrix to a cache file.
+
+    The file is written next to its destination and then renamed over it, so processes
+    reading the cache never see a partially written file.
+
+    Parameters
+    ----------
+    cache_file : str
+        The cache file to create or replace.
+    city_map : Graph
+        The graph to store; its distance_matrix must be a PackedDistanceMatrix.
+    source_hash : bytes
+        The SHA-256 digest of the CSV the graph was loaded from.
+    """
+    if not isinstance(city_map.distance_matrix, PackedDistanceMatrix):
+        raise TypeError('Only graphs with a PackedDistanceMatrix can be cached')
+
+    vertex_json = json.dumps([[vertex.label, vertex.address, vertex.zipcode]
+                              for vertex in city_map.vertex_list]).encode('utf-8')
+    data_offset = _HEADER.size + len(vertex_json)
+    data_offset += -data_offset % 8  # align the distances to 8 bytes
+
+    temp_file = cache_file + '.' + str(os.getpid()) + '.tmp'
+    with open(temp_file, 'wb') as output:
+        output.write(_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, _BYTE_ORDER, len(city_map.vertex_list),
+                                  source_hash, len(vertex_json), data_offset))
+        output.write(vertex_json)
+        output.write(b'\0' * (data_offset - _HEADER.size - len(vertex_json)))
+        output.write(city_map.distance_matrix.buffer)
+    os.replace(temp_file, cache_file)
+
+
+def read_table_cache(cache_file: str, source_hash: bytes = None):
+    """
+    Loads a graph from a cache file, memory-mapping the distance matrix instead of reading it.
+
+    The distances stay in the page cache shared by every process that maps the same file;
+    the returned graph's matrix is read-only.
+
+    Parameters
+    ----------
+    cache_file : str
+        The cache file to read.
+    source_hash : bytes, optional
+        If given, the cache is only used if it was built from a CSV with this SHA-256 digest.
+
+    Returns
+    -------
+    Graph or None
+        The cached graph, or None if the file is missing, stale, or in another format.
+    """
+    try:
+        with open(cache_file, 'rb') as cache:
+            header = cache.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return None
+            magic, version, byte_order, size, cached_hash, json_length, data_offset = _HEADER.unpack(header)
+            if magic != CACHE_MAGIC or version != CACHE_VERSION or byte_order != _BYTE_ORDER:
+                return None
+            if source_hash is not None and cached_hash != source_hash:
+                return None
+            vertices = [Vertex(label, address, zipcode)
+                        for label, address, zipcode in json.loads(cache.read(json_length).decode('utf-8'))]
+            data_end = data_offset + 8 * (size * (size + 1) // 2)
+            if len(vertices) != size or os.fstat(cache.fileno()).st_size < data_end:
+                return None
+            # every check is done before mapping, so no failed read leaves a mapping open;
+            # the mapping stays valid after the file is closed
+            mapped = mmap.mmap(cache.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, TypeError):
+        return None
+
+    city_map = Graph(distance_matrix=PackedDistanceMatrix.from_buffer(
+        memoryview(mapped)[data_offset:data_end], size))
+    for vertex in vertices:
+        city_map.add_vertex(vertex)
+    return city_map
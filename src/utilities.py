@@ -22,16 +22,25 @@ __copyright__ = """Copyright 2023 Joseph Curtis
 
 # Description: Data structures and misc. utility functions
 # Date: 29 Apr 2023
+from array import array
 
 
 class ChainingHashTable:
     """
     A Hash Table that uses chaining to handle collisions.
 
+    The table rehashes into more buckets whenever an insert would push the load factor
+    (items per bucket) above max_load_factor, so chains stay short at any size.
+
     Parameters
     ----------
     bucket_number : int
         Defines how large the hash table is (how many buckets it will have, default is 31)
+    max_load_factor : float
+        The largest number of items per bucket before the table grows (default is 0.75).
+    min_load_factor : float, optional
+        If given, the table shrinks when a remove drops the load factor below this value,
+        but never below its initial bucket_number (default is None, never shrink).
 
     Attributes
     ----------
@@ -40,6 +49,10 @@ class ChainingHashTable:
     hash_table : List[List[Tuple[Any, Any]]]
         A list of lists representing the hash table. Each inner list contains tuples
         of (key, value) pairs.
+    max_load_factor : float
+        The largest number of items per bucket before the table grows.
+    min_load_factor : float
+        The smallest number of items per bucket before the table shrinks, or None.
 
     Methods
     -------
@@ -49,9 +62,16 @@ class ChainingHashTable:
         Returns the value associated with the given key in the hash table.
     remove(key: Any) -> None
         Removes the key/value pair associated with the given key from the hash table.
+    insert_many(items: Iterable[Tuple[Any, Any]]) -> None
+        Inserts many key/value pairs into the hash table.
+    get_many(keys: Iterable[Any]) -> List[Any]
+        Returns the values associated with many keys, in order.
+    reserve(item_count: int) -> None
+        Grows the hash table so it can hold item_count items without rehashing.
     """
 
-    def __init__(self, bucket_number: int = 31):
+    def __init__(self, bucket_number: int = 31, max_load_factor: float = 0.75,
+                 min_load_factor: float = None):
         """
         Initializes a new instance of the ChainingHashTable class.
 
@@ -59,8 +79,23 @@ class ChainingHashTable:
         ----------
         bucket_number : int, optional
             The number of buckets in the hash table (default is 31).
+        max_load_factor : float, optional
+            The largest number of items per bucket before the table grows (default is 0.75).
+        min_load_factor : float, optional
+            The smallest number of items per bucket before the table shrinks (default is None, never shrink).
         """
+        if bucket_number < 1:
+            raise ValueError('bucket_number must be at least 1')
+        if max_load_factor <= 0:
+            raise ValueError('max_load_factor must be positive')
+        if min_load_factor is not None and not 0 <= min_load_factor < max_load_factor / 2:
+            # a gap between the thresholds keeps an insert/remove pair from resizing back and forth
+            raise ValueError('min_load_factor must be less than half of max_load_factor')
         self.bucket_number = bucket_number
+        self.max_load_factor = max_load_factor
+        self.min_load_factor = min_load_factor
+        self._min_bucket_number = bucket_number
+        self._count = 0
         self.hash_table = [[] for _ in range(self.bucket_number)]
 
     def __iter__(self) -> "ChainingHashTableIter":  # make this object iterable
@@ -73,10 +108,7 @@ class ChainingHashTable:
         """
         Returns the number of key/value pairs in the hash table.
         """
-        count = 0
-        for bucket in self.hash_table:
-            count += len(bucket)
-        return count
+        return self._count
 
     def __repr__(self):
         """
@@ -122,6 +154,9 @@ class ChainingHashTable:
             bucket[index] = (key, value)
         else:
             bucket.append((key, value))
+            self._count += 1
+            if self._count > self.max_load_factor * self.bucket_number:
+                self._rehash(2 * self.bucket_number + 1)
 
     def get(self, key):
         """
@@ -185,8 +220,107 @@ class ChainingHashTable:
 
         if found_key:
             bucket.pop(index)  # delete the record
+            self._count -= 1
+            if self.min_load_factor is not None \
+                    and self.bucket_number > self._min_bucket_number \
+                    and self._count < self.min_load_factor * self.bucket_number:
+                self._rehash(max(self._min_bucket_number, self.bucket_number // 2))
         return
 
+    def insert_many(self, items):
+        """
+        Add or update many key/value pairs.
+
+        The table is grown once for the worst case (every key new), then the pairs are
+        grouped by bucket so each bucket's chain is indexed once, however many keys land in it.
+
+        Parameters
+        ----------
+        items : Iterable[Tuple[Any, Any]]
+            The (key, value) pairs to insert, applied in order.
+        """
+        items = list(items)
+        self.reserve(self._count + len(items))
+
+        bucket_number = self.bucket_number
+        grouped = {}
+        for record in items:
+            grouped.setdefault(hash(record[0]) % bucket_number, []).append(record)
+
+        for hashed_key, records in grouped.items():
+            bucket = self.hash_table[hashed_key]
+            positions = {record_key: index for index, (record_key, _) in enumerate(bucket)}
+            for key, value in records:
+                index = positions.get(key)
+                if index is None:
+                    positions[key] = len(bucket)
+                    bucket.append((key, value))
+                    self._count += 1
+                else:
+                    bucket[index] = (key, value)
+
+    def get_many(self, keys):
+        """
+        Returns the values associated with many keys, in the order of the keys.
+
+        Keys are grouped by bucket so each bucket's chain is indexed once.
+
+        Parameters
+        ----------
+        keys : Iterable[Any]
+            The keys to search for in the hash table.
+
+        Returns
+        -------
+        List[Any]
+            The value for each key, or None where the key was not found.
+        """
+        bucket_number = self.bucket_number
+        grouped = {}
+        results = []
+        for position, key in enumerate(keys):
+            grouped.setdefault(hash(key) % bucket_number, []).append((position, key))
+            results.append(None)
+
+        for hashed_key, requests in grouped.items():
+            records = dict(self.hash_table[hashed_key])
+            for position, key in requests:
+                results[position] = records.get(key)
+        return results
+
+    def reserve(self, item_count: int):
+        """
+        Grows the hash table so it can hold item_count items without rehashing.
+
+        Call this before a bulk load to rehash at most once.
+
+        Parameters
+        ----------
+        item_count : int
+            The number of items the table should hold.
+        """
+        bucket_number = self.bucket_number
+        while item_count > self.max_load_factor * bucket_number:
+            bucket_number = 2 * bucket_number + 1
+        if bucket_number != self.bucket_number:
+            self._rehash(bucket_number)
+
+    def _rehash(self, bucket_number: int):
+        """
+        Moves every key/value pair into a new list of bucket_number buckets.
+
+        Parameters
+        ----------
+        bucket_number : int
+            The number of buckets in the new hash table.
+        """
+        new_table = [[] for _ in range(bucket_number)]
+        for bucket in self.hash_table:
+            for record in bucket:
+                new_table[hash(record[0]) % bucket_number].append(record)
+        self.bucket_number = bucket_number
+        self.hash_table = new_table
+
 
 class ChainingHashTableIter:
     """
@@ -248,3 +382,747 @@ class ChainingHashTableIter:
 
         raise StopIteration
 
+
+class OpenAddressingHashTable:
+    """
+    A Hash Table that uses open addressing (linear probing) to handle collisions.
+
+    Keys and values are kept in two parallel lists instead of one list of (key, value)
+    tuples per bucket, which saves a tuple and a list per item and keeps probes in
+    neighboring slots. It has the same interface as ChainingHashTable.
+
+    Parameters
+    ----------
+    bucket_number : int
+        Defines how large the hash table is, rounded up to a power of two (default is 32)
+    max_load_factor : float
+        The largest fraction of used slots (items and deleted markers) before the table grows (default is 0.5).
+    min_load_factor : float, optional
+        If given, the table shrinks when a remove drops the load factor below this value,
+        but never below its initial bucket_number (default is None, never shrink).
+
+    Attributes
+    ----------
+    bucket_number : int
+        The number of slots in the hash table.
+    max_load_factor : float
+        The largest fraction of used slots before the table grows.
+    min_load_factor : float
+        The smallest fraction of slots holding items before the table shrinks, or None.
+
+    Methods
+    -------
+    insert(key: Any, value: Any) -> None
+        Inserts a key/value pair into the hash table.
+    get(key: Any) -> Any
+        Returns the value associated with the given key in the hash table.
+    remove(key: Any) -> None
+        Removes the key/value pair associated with the given key from the hash table.
+    insert_many(items: Iterable[Tuple[Any, Any]]) -> None
+        Inserts many key/value pairs into the hash table.
+    get_many(keys: Iterable[Any]) -> List[Any]
+        Returns the values associated with many keys, in order.
+    reserve(item_count: int) -> None
+        Grows the hash table so it can hold item_count items without rehashing.
+    """
+    _EMPTY = object()  # slot never used
+    _DELETED = object()  # slot whose item was removed; probing continues past it
+
+    def __init__(self, bucket_number: int = 32, max_load_factor: float = 0.5,
+                 min_load_factor: float = None):
+        """
+        Initializes a new instance of the OpenAddressingHashTable class.
+
+        Parameters
+        ----------
+        bucket_number : int, optional
+            The number of slots in the hash table, rounded up to a power of two (default is 32).
+        max_load_factor : float, optional
+            The largest fraction of used slots before the table grows (default is 0.5).
+        min_load_factor : float, optional
+            The smallest fraction of slots holding items before the table shrinks (default is None, never shrink).
+        """
+        if bucket_number < 1:
+            raise ValueError('bucket_number must be at least 1')
+        if not 0 < max_load_factor < 1:
+            raise ValueError('max_load_factor must be between 0 and 1')
+        if min_load_factor is not None and not 0 <= min_load_factor < max_load_factor / 2:
+            # a gap between the thresholds keeps an insert/remove pair from resizing back and forth
+            raise ValueError('min_load_factor must be less than half of max_load_factor')
+        self.bucket_number = 1 << (bucket_number - 1).bit_length()
+        self.max_load_factor = max_load_factor
+        self.min_load_factor = min_load_factor
+        self._min_bucket_number = self.bucket_number
+        self._count = 0  # slots holding an item
+        self._used = 0  # slots holding an item or a deleted marker
+        self._keys = [self._EMPTY] * self.bucket_number
+        self._values = [None] * self.bucket_number
+
+    def __iter__(self):
+        """
+        Returns an iterator of the (key, value) pairs in the hash table.
+        """
+        deleted = self._DELETED
+        empty = self._EMPTY
+        return ((key, value) for key, value in zip(self._keys, self._values)
+                if key is not empty and key is not deleted)
+
+    def __len__(self):
+        """
+        Returns the number of key/value pairs in the hash table.
+        """
+        return self._count
+
+    def __repr__(self):
+        """
+        Returns a string representation of the hash table.
+        """
+        return f'OpenAddressingHashTable({list(self)})'
+
+    def __str__(self):
+        """
+        Returns a string representation of the hash table.
+        """
+        return "".join(str(item) for item in self)
+
+    def _find_slot(self, key):
+        """
+        Probes for the slot holding key.
+
+        Returns
+        -------
+        Tuple[int, int]
+            The slot holding key (or -1 if not found), and the first free slot
+            (deleted or empty) seen on the probe path, where key would be inserted.
+        """
+        keys = self._keys
+        mask = self.bucket_number - 1
+        index = hash(key) & mask
+        free_slot = -1
+        while True:
+            record_key = keys[index]
+            if record_key is self._EMPTY:
+                return -1, index if free_slot < 0 else free_slot
+            if record_key is self._DELETED:
+                if free_slot < 0:
+                    free_slot = index
+            elif record_key == key:
+                return index, free_slot
+            index = (index + 1) & mask
+
+    def insert(self, key, value):
+        """
+        Add or update a new key/value pair into the hash table.
+
+        Parameters
+        ----------
+        key : Any
+            The key to insert.
+        value : Any
+            The value associated with the key.
+        """
+        index, free_slot = self._find_slot(key)
+        if index >= 0:
+            self._values[index] = value
+            return
+
+        if self._keys[free_slot] is self._EMPTY:
+            self._used += 1
+        self._keys[free_slot] = key
+        self._values[free_slot] = value
+        self._count += 1
+        if self._used > self.max_load_factor * self.bucket_number:
+            # grow only if live items fill the table; otherwise clearing deleted markers is enough
+            if self._count > self.max_load_factor * self.bucket_number / 2:
+                self._rehash(2 * self.bucket_number)
+            else:
+                self._rehash(self.bucket_number)
+
+    def get(self, key):
+        """
+        Returns the value associated with the given key in the hash table.
+
+        Parameters
+        ----------
+        key : Any
+            The key to search for in the hash table.
+
+        Returns
+        -------
+        Any
+            The value associated with the key, or None if the key was not found.
+        """
+        index, _ = self._find_slot(key)
+        if index >= 0:
+            return self._values[index]
+        return None
+
+    def remove(self, key):
+        """
+        Remove a record with matching key
+
+        Parameters
+        ----------
+        key :
+            The index key to search
+        """
+        index, _ = self._find_slot(key)
+        if index < 0:
+            return
+        self._keys[index] = self._DELETED
+        self._values[index] = None
+        self._count -= 1
+        if self.min_load_factor is not None \
+                and self.bucket_number > self._min_bucket_number \
+                and self._count < self.min_load_factor * self.bucket_number:
+            self._rehash(self.bucket_number // 2)
+
+    def insert_many(self, items):
+        """
+        Add or update many key/value pairs.
+
+        The table is grown once for the worst case (every key new) before any pair is inserted.
+
+        Parameters
+        ----------
+        items : Iterable[Tuple[Any, Any]]
+            The (key, value) pairs to insert, applied in order.
+        """
+        items = list(items)
+        self.reserve(self._count + len(items))
+        for key, value in items:
+            self.insert(key, value)
+
+    def get_many(self, keys):
+        """
+        Returns the values associated with many keys, in the order of the keys.
+
+        Parameters
+        ----------
+        keys : Iterable[Any]
+            The keys to search for in the hash table.
+
+        Returns
+        -------
+        List[Any]
+            The value for each key, or None where the key was not found.
+        """
+        find_slot = self._find_slot
+        values = self._values
+        results = []
+        for key in keys:
+            index, _ = find_slot(key)
+            results.append(values[index] if index >= 0 else None)
+        return results
+
+    def reserve(self, item_count: int):
+        """
+        Grows the hash table so it can hold item_count items without rehashing.
+
+        Parameters
+        ----------
+        item_count : int
+            The number of items the table should hold.
+        """
+        bucket_number = self.bucket_number
+        while item_count > self.max_load_factor * bucket_number:
+            bucket_number *= 2
+        if bucket_number != self.bucket_number:
+            self._rehash(bucket_number)
+
+    def _rehash(self, bucket_number: int):
+        """
+        Moves every key/value pair into new lists of bucket_number slots, dropping deleted markers.
+
+        Parameters
+        ----------
+        bucket_number : int
+            The number of slots in the new hash table; a power of two.
+        """
+        records = list(self)
+        self.bucket_number = bucket_number
+        self._keys = [self._EMPTY] * bucket_number
+        self._values = [None] * bucket_number
+        self._count = 0
+        self._used = 0
+        keys = self._keys
+        values = self._values
+        mask = bucket_number - 1
+        for key, value in records:
+            index = hash(key) & mask
+            while keys[index] is not self._EMPTY:
+                index = (index + 1) & mask
+            keys[index] = key
+            values[index] = value
+        self._count = self._used = len(records)
+
+
+class DistanceMatrix:
+    """
+    A dense, square matrix of distances stored in one contiguous float64 buffer.
+
+    Cell (i, j) holds the distance from vertex index i to vertex index j. Rows are laid
+    out back to back with a stride of ``capacity`` so the matrix can grow without
+    rebuilding on every new vertex; memory use is 8 bytes per allocated cell, capacity
+    squared, which after growing one vertex at a time can be up to four times the cells in
+    use (see reserve and shrink_to_fit).
+
+    Parameters
+    ----------
+    size : int
+        Number of rows (and columns) to allocate up front (default is 0).
+    fill : float
+        Value of cells that have not been set (default is infinity, meaning "no edge").
+
+    Attributes
+    ----------
+    size : int
+        The number of rows (and columns) currently in use.
+    capacity : int
+        The number of rows (and columns) allocated in the buffer.
+    fill : float
+        The value used for unset cells.
+
+    Methods
+    -------
+    row(index: int) -> memoryview
+        Returns a zero-copy view of one row of the matrix.
+    resize(size: int) -> None
+        Grows the matrix to the given number of rows and columns.
+    reserve(size: int) -> None
+        Allocates room for exactly size rows and columns.
+    shrink_to_fit() -> None
+        Releases the unused capacity.
+    """
+    NO_EDGE = float('inf')  # weight of a cell with no edge
+
+    def __init__(self, size: int = 0, fill: float = NO_EDGE):
+        """
+        Initializes a new instance of the DistanceMatrix class.
+
+        Parameters
+        ----------
+        size : int, optional
+            Number of rows (and columns) to allocate up front (default is 0).
+        fill : float, optional
+            Value of cells that have not been set (default is infinity).
+        """
+        self.size = size
+        self.capacity = size
+        self.fill = fill
+        self._data = array('d', [fill]) * (size * size)
+
+    def __len__(self):
+        """
+        Returns the number of rows (and columns) in the matrix.
+        """
+        return self.size
+
+    def __getitem__(self, key):
+        """
+        Returns the distance stored at cell (row, column).
+
+        Parameters
+        ----------
+        key : Tuple[int, int]
+            The (row, column) indices of the cell.
+        """
+        row, column = key
+        if not (0 <= row < self.size and 0 <= column < self.size):
+            raise IndexError('DistanceMatrix index out of range: ' + str(key))
+        return self._data[row * self.capacity + column]
+
+    def __setitem__(self, key, value):
+        """
+        Stores a distance at cell (row, column).
+
+        Parameters
+        ----------
+        key : Tuple[int, int]
+            The (row, column) indices of the cell.
+        value : float
+            The distance to store.
+        """
+        row, column = key
+        if not (0 <= row < self.size and 0 <= column < self.size):
+            raise IndexError('DistanceMatrix index out of range: ' + str(key))
+        self._data[row * self.capacity + column] = value
+
+    def __repr__(self):
+        """
+        Returns a string representation of the matrix.
+        """
+        return f'DistanceMatrix({self.size})'
+
+    @classmethod
+    def from_buffer(cls, buffer, size: int, capacity: int = None) -> 'DistanceMatrix':
+        """
+        Wraps an existing buffer of float64 distances without copying it.
+
+        The result is read-only if the buffer is, and cannot be resized.
+
+        Parameters
+        ----------
+        buffer : Any
+            An object supporting the buffer protocol holding capacity * capacity float64 values.
+        size : int
+            The number of rows (and columns) in use.
+        capacity : int, optional
+            The row stride of the buffer (default is size).
+
+        Returns
+        -------
+        DistanceMatrix
+            A matrix backed by the given buffer.
+        """
+        capacity = size if capacity is None else capacity
+        data = memoryview(buffer)
+        if data.format != 'd':
+            data = data.cast('B').cast('d')
+        if len(data) != capacity * capacity or capacity < size:
+            raise ValueError('Buffer holds ' + str(len(data)) + ' distances, a matrix with capacity '
+                             + str(capacity) + ' needs ' + str(capacity * capacity))
+        matrix = cls.__new__(cls)
+        matrix.size = size
+        matrix.capacity = capacity
+        matrix.fill = cls.NO_EDGE
+        matrix._data = data
+        return matrix
+
+    @property
+    def buffer(self) -> memoryview:
+        """
+        A zero-copy view of the float64 distances, row after row with a stride of capacity.
+        """
+        return memoryview(self._data)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The number of bytes held by the underlying buffer.
+        """
+        return self._data.itemsize * len(self._data)
+
+    def row(self, index: int) -> memoryview:
+        """
+        Returns a zero-copy view of one row of the matrix.
+
+        The view stays valid after a resize, but then refers to the old buffer.
+
+        Parameters
+        ----------
+        index : int
+            The row index.
+
+        Returns
+        -------
+        memoryview
+            A view of ``size`` distances from vertex ``index`` to every other vertex.
+        """
+        if not 0 <= index < self.size:
+            raise IndexError('DistanceMatrix row out of range: ' + str(index))
+        start = index * self.capacity
+        return memoryview(self._data)[start:start + self.size]
+
+    def resize(self, size: int):
+        """
+        Grows the matrix to the given number of rows and columns.
+
+        The buffer capacity at least doubles each time it is exceeded, so adding
+        vertices one by one costs amortized O(n) per vertex. The price is memory: the
+        buffer can hold up to four times the cells in use (and briefly five while it is
+        copied), so call reserve first when the final size is known, or shrink_to_fit
+        once the matrix is complete.
+
+        Parameters
+        ----------
+        size : int
+            The new number of rows (and columns); must not be smaller than the current size.
+        """
+        if size < self.size:
+            raise ValueError('DistanceMatrix cannot shrink from ' + str(self.size) + ' to ' + str(size))
+        if size > self.capacity:
+            self._reallocate(max(size, 2 * self.capacity))
+        self.size = size
+
+    def reserve(self, size: int):
+        """
+        Allocates room for exactly size rows and columns, so growing to that size never reallocates.
+
+        Parameters
+        ----------
+        size : int
+            The number of rows (and columns) the matrix should hold.
+        """
+        if size > self.capacity:
+            self._reallocate(size)
+
+    def shrink_to_fit(self):
+        """
+        Releases the unused capacity, leaving a buffer of exactly size * size distances.
+        """
+        if self.capacity > self.size:
+            self._reallocate(self.size)
+
+    def _reallocate(self, capacity: int):
+        """
+        Copies the cells in use into a new buffer with the given row stride.
+
+        Parameters
+        ----------
+        capacity : int
+            The number of rows (and columns) to allocate; at least the current size.
+        """
+        if not isinstance(self._data, array):
+            raise TypeError('DistanceMatrix backed by an external buffer cannot be resized')
+        new_data = array('d', [self.fill]) * (capacity * capacity)
+        for index in range(self.size):
+            old_start = index * self.capacity
+            new_start = index * capacity
+            new_data[new_start:new_start + self.size] = self._data[old_start:old_start + self.size]
+        self._data = new_data
+        self.capacity = capacity
+
+
+class PackedDistanceMatrix:
+    """
+    A symmetric matrix of distances stored as a packed lower triangle in one float64 buffer.
+
+    Only cells (i, j) with j <= i are stored, row after row, so an n-vertex matrix takes
+    8 * n * (n + 1) / 2 bytes and growing by one vertex just appends one row. Reading or
+    writing cell (i, j) also reads or writes cell (j, i).
+
+    Parameters
+    ----------
+    size : int
+        Number of rows (and columns) to allocate up front (default is 0).
+    fill : float
+        Value of cells that have not been set (default is infinity, meaning "no edge").
+
+    Attributes
+    ----------
+    size : int
+        The number of rows (and columns) currently in use.
+    fill : float
+        The value used for unset cells.
+
+    Methods
+    -------
+    row(index: int) -> PackedDistanceMatrixRow
+        Returns a zero-copy view of one row of the matrix.
+    set_row(index: int, values: Iterable[float]) -> None
+        Stores the lower-triangle distances of one row.
+    resize(size: int) -> None
+        Grows the matrix to the given number of rows and columns.
+    """
+    NO_EDGE = DistanceMatrix.NO_EDGE  # weight of a cell with no edge
+
+    def __init__(self, size: int = 0, fill: float = NO_EDGE):
+        """
+        Initializes a new instance of the PackedDistanceMatrix class.
+
+        Parameters
+        ----------
+        size : int, optional
+            Number of rows (and columns) to allocate up front (default is 0).
+        fill : float, optional
+            Value of cells that have not been set (default is infinity).
+        """
+        self.size = size
+        self.fill = fill
+        self._data = array('d', [fill]) * (size * (size + 1) // 2)
+
+    def __len__(self):
+        """
+        Returns the number of rows (and columns) in the matrix.
+        """
+        return self.size
+
+    def __getitem__(self, key):
+        """
+        Returns the distance stored at cell (row, column).
+
+        Parameters
+        ----------
+        key : Tuple[int, int]
+            The (row, column) indices of the cell.
+        """
+        row, column = key
+        if not (0 <= row < self.size and 0 <= column < self.size):
+            raise IndexError('PackedDistanceMatrix index out of range: ' + str(key))
+        if column > row:
+            row, column = column, row
+        return self._data[row * (row + 1) // 2 + column]
+
+    def __setitem__(self, key, value):
+        """
+        Stores a distance at cell (row, column), and so also at (column, row).
+
+        Parameters
+        ----------
+        key : Tuple[int, int]
+            The (row, column) indices of the cell.
+        value : float
+            The distance to store.
+        """
+        row, column = key
+        if not (0 <= row < self.size and 0 <= column < self.size):
+            raise IndexError('PackedDistanceMatrix index out of range: ' + str(key))
+        if column > row:
+            row, column = column, row
+        self._data[row * (row + 1) // 2 + column] = value
+
+    def __repr__(self):
+        """
+        Returns a string representation of the matrix.
+        """
+        return f'PackedDistanceMatrix({self.size})'
+
+    @classmethod
+    def from_buffer(cls, buffer, size: int) -> 'PackedDistanceMatrix':
+        """
+        Wraps an existing buffer of packed float64 distances without copying it.
+
+        The result is read-only if the buffer is (e.g. a read-only mmap) and cannot be resized.
+
+        Parameters
+        ----------
+        buffer : Any
+            An object supporting the buffer protocol holding size * (size + 1) / 2 float64 values.
+        size : int
+            The number of rows (and columns) of the matrix.
+
+        Returns
+        -------
+        PackedDistanceMatrix
+            A matrix backed by the given buffer.
+        """
+        data = memoryview(buffer)
+        if data.format != 'd':
+            data = data.cast('B').cast('d')
+        if len(data) != size * (size + 1) // 2:
+            raise ValueError('Buffer holds ' + str(len(data)) + ' distances, a matrix of size '
+                             + str(size) + ' needs ' + str(size * (size + 1) // 2))
+        matrix = cls.__new__(cls)
+        matrix.size = size
+        matrix.fill = cls.NO_EDGE
+        matrix._data = data
+        return matrix
+
+    @property
+    def buffer(self) -> memoryview:
+        """
+        A zero-copy view of the packed float64 distances, row after row.
+        """
+        return memoryview(self._data)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The number of bytes held by the underlying buffer.
+        """
+        return self._data.itemsize * len(self._data)
+
+    def row(self, index: int) -> 'PackedDistanceMatrixRow':
+        """
+        Returns a zero-copy view of one row of the matrix.
+
+        Parameters
+        ----------
+        index : int
+            The row index.
+
+        Returns
+        -------
+        PackedDistanceMatrixRow
+            A view of ``size`` distances from vertex ``index`` to every other vertex.
+        """
+        if not 0 <= index < self.size:
+            raise IndexError('PackedDistanceMatrix row out of range: ' + str(index))
+        return PackedDistanceMatrixRow(self, index)
+
+    def set_row(self, index: int, values):
+        """
+        Stores the lower-triangle distances of one row, cells (index, 0) to (index, index).
+
+        Parameters
+        ----------
+        index : int
+            The row index.
+        values : Iterable[float]
+            Exactly index + 1 distances.
+        """
+        if not 0 <= index < self.size:
+            raise IndexError('PackedDistanceMatrix row out of range: ' + str(index))
+        start = index * (index + 1) // 2
+        values = array('d', values)
+        if len(values) != index + 1:
+            raise ValueError('Row ' + str(index) + ' needs ' + str(index + 1)
+                             + ' distances, got ' + str(len(values)))
+        self._data[start:start + index + 1] = values
+
+    def resize(self, size: int):
+        """
+        Grows the matrix to the given number of rows and columns.
+
+        Parameters
+        ----------
+        size : int
+            The new number of rows (and columns); must not be smaller than the current size.
+        """
+        if size < self.size:
+            raise ValueError('PackedDistanceMatrix cannot shrink from ' + str(self.size) + ' to ' + str(size))
+        if not isinstance(self._data, array):
+            raise TypeError('PackedDistanceMatrix backed by an external buffer cannot be resized')
+        self._data.extend(array('d', [self.fill]) * ((size * (size + 1) - self.size * (self.size + 1)) // 2))
+        self.size = size
+
+
+class PackedDistanceMatrixRow:
+    """
+    A read-only view of one row of a PackedDistanceMatrix.
+
+    Parameters
+    ----------
+    matrix : PackedDistanceMatrix
+        The matrix to read from.
+    index : int
+        The row index.
+    """
+    __slots__ = ('_data', '_index', '_start', '_size')
+
+    def __init__(self, matrix: PackedDistanceMatrix, index: int):
+        """
+        Initializes a view of row ``index`` of the given matrix.
+        """
+        self._data = matrix._data
+        self._index = index
+        self._start = index * (index + 1) // 2
+        self._size = matrix.size
+
+    def __len__(self):
+        """
+        Returns the number of columns in the row.
+        """
+        return self._size
+
+    def __getitem__(self, column: int) -> float:
+        """
+        Returns the distance from this row's vertex to vertex ``column``.
+        """
+        if column <= self._index:
+            if column < 0:
+                raise IndexError('PackedDistanceMatrixRow index out of range: ' + str(column))
+            return self._data[self._start + column]
+        if column >= self._size:
+            raise IndexError('PackedDistanceMatrixRow index out of range: ' + str(column))
+        return self._data[column * (column + 1) // 2 + self._index]
+
+    def tolist(self) -> list:
+        """
+        Returns the whole row as a list of floats, like memoryview.tolist() for a DistanceMatrix row.
+        """
+        data = self._data
+        index = self._index
+        return data[self._start:self._start + index + 1].tolist() + \
+            [data[column * (column + 1) // 2 + index] for column in range(index + 1, self._size)]
@@ -19,9 +19,12 @@ __copyright__ = """Copyright 2023 Joseph Curtis
 
 """
 
+import csv
+import json
 import sys
 import datetime
 
+from model import PackageStatusTimeline
 from utilities import ChainingHashTable
 
 
@@ -71,11 +74,96 @@ def input_valid_package_id(packages_hash_table: ChainingHashTable):
             print("incorrect format. Try again or enter 'x' to exit.")
 
 
-def main_menu(packages_hash_table: ChainingHashTable, truck_list):
+REPORT_COLUMNS = ('time', 'package_id', 'address', 'city', 'state', 'zip', 'deadline', 'mass_kg', 'status')
+
+
+def parse_report_time(text: str) -> datetime.time:
+    """
+    Converts a time in 'HHMM' format, the format the menu asks for, to a datetime.time.
+    Raises ValueError if the text is not a valid time of exactly four digits
+    (strptime alone would also read shorter text, e.g. "25" as 02:05).
+    """
+    text = text.strip()
+    if not (len(text) == 4 and text.isascii() and text.isdigit()):
+        raise ValueError('time must be four digits in HHMM format: ' + repr(text))
+    return datetime.datetime.strptime(text, '%H%M').time()
+
+
+def write_status_reports(packages_hash_table: ChainingHashTable, timeline: PackageStatusTimeline,
+                         report_times, package_ids=None, report_file: str = None, report_format: str = 'csv'):
+    """
+    Writes the status of the chosen packages at each of the report times, without the menu.
+    One row per package per time, with the columns in REPORT_COLUMNS, as CSV or as a JSON
+    array of objects. Everything goes through one buffered writer, and the columns that do
+    not change with time are formatted once per package, not once per row.
+    package_ids of None reports every package, in the order of the timeline.
+    report_file of None or '-' writes to standard output.
+    """
+    if package_ids is None:
+        packages = None
+    else:
+        packages = [(package_id, packages_hash_table.get(package_id)) for package_id in package_ids]
+
+    def fixed_columns(pkg):
+        return (pkg.package_id, pkg.destination.address, pkg.city, pkg.state, pkg.destination.zipcode,
+                pkg.deadline_str, pkg.mass_kg)
+
+    def statuses(chosen_time):
+        if packages is None:
+            return timeline.statuses_at(chosen_time)
+        return [(pkg, timeline.status_at(package_id, chosen_time)) for package_id, pkg in packages]
+
+    if report_file is None or report_file == '-':
+        output = sys.stdout
+    else:
+        output = open(report_file, 'w', newline='', buffering=1 << 20)
+    try:
+        if report_format == 'json':
+            # the fixed columns are encoded once per package as the middle of a JSON object
+            encoded = {}
+            separator = '['
+            for chosen_time in report_times:
+                time_prefix = '{"time": ' + json.dumps(str(chosen_time)) + ', '
+                rows = []
+                for pkg, status in statuses(chosen_time):
+                    middle = encoded.get(pkg.package_id)
+                    if middle is None:
+                        middle = json.dumps(dict(zip(REPORT_COLUMNS[1:-1], fixed_columns(pkg))))[1:-1]
+                        encoded[pkg.package_id] = middle
+                    rows.append(time_prefix + middle + ', "status": ' + json.dumps(status) + '}')
+                if rows:
+                    output.write(separator + '\n' + ',\n'.join(rows))
+                    separator = ','
+            output.write('[]\n' if separator == '[' else '\n]\n')
+        else:
+            writer = csv.writer(output)
+            writer.writerow(REPORT_COLUMNS)
+            fixed = {}
+            for chosen_time in report_times:
+                time_str = str(chosen_time)
+                rows = []
+                for pkg, status in statuses(chosen_time):
+                    columns = fixed.get(pkg.package_id)
+                    if columns is None:
+                        columns = fixed[pkg.package_id] = fixed_columns(pkg)
+                    rows.append((time_str,) + columns + (status,))
+                writer.writerows(rows)
+    finally:
+        if output is sys.stdout:
+            output.flush()
+        else:
+            output.close()
+
+
+def main_menu(packages_hash_table: ChainingHashTable, truck_list, timeline: PackageStatusTimeline = None):
     """
     Displays the main menu options to the user and takes the user's input.
     Calls the appropriate function based on the user's input.
+    Package statuses at a chosen time come from the timeline, which is built here if not given.
     """
+    if timeline is None:
+        timeline = PackageStatusTimeline(pkg for _, pkg in packages_hash_table)
+
     total_miles = 0.0
     for truck in truck_list:
         total_miles += truck.miles_traveled
@@ -117,15 +205,7 @@ def main_menu(packages_hash_table: ChainingHashTable, truck_list):
             except ExitMenu:
                 continue
             pkg = packages_hash_table.get(package_id)
-
-            if chosen_time < pkg.time_arrived:
-                status = pkg.status_arrival
-            elif chosen_time < pkg.time_loaded:
-                status = "waiting at HUB"
-            elif chosen_time < pkg.time_delivered:
-                status = pkg.status_loaded
-            else:
-                status = pkg.status_delivered
+            status = timeline.status_at(package_id, chosen_time)
 
             print('-' * 110)
             print('|' + ("PACKAGE: " + str(pkg.package_id) + "  BOUND FOR: " + pkg.destination.label
@@ -154,17 +234,7 @@ def main_menu(packages_hash_table: ChainingHashTable, truck_list):
             print('-' * 110)
             print("ID | " + "Address".center(30) + " | " + "City".center(16) + " | State | " + "Zip".center(5)
                   + " | Deadline | Mass | " + "Status".center(19))
-            for key_value_tuple in packages_hash_table:
-                key, pkg = key_value_tuple
-                if chosen_time < pkg.time_arrived:
-                    status = pkg.status_arrival
-                elif chosen_time < pkg.time_loaded:
-                    status = "waiting at HUB"
-                elif chosen_time < pkg.time_delivered:
-                    status = pkg.status_loaded
-                else:
-                    status = pkg.status_delivered
-
+            for pkg, status in timeline.statuses_at(chosen_time):
                 print(str(pkg.package_id).rjust(2)
                       + ' | ' + pkg.destination.address[:30].ljust(30)
                       + ' | ' + pkg.city.ljust(16)
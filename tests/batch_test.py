@@ -0,0 +1,71 @@
+_Author_ = "Joseph Curtis"
+# Title: Batch tests
+# Description: Planning many days at many depots with batch.py
+# Date: 29 Apr 2023
+
+import csv
+import json
+import os
+import shutil
+import sys
+
+import batch
+
+
+def write_manifests(package_file: str, manifest_dir: str) -> list:
+    # the sample day, the same day with one package at an address no depot has, and an empty day
+    with open(package_file, 'r') as packages_csv:
+        rows = list(csv.reader(packages_csv))
+    os.makedirs(manifest_dir)
+    days = {'day-1': rows, 'day-2': rows + [['99', '1 Nowhere Rd', 'Salt Lake City', 'UT', '84000', 'EOD', '5', '']],
+            'day-3': rows[:1]}
+    for name, day_rows in days.items():
+        with open(os.path.join(manifest_dir, name + '.csv'), 'w', newline='') as manifest:
+            csv.writer(manifest).writerows(day_rows)
+    return sorted(days)
+
+
+def test_batch_plans_every_day_at_every_depot(table_file, package_file, tmp_path, monkeypatch):
+    manifest_dir = str(tmp_path / 'days')
+    output_dir = str(tmp_path / 'plans')
+    days = write_manifests(package_file, manifest_dir)
+    tables = [shutil.copy(table_file, str(tmp_path / (depot + '.csv'))) for depot in ('depot-a', 'depot-b')]
+    monkeypatch.setattr(sys, 'argv', ['batch.py', '--manifests', manifest_dir, '--tables'] + tables
+                        + ['--output-dir', output_dir, '--processes', '1', '--trucks', '3'])
+
+    batch.batch_main()
+
+    with open(os.path.join(output_dir, 'summary.json'), 'r') as summary_file:
+        summaries = json.load(summary_file)['plans']
+    assert [(summary['depot'], os.path.basename(summary['manifest'])) for summary in summaries] \
+        == [(depot, day + '.csv') for depot in ('depot-a', 'depot-b') for day in days]
+
+    package_ids = list(range(1, 41))
+    for summary in summaries:
+        with open(summary['output'], 'r') as plan_file:
+            plan = json.load(plan_file)
+        day = os.path.splitext(os.path.basename(summary['manifest']))[0]
+        assert summary['output'] == os.path.join(output_dir, summary['depot'], day + '.json')
+        assert plan['depot'] == summary['depot'] and plan['total_miles'] == summary['total_miles']
+        assert plan['late_package_ids'] == summary['late_package_ids']
+        assert plan['unresolved_package_ids'] == summary['unresolved_package_ids']
+
+        if day == 'day-3':
+            assert summary['packages'] == 0 and plan['trips'] == [] and plan['total_miles'] == 0
+            continue
+        # every package at a known address is delivered on exactly one trip by one of the three trucks
+        assert plan['unresolved_package_ids'] == ([99] if day == 'day-2' else [])
+        assert summary['packages'] == len(package_ids) + len(plan['unresolved_package_ids'])
+        assert sorted(package_id for trip in plan['trips'] for package_id in trip['package_ids']) == package_ids
+        assert {trip['label'] for trip in plan['trips']} <= {'Truck 1', 'Truck 2', 'Truck 3'}
+        assert all(trip['route'][0] == trip['route'][-1] for trip in plan['trips'])
+        assert abs(plan['total_miles'] - sum(trip['miles_traveled'] for trip in plan['trips'])) < 0.1 * len(plan['trips'])
+        assert [package['package_id'] for package in plan['packages']] == package_ids
+        assert all('Delivered' in package['status'] for package in plan['packages'])
+        assert set(plan['late_package_ids']) <= set(package_ids)
+
+    # the same day plans the same at both depots, with or without the unresolved package
+    plans = {(summary['depot'], os.path.basename(summary['manifest'])): summary for summary in summaries}
+    for day in ('day-1', 'day-2'):
+        assert plans[('depot-a', day + '.csv')]['total_miles'] == plans[('depot-b', day + '.csv')]['total_miles'] \
+            == plans[('depot-a', 'day-1.csv')]['total_miles']
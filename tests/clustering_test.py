@@ -0,0 +1,102 @@
+_Author_ = "Joseph Curtis"
+# Title: Clustering tests
+# Description: Capacity and mass limits of the fleet partitioning in clustering.py
+# Date: 29 Apr 2023
+
+import math
+import random
+
+import clustering
+from model import DeliveryTruck, PackageWGUPS
+
+
+def random_packages(vertex_list, count, seed, max_mass=40):
+    rng = random.Random(seed)
+    return [PackageWGUPS(package_id, 'Salt Lake City', 'UT', float(rng.randrange(1, max_mass)), '',
+                         vertex_list[rng.randrange(1, len(vertex_list))], 'EOD')
+            for package_id in range(1, count + 1)]
+
+
+def assert_within_limits(trucks):
+    for truck in trucks:
+        assert len(truck.inventory) <= truck.capacity
+        if truck.max_mass_kg is not None:
+            assert sum(package.mass_kg for package in truck.inventory) <= truck.max_mass_kg
+
+
+def test_fastmap_keeps_every_vertex_and_separates_far_pairs(sample_map):
+    city_map, vertex_list, _ = sample_map
+    indices = [vertex.index for vertex in vertex_list]
+    coordinates = clustering.fastmap(city_map, indices)
+    assert set(coordinates) == set(indices)
+    assert all(len(point) == 2 and all(math.isfinite(value) for value in point) for point in coordinates.values())
+    # the furthest pair of the table should not be embedded on top of each other
+    matrix = city_map.distance_matrix
+    far_a, far_b = max(((a, b) for a in indices for b in indices), key=lambda pair: matrix[pair])
+    assert math.dist(coordinates[far_a], coordinates[far_b]) > 0.0
+
+
+def test_partition_respects_capacity_and_mass(sample_map):
+    city_map, vertex_list, hub_address = sample_map
+    for method in (clustering.SWEEP, clustering.KMEANS):
+        for seed in range(5):
+            packages = random_packages(vertex_list, 60, seed)
+            trucks = [DeliveryTruck(hub_address, 'Truck ' + str(number), capacity=16, max_mass_kg=400.0)
+                      for number in range(5)]
+            leftover = clustering.partition_packages(trucks, city_map, packages, method)
+            assert_within_limits(trucks)
+            loaded = [package for truck in trucks for package in truck.inventory]
+            assert sorted(package.package_id for package in loaded + leftover) == list(range(1, 61))
+
+
+def test_same_destination_stays_together(sample_map):
+    city_map, vertex_list, hub_address = sample_map
+    for method in (clustering.SWEEP, clustering.KMEANS):
+        packages = random_packages(vertex_list, 40, 7)
+        trucks = [DeliveryTruck(hub_address, 'Truck ' + str(number)) for number in range(4)]
+        assert clustering.partition_packages(trucks, city_map, packages, method) == []
+        truck_of = {}
+        for truck in trucks:
+            for package in truck.inventory:
+                truck_of.setdefault(package.destination.index, set()).add(truck.label)
+        assert all(len(labels) == 1 for labels in truck_of.values())
+
+
+def test_only_packages_that_fit_no_truck_are_left(sample_map):
+    city_map, vertex_list, hub_address = sample_map
+    for method in (clustering.SWEEP, clustering.KMEANS):
+        packages = random_packages(vertex_list, 17, 3, max_mass=10)
+        heavy = PackageWGUPS(99, 'Salt Lake City', 'UT', 500.0, '', vertex_list[5], 'EOD')
+        trucks = [DeliveryTruck(hub_address, 'Truck ' + str(number), capacity=16, max_mass_kg=200.0)
+                  for number in range(3)]
+        leftover = clustering.partition_packages(trucks, city_map, [heavy] + packages, method)
+        assert leftover == [heavy]
+        assert sum(len(truck.inventory) for truck in trucks) == 17
+        assert_within_limits(trucks)
+
+
+def test_partition_marks_packages_loaded(sample_map):
+    city_map, vertex_list, hub_address = sample_map
+    packages = random_packages(vertex_list, 10, 1)
+    truck = DeliveryTruck(hub_address, 'Truck 1')
+    clustering.partition_packages([truck], city_map, packages)
+    assert all(package.time_loaded == truck.departure_time and package.status_loaded == 'Truck 1 En Route'
+               for package in truck.inventory)
+
+
+def test_spatial_index_matches_brute_force_on_sample(sample_map):
+    city_map, vertex_list, _ = sample_map
+    indices = [vertex.index for vertex in vertex_list]
+    index = clustering.SpatialIndex(city_map, indices)
+    matrix = city_map.distance_matrix
+    rng = random.Random(11)
+    members = set(rng.sample(indices, 8))
+    for member in members:
+        index.add(member)
+    for from_index in indices:
+        row = matrix.row(from_index)
+        assert [row[near] for near in index.nearest(from_index, 5)] == sorted(row[other] for other in indices)[:5]
+        assert row[index.nearest_member(from_index)] == min(row[member] for member in members)
+    for member in members:
+        index.discard(member)
+    assert index.nearest_member(indices[0]) is None
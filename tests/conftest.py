@@ -0,0 +1,69 @@
+_Author_ = "Joseph Curtis"
+# Title: Test fixtures
+# Description: Puts src on the import path and loads the sample day's table and packages for the tests
+# Date: 29 Apr 2023
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, os.pardir, 'src'))
+
+import controller  # noqa: E402 (needs src on the path)
+import main  # noqa: E402
+
+DATA_DIR = os.path.join(TESTS_DIR, os.pardir, 'data')
+TABLE_FILE = os.path.join(DATA_DIR, 'distance-table.csv')
+PACKAGE_FILE = os.path.join(DATA_DIR, 'package-file.csv')
+
+
+@pytest.fixture
+def table_file() -> str:
+    """
+    The sample distance table CSV.
+    """
+    return TABLE_FILE
+
+
+@pytest.fixture
+def package_file() -> str:
+    """
+    The sample day's package CSV.
+    """
+    return PACKAGE_FILE
+
+
+@pytest.fixture
+def sample_map() -> tuple:
+    """
+    The sample distance table, as (city_map, vertex_list, hub_address).
+    """
+    return main.load_distance_data(TABLE_FILE)
+
+
+@pytest.fixture
+def sample_day():
+    """
+    Returns a function that loads a fresh copy of the sample day, and delivers it if asked.
+
+    load(loading=None, columnar=False) returns a namespace of city_map, vertex_list,
+    hub_address, packages and trucks. loading is 'manual' or 'auto' to load the trucks with
+    controller.load_trucks_manual or load_trucks_auto and deliver them in this process;
+    None leaves every package at the hub and trucks empty.
+    """
+    def load(loading: str = None, columnar: bool = False) -> SimpleNamespace:
+        city_map, vertex_list, hub_address = main.load_distance_data(TABLE_FILE)
+        packages = main.load_package_data(vertex_list, columnar=columnar, package_file=PACKAGE_FILE)
+        trucks = []
+        if loading == 'manual':
+            trucks = list(controller.load_trucks_manual(hub_address, packages))
+        elif loading == 'auto':
+            trucks = list(controller.load_trucks_auto(hub_address, packages, city_map))
+        if trucks:
+            trucks = controller.simulate_fleet(trucks, city_map, packages, processes=1)
+        return SimpleNamespace(city_map=city_map, vertex_list=vertex_list, hub_address=hub_address,
+                               packages=packages, trucks=trucks)
+    return load
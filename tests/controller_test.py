@@ -0,0 +1,82 @@
+_Author_ = "Joseph Curtis"
+# Title: Controller tests
+# Description: Loading trucks at the hub and unloading them along their routes in controller.py
+# Date: 29 Apr 2023
+
+import datetime
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+import controller
+import simulation
+from model import DeliveryTruck
+
+
+def test_packages_are_unloaded_at_the_first_visit_to_their_destination(sample_day):
+    day = sample_day('manual')
+    city_map, packages, trucks = day.city_map, day.packages, day.trucks
+    matrix = city_map.distance_matrix
+    delivered_ids = []
+    for truck in trucks:
+        assert truck.inventory == []
+        departure = datetime.datetime.combine(datetime.date.today(), truck.departure_time)
+        first_visit = {truck.route_list[0].index: truck.departure_time}
+        miles = 0.0
+        for from_vertex, to_vertex in zip(truck.route_list, truck.route_list[1:]):
+            miles += matrix[from_vertex.index, to_vertex.index]
+            arrival = departure + datetime.timedelta(hours=miles / truck.speed_mi_hr)
+            first_visit.setdefault(to_vertex.index, arrival.time())
+        for package in truck.manifest:
+            assert package.time_delivered == first_visit[package.destination.index]
+            assert package.status_delivered == truck.label + ' Delivered ' + str(package.time_delivered)
+        delivered_ids += [package.package_id for package in truck.manifest]
+    assert sorted(delivered_ids) == sorted(package_id for package_id, _ in packages)
+
+
+def test_loading_from_an_empty_hub_leaves_trucks_unchanged(sample_day):
+    day = sample_day()
+    trucks = [DeliveryTruck(day.hub_address, 'Truck ' + str(number)) for number in (1, 2)]
+    assert controller.fill_trucks(trucks, day.city_map, []) == trucks
+    assert all(truck.inventory == [] for truck in trucks)
+    assert controller.truck_load_packages(trucks[0], day.city_map, []).inventory == []
+    assert simulation.simulate_fleet_events(trucks, day.city_map, []) == []
+    assert all(truck.route_list == [day.hub_address] and truck.miles_traveled == 0.0 for truck in trucks)
+
+    # every package loaded (and delivered) already
+    day = sample_day('manual')
+    more = [DeliveryTruck(day.hub_address, 'Truck 3')]
+    assert controller.fill_trucks(more, day.city_map, [package for _, package in day.packages]) == more
+    assert more[0].inventory == []
+
+
+def test_fleet_in_worker_processes_matches_one_process(sample_day, monkeypatch):
+    shared_names = []
+    share_city_map = controller.share_city_map
+
+    def share_and_record(city_map, with_paths=False):
+        shared_memory, init_args = share_city_map(city_map, with_paths)
+        shared_names.append(shared_memory.name)
+        return shared_memory, init_args
+    monkeypatch.setattr(controller, 'share_city_map', share_and_record)
+
+    for deadline_aware in (False, True):
+        results = []
+        for processes in (1, 2):
+            day = sample_day()
+            trucks = controller.simulate_fleet(list(controller.load_trucks_manual(day.hub_address, day.packages)),
+                                               day.city_map, day.packages, processes, deadline_aware=deadline_aware)
+            # the workers' results are merged into this process's trucks and packages
+            assert all(package.time_delivered is not None for _, package in day.packages)
+            assert all(package is day.packages.get(package.package_id) for truck in trucks for package in truck.manifest)
+            results.append(([(truck.label, truck.miles_traveled, truck.travel_delta, truck.route_list,
+                              [package.package_id for package in truck.manifest]) for truck in trucks],
+                            [(package_id, package.time_delivered, package.status_delivered)
+                             for package_id, package in day.packages]))
+        assert results[0] == results[1]
+
+    # one shared block per run in worker processes, each unlinked afterwards
+    assert len(shared_names) == 2
+    for name in shared_names:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
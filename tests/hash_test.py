@@ -22,4 +22,90 @@ test_hash.insert(9, "nine")
 test_hash.insert(10, "ten")
 
 for i in test_hash:
-    print(i)
\ No newline at end of file
+    print(i)
+
+# Behavioral tests shared by both hash table storage modes
+HASH_TABLE_TYPES = [utilities.ChainingHashTable, utilities.OpenAddressingHashTable]
+
+
+def test_insert_get_update():
+    for table_type in HASH_TABLE_TYPES:
+        table = table_type(5)
+        for key in range(100):
+            table.insert(key, str(key))
+        table.insert(7, "seven")
+        assert len(table) == 100
+        assert table.get(7) == "seven"
+        assert table.get(99) == "99"
+        assert table.get(100) is None
+        assert table.get("missing") is None
+
+
+def test_remove():
+    for table_type in HASH_TABLE_TYPES:
+        table = table_type(5)
+        for key in range(50):
+            table.insert(key, key * 2)
+        for key in range(0, 50, 2):
+            table.remove(key)
+        table.remove(1000)  # removing a missing key is a no-op
+        assert len(table) == 25
+        assert table.get(4) is None
+        assert table.get(5) == 10
+        table.insert(4, "back")
+        assert table.get(4) == "back"
+        assert len(table) == 26
+
+
+def test_iterates_every_pair_once():
+    for table_type in HASH_TABLE_TYPES:
+        table = table_type(3)
+        expected = {("key", key): key for key in range(200)}
+        for key, value in expected.items():
+            table.insert(key, value)
+        assert dict(iter(table)) == expected
+        assert len(list(table)) == len(table)
+
+
+def test_len_matches_random_operations():
+    import random
+    rng = random.Random(950)
+    for table_type in HASH_TABLE_TYPES:
+        table = table_type(8, min_load_factor=0.1)
+        reference = {}
+        for _ in range(5000):
+            key = rng.randrange(500)
+            if rng.random() < 0.6:
+                table.insert(key, -key)
+                reference[key] = -key
+            else:
+                table.remove(key)
+                reference.pop(key, None)
+            assert len(table) == len(reference)
+        assert dict(iter(table)) == reference
+        assert all(table.get(key) == value for key, value in reference.items())
+
+
+def test_resize_and_reserve():
+    for table_type in HASH_TABLE_TYPES:
+        table = table_type(4)
+        for key in range(1000):
+            table.insert(key, key)
+        assert len(table) <= table.max_load_factor * table.bucket_number
+        table.reserve(10000)
+        bucket_number = table.bucket_number
+        for key in range(1000, 10000):
+            table.insert(key, key)
+        assert table.bucket_number == bucket_number
+        assert table.get(9999) == 9999
+
+
+def test_insert_many_get_many():
+    for table_type in HASH_TABLE_TYPES:
+        table = table_type(5)
+        table.insert(3, "old")
+        table.insert_many((key, key * 10) for key in range(1, 200))
+        table.insert_many([(500, "a"), (500, "b")])  # later pairs win
+        assert len(table) == 200
+        assert table.get_many([3, 199, 500, 1000, 1]) == [30, 1990, "b", None, 10]
+        assert table.get_many([]) == []
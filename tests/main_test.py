@@ -0,0 +1,87 @@
+_Author_ = "Joseph Curtis"
+# Title: Main tests
+# Description: Resolving package addresses to vertices and the command line checks in main.py
+# Date: 29 Apr 2023
+
+import csv
+import datetime
+
+import pytest
+
+import main
+from model import address_key
+
+
+def manifest_with_unknown_address(package_file: str, output_file: str) -> list:
+    # the sample manifest plus package 99, whose address is not in the distance table
+    with open(package_file, 'r') as packages_csv:
+        rows = list(csv.reader(packages_csv))
+    rows.append(['99', '1 Nowhere Rd', 'Salt Lake City', 'UT', '84000', 'EOD', '5', ''])
+    with open(output_file, 'w', newline='') as packages_csv:
+        csv.writer(packages_csv).writerows(rows)
+    return rows
+
+
+def test_build_address_index_ignores_case_and_spacing(sample_map):
+    _, vertex_list, _ = sample_map
+    address_index = main.build_address_index(vertex_list)
+    assert len(address_index) == len(vertex_list)
+    for index, vertex in enumerate(vertex_list):
+        assert address_index[address_key(vertex.address, vertex.zipcode)] == index
+        spaced = '  ' + '   '.join(vertex.address.upper().split()) + ' '
+        assert address_index[address_key(spaced, ' ' + vertex.zipcode + ' ')] == index
+    assert address_key('1 Nowhere Rd', '84000') not in address_index
+    assert address_key(vertex_list[1].address, '00000') not in address_index
+
+
+def test_unresolved_addresses_are_reported(sample_map, package_file, tmp_path, capsys):
+    _, vertex_list, _ = sample_map
+    manifest = str(tmp_path / 'packages.csv')
+    manifest_with_unknown_address(package_file, manifest)
+    for columnar in (False, True):
+        packages = main.load_package_data(vertex_list, columnar=columnar, package_file=manifest)
+        error = capsys.readouterr().err
+        assert '1 package(s) have an address not found in the distance table, package ID: 99' in error
+        unknown = packages.get(99)
+        assert unknown.destination.label == 'unknown' and unknown.destination.index is None
+        assert unknown.destination.address == '1 Nowhere Rd' and unknown.destination.zipcode == '84000'
+        assert all(package.destination.index is not None for package_id, package in packages if package_id != 99)
+
+    # the sample manifest itself has nothing to report
+    main.load_package_data(vertex_list, package_file=package_file)
+    assert capsys.readouterr().err == ''
+
+
+def test_main_stops_on_unresolved_addresses(table_file, package_file, tmp_path, capsys, monkeypatch):
+    manifest = str(tmp_path / 'packages.csv')
+    manifest_with_unknown_address(package_file, manifest)
+    for loading in ([], ['--auto-load'], ['--event-driven']):
+        monkeypatch.setattr(main, 'args', main.parser.parse_args(['--table', table_file, '--packages', manifest,
+                                                                  '--no-cache'] + loading))
+        with pytest.raises(SystemExit) as stopped:
+            main.main()
+        assert stopped.value.code == 2
+        error = capsys.readouterr().err
+        assert 'package ID: 99' in error and 'every package address must be in the distance table' in error
+
+
+def test_times_on_the_command_line_must_be_four_digits(sample_day, tmp_path, capsys):
+    assert main.parse_report_arguments(['0905', '1700'], ['all']) \
+        == ([datetime.time(9, 5), datetime.time(17)], None)
+    for text in ('25', '925', '09000', '2400', '09:05'):
+        with pytest.raises(SystemExit):
+            main.parse_report_arguments([text], ['all'])
+        assert '--report-times' in capsys.readouterr().err
+
+    day = sample_day()
+    update_file = str(tmp_path / 'updates.csv')
+    for update_time, arrival, accepted in (('0930', '1015', True), ('25', '', False), ('0930', '959', False)):
+        with open(update_file, 'w') as updates_csv:
+            updates_csv.write('Time,Package ID,Address,Zip,Arrival\n' + update_time + ',9,,,' + arrival + '\n')
+        if accepted:
+            updates = main.load_package_updates(update_file, day.packages, day.vertex_list)
+            assert updates == [(datetime.time(9, 30), day.packages.get(9), None, datetime.time(10, 15))]
+        else:
+            with pytest.raises(SystemExit):
+                main.load_package_updates(update_file, day.packages, day.vertex_list)
+            assert 'line 2' in capsys.readouterr().err
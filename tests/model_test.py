@@ -0,0 +1,215 @@
+_Author_ = "Joseph Curtis"
+# Title: Model tests
+# Description: Graphs, shortest paths, nearest-neighbor searches and the package status timeline in model.py
+# Date: 29 Apr 2023
+
+import datetime
+import random
+
+import pytest
+
+from model import (Graph, PackageStatusTimeline, PackageWGUPS, Vertex, min_distance_address_from,
+                   nearest_destination_from, nearest_vertex_from)
+from utilities import DistanceMatrix
+
+
+def menu_status(pkg, chosen_time):
+    # the status rule of the menu before the timeline, one package at a time
+    if chosen_time < pkg.time_arrived:
+        return pkg.status_arrival
+    elif chosen_time < pkg.time_loaded:
+        return "waiting at HUB"
+    elif chosen_time < pkg.time_delivered:
+        return pkg.status_loaded
+    return pkg.status_delivered
+
+
+def test_is_complete_ignores_unused_capacity():
+    graph = Graph()
+    vertices = [Vertex('Address ' + str(number), str(number) + ' Main St') for number in range(3)]
+    for vertex in vertices:
+        graph.add_vertex(vertex)
+    for vertex_a in vertices:
+        for vertex_b in vertices:
+            graph.add_directed_edge(vertex_a, vertex_b, 0.0 if vertex_a is vertex_b else 1.0)
+    # three vertices added one by one leave a row and column of unused capacity
+    assert graph.distance_matrix.capacity > len(graph.distance_matrix)
+    assert graph.is_complete()
+
+    graph.distance_matrix[1, 2] = DistanceMatrix.NO_EDGE
+    assert not graph.is_complete()
+
+
+def test_is_complete_on_sample_table(sample_map):
+    city_map, _, _ = sample_map
+    assert city_map.is_complete()
+
+
+def test_distance_matrix_reserve_and_shrink_to_fit():
+    vertices = [Vertex('Address ' + str(number), str(number) + ' Main St') for number in range(5)]
+    graph = Graph(edge_weights={(vertex_a, vertex_b): 1.0
+                                for vertex_a in vertices for vertex_b in vertices})
+    assert graph.distance_matrix.capacity == len(graph.distance_matrix) == 5
+
+    matrix = DistanceMatrix()
+    for size in range(1, 6):
+        matrix.resize(size)
+        matrix[size - 1, 0] = float(size)
+    assert matrix.capacity > matrix.size
+    matrix.shrink_to_fit()
+    assert matrix.capacity == matrix.size == 5
+    assert matrix.nbytes == 8 * 5 * 5
+    assert [matrix[row, 0] for row in range(5)] == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_timeline_matches_menu_status_rule(sample_day):
+    packages = sample_day('manual').packages
+    timeline = PackageStatusTimeline(package for _, package in packages)
+    # every minute of the day and every transition time, in random order so the cursor moves both ways
+    times = [datetime.time(hour, minute) for hour in range(8, 18) for minute in range(60)]
+    times += [getattr(package, attribute) for _, package in packages
+              for attribute in ('time_arrived', 'time_loaded', 'time_delivered')]
+    random.Random(9).shuffle(times)
+    for chosen_time in times:
+        expected = [(package, menu_status(package, chosen_time)) for _, package in packages]
+        assert timeline.statuses_at(chosen_time) == expected
+        for package, status in expected[::7]:
+            assert timeline.status_at(package.package_id, chosen_time) == status
+
+
+def road_graph(directed: bool = False) -> tuple:
+    # a line of road segments 0 - 1 - 2 - 3, with a shortcut 0 - 2, and vertex 4 on its own
+    vertices = [Vertex('Address ' + str(number), str(number) + ' Main St') for number in range(5)]
+    graph = Graph()
+    graph.add_edges([(vertices[0], vertices[1], 1.0), (vertices[1], vertices[2], 1.5),
+                     (vertices[2], vertices[3], 2.0), (vertices[0], vertices[2], 3.0)], directed)
+    graph.add_vertex(vertices[4])
+    return graph, vertices
+
+
+def test_add_edges_adds_vertices_and_both_directions():
+    graph, vertices = road_graph()
+    assert [vertex.index for vertex in graph.vertex_list] == [0, 1, 2, 3, 4]
+    assert graph.distance_matrix[1, 2] == graph.distance_matrix[2, 1] == 1.5
+    assert graph.distance_matrix[1, 3] == DistanceMatrix.NO_EDGE
+    assert graph.edge_lists()[2] == [(0, 3.0), (1, 1.5), (3, 2.0)]
+    assert graph.edge_lists()[4] == []
+
+    directed, vertices = road_graph(directed=True)
+    assert directed.distance_matrix[1, 2] == 1.5 and directed.distance_matrix[2, 1] == DistanceMatrix.NO_EDGE
+    assert directed.edge_lists()[3] == []
+
+
+def test_dijkstra_shortest_path_on_road_graph():
+    graph, vertices = road_graph()
+    graph.dijkstra_shortest_path(vertices[0])
+    assert [vertex.distance for vertex in vertices] == [0.0, 1.0, 2.5, 4.5, float('inf')]
+    assert [vertex.prev_vertex for vertex in vertices] == [None, vertices[0], vertices[1], vertices[2], None]
+
+    directed, vertices = road_graph(directed=True)
+    directed.dijkstra_shortest_path(vertices[3])
+    assert [vertex.distance for vertex in vertices[:3]] == [float('inf')] * 3
+
+
+def test_shortest_path_closure_fills_a_gapped_table(sample_map):
+    city_map, sample_vertices, _ = sample_map
+    size = len(sample_vertices)
+    # the sample table with some cells missing, as when a table lists only direct roads
+    gapped = Graph()
+    vertex_list = [Vertex(vertex.label, vertex.address, vertex.zipcode) for vertex in sample_vertices]
+    for vertex in vertex_list:
+        gapped.add_vertex(vertex)
+    for vertex_a in vertex_list:
+        for vertex_b in vertex_list:
+            if (vertex_a.index + vertex_b.index) % 5 or vertex_a is vertex_b:
+                gapped.add_directed_edge(vertex_a, vertex_b, city_map.distance_matrix[vertex_a.index, vertex_b.index])
+    assert not gapped.is_complete()
+    closure = gapped.shortest_path_closure()
+    assert closure.is_complete()
+
+    # brute force: Floyd-Warshall over the gapped table
+    distances = [[gapped.distance_matrix[a, b] for b in range(size)] for a in range(size)]
+    for via in range(size):
+        for a in range(size):
+            for b in range(size):
+                distances[a][b] = min(distances[a][b], distances[a][via] + distances[via][b])
+    matrix = gapped.distance_matrix
+    for vertex_a in vertex_list:
+        for vertex_b in vertex_list:
+            assert abs(closure.distance_matrix[vertex_a.index, vertex_b.index]
+                       - distances[vertex_a.index][vertex_b.index]) < 1e-9
+            # the path only uses cells of the gapped table, and its length is the closure's distance
+            path = closure.path_between(vertex_a, vertex_b)
+            assert path[0] is vertex_a and path[-1] is vertex_b
+            if vertex_a is not vertex_b:
+                length = sum(matrix[from_vertex.index, to_vertex.index] for from_vertex, to_vertex in zip(path, path[1:]))
+                assert abs(length - closure.distance_matrix[vertex_a.index, vertex_b.index]) < 1e-9
+
+
+def test_path_between_unreachable_pair_raises():
+    graph, vertices = road_graph()
+    closure = graph.shortest_path_closure()
+    assert not closure.is_complete()
+    assert closure.path_between(vertices[0], vertices[3]) == [vertices[0], vertices[1], vertices[2], vertices[3]]
+    assert closure.path_between(vertices[3], vertices[0]) == [vertices[3], vertices[2], vertices[1], vertices[0]]
+    assert closure.path_between(vertices[4], vertices[4]) == [vertices[4], vertices[4]]
+    for from_vertex, to_vertex in ((vertices[0], vertices[4]), (vertices[4], vertices[2])):
+        with pytest.raises(ValueError):
+            closure.path_between(from_vertex, to_vertex)
+
+
+def test_vertex_keeps_its_index_across_graphs(sample_map):
+    city_map, vertex_list, _ = sample_map
+    # a closure shares the vertices at the same indices
+    closure = city_map.shortest_path_closure()
+    assert all(closure.vertex_list[vertex.index] is vertex for vertex in vertex_list)
+
+    # a vertex cannot move to another index, which would break lookups in its first graph
+    other = Graph()
+    other.add_vertex(Vertex('Depot', '1 Depot Rd'))
+    with pytest.raises(ValueError):
+        other.add_vertex(vertex_list[3])
+    assert vertex_list[3].index == 3 and len(other.vertex_list) == 1
+    with pytest.raises(ValueError):
+        Graph(edge_weights={(vertex_list[2], vertex_list[1]): 1.0})
+
+    # a copy of the vertex can be added anywhere
+    copy = Vertex(vertex_list[3].label, vertex_list[3].address, vertex_list[3].zipcode)
+    other.add_vertex(copy)
+    assert copy.index == 1 and vertex_list[3].index == 3
+
+
+def test_nearest_vertex_among_indices_matches_brute_force(sample_map):
+    city_map, vertex_list, _ = sample_map
+    matrix = city_map.distance_matrix
+    rng = random.Random(2)
+    for _ in range(200):
+        from_address = rng.choice(vertex_list)
+        indices = rng.sample(range(len(vertex_list)), rng.randrange(1, len(vertex_list)))
+        closest, distance = nearest_vertex_from(from_address, city_map, indices)
+        # brute force: the first index in the given order with the smallest distance
+        expected = indices[0]
+        for index in indices:
+            if matrix[from_address.index, index] < matrix[from_address.index, expected]:
+                expected = index
+        assert closest is vertex_list[expected] and distance == matrix[from_address.index, expected]
+
+        packages = [PackageWGUPS(number, 'Salt Lake City', 'UT', 1.0, '', vertex_list[index], 'EOD')
+                    for number, index in enumerate(indices)]
+        assert nearest_destination_from(from_address, city_map, packages) == (closest, distance)
+        assert min_distance_address_from(from_address, city_map, packages) is closest
+
+    assert nearest_vertex_from(vertex_list[4], city_map, []) == (vertex_list[4], 0.0)
+    assert nearest_destination_from(vertex_list[4], city_map, []) == (vertex_list[4], 0.0)
+
+
+def test_nearest_vertex_ties_go_to_the_first_index():
+    vertices = [Vertex('Address ' + str(number), str(number) + ' Main St') for number in range(4)]
+    graph = Graph(edge_weights={(vertex_a, vertex_b): 0.0 if vertex_a is vertex_b else 2.0
+                                for vertex_a in vertices for vertex_b in vertices})
+    graph.distance_matrix[0, 1] = 5.0
+    for indices in ([1, 2, 3], [3, 2, 1], [2, 3], [3, 1, 2]):
+        expected = next(index for index in indices if index != 1)
+        assert nearest_vertex_from(vertices[0], graph, indices) == (vertices[expected], 2.0)
+    # the from vertex itself is a candidate like any other
+    assert nearest_vertex_from(vertices[0], graph, [2, 0]) == (vertices[0], 0.0)
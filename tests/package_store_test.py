@@ -0,0 +1,81 @@
+_Author_ = "Joseph Curtis"
+# Title: Package store tests
+# Description: PackageStore and PackageRow round trips against the PackageWGUPS hash table
+# Date: 29 Apr 2023
+
+import datetime
+import pickle
+import random
+
+from model import PackageRow, PackageStore, PackageWGUPS, Vertex
+
+
+def record(package) -> tuple:
+    return tuple(getattr(package, attribute) for attribute in PackageRow.attributes)
+
+
+def test_sample_day_matches_hash_table_before_and_after_delivery(sample_day):
+    for loading in (None, 'manual'):
+        table = sample_day(loading).packages
+        store = sample_day(loading, columnar=True).packages
+        assert isinstance(store, PackageStore) and len(store) == 40
+        assert [(key, record(package)) for key, package in store] == [(key, record(package)) for key, package in table]
+        assert [record(package) for package in store.get_many(range(1, 41))] \
+            == [record(package) for package in table.get_many(range(1, 41))]
+
+
+def test_add_insert_and_get_round_trip_every_attribute(sample_day):
+    day = sample_day('manual')
+    table = day.packages
+    store = PackageStore(day.vertex_list)
+    keys = [key for key, _ in table]
+    random.Random(3).shuffle(keys)
+    # ids out of order switch the store from binary search to a dictionary
+    for key in keys:
+        store.insert(key, table.get(key))
+    assert all(record(store.get(key)) == record(table.get(key)) for key in keys)
+    assert store.get(41) is None and store.get_many([1, 41])[1] is None
+
+    # inserting an existing id updates the row in place
+    package = table.get(9)
+    package.status_delivered = 'Returned to sender'
+    package.time_delivered = datetime.time(16, 30)
+    store.insert(9, package)
+    assert len(store) == 40 and record(store.get(9)) == record(package)
+
+    # a destination outside the vertex list is kept as is
+    outside = Vertex('unknown', '1 Nowhere Rd', '84000')
+    row = store.add(100, 'Salt Lake City', 'UT', 2.5, 'new', outside, 'EOD')
+    assert store.get(100).destination is outside
+    assert record(row) == record(PackageWGUPS(100, 'Salt Lake City', 'UT', 2.5, 'new', outside, 'EOD'))
+
+
+def test_views_write_through_and_pickle_as_packages(sample_day):
+    store = sample_day(columnar=True).packages
+    first, second = store.get(4), store.get(4)
+    first.time_loaded = datetime.time(9, 5)
+    first.status_loaded = 'Truck 2 En Route'
+    assert second.time_loaded == datetime.time(9, 5) and second.status_loaded == 'Truck 2 En Route'
+    assert first == second and hash(first) == hash(second) and first != store.get(5)
+
+    copy = pickle.loads(pickle.dumps(first))
+    assert isinstance(copy, PackageWGUPS) and record(copy) == record(first)
+
+
+def test_late_at_and_total_mass_match_scanning_the_packages(sample_day):
+    table = sample_day('manual').packages
+    store = sample_day('manual', columnar=True).packages
+    # make some packages late, so the scan has something to find
+    for key in (1, 13, 25, 37):
+        store.get(key).time_delivered = datetime.time(17)
+        table.get(key).time_delivered = datetime.time(17)
+    times = [datetime.time(hour, minute) for hour in range(8, 18) for minute in (0, 29, 30, 31)]
+    for chosen_time in times + [datetime.time(23, 59, 59, 999999)]:
+        expected = [key for key, package in table if package.deadline < chosen_time
+                    and not (package.time_delivered is not None and package.time_delivered <= package.deadline)]
+        assert [package.package_id for package in store.late_at(chosen_time)] == expected
+
+    assert store.total_mass() == sum(package.mass_kg for _, package in table)
+    some = store.get_many([2, 3, 5, 8, 13])
+    assert store.total_mass(some) == sum(table.get(key).mass_kg for key in (2, 3, 5, 8, 13))
+    assert store.total_mass([]) == 0
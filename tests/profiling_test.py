@@ -0,0 +1,79 @@
+_Author_ = "Joseph Curtis"
+# Title: Profiling tests
+# Description: Installing and removing the counting wrappers of profiling.py
+# Date: 29 Apr 2023
+
+import controller
+import model
+import profiling
+from utilities import ChainingHashTable, DistanceMatrix, OpenAddressingHashTable, PackedDistanceMatrix
+
+# every attribute enable() wraps
+WRAPPED = [(DistanceMatrix, '__getitem__'), (DistanceMatrix, 'row'),
+           (PackedDistanceMatrix, '__getitem__'), (PackedDistanceMatrix, 'row'),
+           (model, 'nearest_vertex_from'),
+           (ChainingHashTable, 'get'), (ChainingHashTable, 'insert'), (ChainingHashTable, 'remove'),
+           (ChainingHashTable, 'get_many'), (ChainingHashTable, 'insert_many'),
+           (OpenAddressingHashTable, '_find_slot'),
+           (controller, 'truck_deliver_packages'),
+           (model.PackageStatusTimeline, 'status_at'), (model.PackageStatusTimeline, 'statuses_at')]
+
+
+def test_enable_counts_and_disable_restores_the_originals(sample_map, sample_day):
+    city_map, vertex_list, _ = sample_map
+    originals = {(owner, attribute): vars(owner)[attribute] for owner, attribute in WRAPPED}
+
+    profiling.enable()
+    try:
+        profiling.enable()  # a second enable does not wrap the wrappers
+        assert profiling.enabled
+        assert all(vars(owner)[attribute] is not originals[owner, attribute] for owner, attribute in WRAPPED)
+        assert all(vars(owner)[attribute].__wrapped__ is originals[owner, attribute] for owner, attribute in WRAPPED)
+
+        table = ChainingHashTable(10)
+        for key in range(5):
+            table.insert(key, str(key))
+        table.get(3)
+        table.get(99)
+        table.get_many([1, 2])
+        open_table = OpenAddressingHashTable(16)
+        open_table.insert(1, 'one')
+        open_table.get(1)
+        matrix = city_map.distance_matrix
+        for index in range(4):
+            matrix[0, index]
+        matrix.row(2)
+        model.nearest_vertex_from(vertex_list[0], city_map, [1, 2, 3])
+        with profiling.stage('test stage'):
+            pass
+
+        assert profiling.counters['distance_lookups'] == 4
+        assert profiling.counters['distance_row_fetches'] == 2  # one here, one in nearest_vertex_from
+        assert profiling.counters['nearest_neighbor_searches'] == 1
+        assert profiling.counters['nearest_neighbor_evaluations'] == 3
+        # chaining: 5 inserts into empty buckets (0 probes), get(3) found first (1), get(99) from an
+        # empty bucket (0), get_many of two keys found first (2); open addressing: insert and get (1 each)
+        assert profiling.counters['hash_table_lookups'] == 5 + 1 + 1 + 2 + 1 + 1
+        assert profiling.counters['hash_table_probes'] == 0 + 1 + 0 + 2 + 1 + 1
+        assert profiling.histograms['hash_table_chain_length'] == {0: 6, 1: 3}
+        assert profiling.stage_calls['test stage'] == 1
+
+        # a delivered day unloads every package, at one or more per stop
+        day = sample_day('manual')
+        assert profiling.stage_calls['truck_deliver_packages'] == len(day.trucks)
+        assert profiling.counters['packages_unloaded'] == 40
+        assert sum(profiling.histograms['packages_unloaded_per_stop'].values()) == profiling.counters['stops']
+    finally:
+        profiling.disable()
+
+    assert not profiling.enabled
+    for owner, attribute in WRAPPED:
+        assert vars(owner)[attribute] is originals[owner, attribute], attribute
+    # nothing is counted once disabled, and the results are kept until the next enable
+    counts = dict(profiling.counters)
+    ChainingHashTable(10).insert(1, 'one')
+    city_map.distance_matrix[0, 1]
+    assert dict(profiling.counters) == counts
+    assert profiling.stage('after') is profiling.stage('again')
+    profiling.reset()
+    assert not profiling.counters and not profiling.stage_calls
@@ -0,0 +1,95 @@
+_Author_ = "Joseph Curtis"
+# Title: Routing tests
+# Description: Neighbor lists, local search and deadline-aware stop ordering in routing.py
+# Date: 29 Apr 2023
+
+import datetime
+import math
+import random
+
+import routing
+from model import Graph, PackageWGUPS, Vertex
+
+
+def asymmetric_map(size: int, seed: int) -> Graph:
+    rng = random.Random(seed)
+    vertices = [Vertex('Address ' + str(number), str(number) + ' Main St') for number in range(size)]
+    return Graph(edge_weights={(vertex_a, vertex_b): 0.0 if vertex_a is vertex_b else round(rng.uniform(1, 10), 1)
+                               for vertex_a in vertices for vertex_b in vertices})
+
+
+def test_improve_tour_keeps_hub_and_stops_and_never_lengthens(sample_map):
+    city_map, vertex_list, _ = sample_map
+    rng = random.Random(5)
+    for _ in range(20):
+        stops = rng.sample(range(1, len(vertex_list)), rng.randrange(3, len(vertex_list) - 1))
+        tour = [0] + stops
+        improved = routing.improve_tour(tour, city_map)
+        assert improved[0] == 0
+        assert sorted(improved) == sorted(tour)
+        assert routing.tour_length(improved, city_map) <= routing.tour_length(tour, city_map) + 1e-9
+
+
+def test_improve_tour_never_lengthens_on_asymmetric_table():
+    for seed in range(10):
+        city_map = asymmetric_map(12, seed)
+        tour = list(range(12))
+        improved = routing.improve_tour(tour, city_map)
+        assert improved[0] == 0 and sorted(improved) == tour
+        assert routing.tour_length(improved, city_map) <= routing.tour_length(tour, city_map) + 1e-9
+
+
+def test_deadline_aware_late_list_matches_driving_the_stops(sample_map):
+    city_map, vertex_list, hub_address = sample_map
+    rng = random.Random(13)
+    deadlines = [datetime.time(8, 40), datetime.time(9), datetime.time(10, 30), datetime.time(23, 59, 59)]
+    plans_with_late_packages = 0
+    for count in (8, 16, 40):
+        for _ in range(10):
+            packages = [PackageWGUPS(package_id, 'Salt Lake City', 'UT', 1.0, '',
+                                     vertex_list[rng.randrange(len(vertex_list))], 'EOD', rng.choice(deadlines))
+                        for package_id in range(1, count + 1)]
+            stops, late = routing.deadline_aware_stop_order(hub_address, packages, city_map, datetime.time(8), 18.0)
+            # every destination once, the hub first if a package is addressed to it
+            destinations = {package.destination.index for package in packages}
+            assert sorted(stop.index for stop in stops) == sorted(destinations)
+            assert all(stop is not hub_address for stop in stops[hub_address.index in destinations:])
+            assert late == routing.late_packages_on(stops, hub_address, packages, city_map, datetime.time(8), 18.0)
+            plans_with_late_packages += bool(late)
+    assert plans_with_late_packages > 0
+
+
+
+def euclidean_map(size: int, seed: int) -> Graph:
+    rng = random.Random(seed)
+    points = [(rng.uniform(0, 20), rng.uniform(0, 20)) for _ in range(size)]
+    vertices = [Vertex('Address ' + str(number), str(number) + ' Main St') for number in range(size)]
+    return Graph(edge_weights={(vertices[a], vertices[b]): math.dist(points[a], points[b])
+                               for a in range(size) for b in range(size)})
+
+
+def test_neighbor_lists_exact_for_short_tours_and_indexed_for_long_ones():
+    city_map = euclidean_map(400, 3)
+    matrix = city_map.distance_matrix
+    rng = random.Random(4)
+    for stop_count in (routing.EXACT_NEIGHBOR_STOPS, 300):
+        tour = rng.sample(range(400), stop_count)
+        lists = routing.neighbor_lists(tour, city_map, 8)
+        assert set(lists) == set(tour)
+        nearest_found = 0
+        for stop, neighbors in lists.items():
+            assert stop not in neighbors and set(neighbors) <= set(tour) and len(neighbors) == 8
+            exact = sorted((other for other in tour if other != stop), key=lambda other: matrix[stop, other])[:8]
+            if stop_count <= routing.EXACT_NEIGHBOR_STOPS:
+                assert [matrix[stop, other] for other in neighbors] == [matrix[stop, other] for other in exact]
+            nearest_found += exact[0] in neighbors
+        # the spatial index is approximate, but finds almost every nearest stop
+        assert nearest_found >= 0.9 * stop_count
+
+
+def test_improve_tour_never_lengthens_long_tour():
+    city_map = euclidean_map(400, 8)
+    tour = [0] + random.Random(6).sample(range(1, 400), 299)
+    improved = routing.improve_tour(tour, city_map, time_budget=1.0)
+    assert improved[0] == 0 and sorted(improved) == sorted(tour)
+    assert routing.tour_length(improved, city_map) < 0.5 * routing.tour_length(tour, city_map)
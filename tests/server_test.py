@@ -0,0 +1,22 @@
+_Author_ = "Joseph Curtis"
+# Title: Server tests
+# Description: Responses of the StatusService in server.py to well-formed and malformed queries
+# Date: 29 Apr 2023
+
+import json
+
+from server import StatusService
+
+
+def test_at_must_be_four_digits(sample_day):
+    day = sample_day('manual')
+    service = StatusService(day.packages, day.trucks)
+    for at in ('25', '925', '09000', '0960', '2400', 'ab12', ' 900', '+900', '０９００'):
+        code, body = service.respond('GET', '/packages?at=' + at)
+        assert code == 400, at
+        assert 'HHMM' in json.loads(body)['error']
+
+    code, body = service.respond('GET', '/package/9?at=0905')
+    assert code == 200 and json.loads(body)['time'] == '09:05:00'
+    code, body = service.respond('GET', '/trucks')
+    assert code == 200 and json.loads(body)['time'] == '23:59:59'
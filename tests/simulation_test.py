@@ -0,0 +1,138 @@
+_Author_ = "Joseph Curtis"
+# Title: Simulation tests
+# Description: Re-planning trucks mid-route with the package updates of simulation.py
+# Date: 29 Apr 2023
+
+import datetime
+
+import controller
+import main
+import simulation
+from model import DeliveryTruck
+
+
+def test_replan_mid_route_keeps_deliveries_made_and_resequences_the_rest(sample_day):
+    day = sample_day('auto')
+    city_map, vertex_list, packages, trucks = day.city_map, day.vertex_list, day.packages, day.trucks
+    truck = max(trucks, key=lambda truck: len(truck.manifest))
+    update_time = (datetime.datetime.combine(datetime.date.today(), truck.departure_time)
+                   + truck.travel_delta / 2).time()
+    delivered = {package.package_id: package.time_delivered for package in truck.manifest
+                 if package.time_delivered < update_time}
+    later = [package for package in truck.manifest if package.time_delivered > update_time]
+    changed = later[-1]
+    new_destination = next(vertex for vertex in vertex_list[1:]
+                           if vertex.index not in {package.destination.index for package in truck.manifest})
+    old_route = list(truck.route_list)
+    other_trips = [(other.miles_traveled, list(other.route_list)) for other in trucks if other is not truck]
+
+    left_at_hub = simulation.apply_package_updates(trucks, city_map, [(update_time, changed, new_destination, None)])
+
+    assert left_at_hub == []
+    assert changed.destination is new_destination
+    assert all(packages.get(package_id).time_delivered == time_delivered
+               for package_id, time_delivered in delivered.items())
+    assert sorted(package.package_id for package in truck.manifest) \
+        == sorted(list(delivered) + [package.package_id for package in later])
+    assert all(package.time_delivered is not None for package in truck.manifest)
+    assert [(other.miles_traveled, other.route_list) for other in trucks if other is not truck] == other_trips
+
+    # the route is unchanged up to the stop the truck was driving to at the update
+    matrix = city_map.distance_matrix
+    departure = datetime.datetime.combine(datetime.date.today(), truck.departure_time)
+    miles = 0.0
+    stop_number = 0
+    while (departure + datetime.timedelta(hours=miles / truck.speed_mi_hr)).time() < update_time:
+        miles += matrix[old_route[stop_number].index, old_route[stop_number + 1].index]
+        stop_number += 1
+    assert stop_number > 1 and truck.route_list[:stop_number + 1] == old_route[:stop_number + 1]
+    assert truck.route_list != old_route
+
+    # from there, the remaining destinations are visited nearest first
+    remaining = {package.destination.index for package in truck.manifest
+                 if package.package_id not in delivered} - {truck.route_list[stop_number].index}
+    assert new_destination.index in remaining
+    previous = truck.route_list[stop_number].index
+    for vertex in truck.route_list[stop_number + 1:-1]:
+        assert matrix[previous, vertex.index] == min(matrix[previous, index] for index in remaining)
+        remaining.remove(vertex.index)
+        previous = vertex.index
+    assert not remaining
+    assert truck.route_list[-1] is old_route[0]
+
+
+def test_delay_known_before_departure_takes_package_off_truck(sample_day):
+    day = sample_day('auto')
+    city_map, trucks = day.city_map, day.trucks
+    truck = max(trucks, key=lambda truck: truck.departure_time)
+    package = truck.manifest[0]
+    update_time = datetime.time(truck.departure_time.hour - 1)
+    late_arrival = datetime.time(truck.departure_time.hour + 1)
+
+    left_at_hub = simulation.apply_package_updates(trucks, city_map, [(update_time, package, None, late_arrival)])
+
+    assert left_at_hub == [package]
+    assert package not in truck.manifest
+    assert package.time_arrived == late_arrival and package.time_delivered is None
+    assert package.status_arrival == 'Delayed on flight'
+
+
+def test_update_after_delivery_changes_nothing(sample_day):
+    day = sample_day('auto')
+    city_map, vertex_list, packages, trucks = day.city_map, day.vertex_list, day.packages, day.trucks
+    package = min((package for _, package in packages), key=lambda package: package.time_delivered)
+    destination = package.destination
+    time_delivered = package.time_delivered
+    miles = [truck.miles_traveled for truck in trucks]
+
+    update_time = (datetime.datetime.combine(datetime.date.today(), time_delivered)
+                   + datetime.timedelta(minutes=1)).time()
+    simulation.apply_package_updates(trucks, city_map, [(update_time, package, vertex_list[1], None)])
+
+    assert package.destination is destination and package.time_delivered == time_delivered
+    assert [truck.miles_traveled for truck in trucks] == miles
+
+
+def test_later_trip_of_the_truck_waits_for_it_to_return(sample_day):
+    day = sample_day()
+    city_map, vertex_list, hub_address, packages = day.city_map, day.vertex_list, day.hub_address, day.packages
+    trips = simulation.simulate_fleet_events([DeliveryTruck(hub_address, 'Truck 1'),
+                                              DeliveryTruck(hub_address, 'Truck 2')],
+                                             city_map, (package for _, package in packages))
+    today = datetime.date.today()
+    # Truck 2 is back at 9:30 and loaded again at once
+    first, second = [trip for trip in trips if trip.label == 'Truck 2'][:2]
+    assert (datetime.datetime.combine(today, first.departure_time) + first.travel_delta).time() == second.departure_time
+    # send the last package of the first trip to the address furthest from the hub
+    package = max(first.manifest, key=lambda package: package.time_delivered)
+    furthest = max(vertex_list, key=lambda vertex: city_map.distance_matrix[hub_address.index, vertex.index])
+    update_time = (datetime.datetime.combine(today, first.departure_time) + first.travel_delta / 2).time()
+
+    simulation.apply_package_updates(trips, city_map, [(update_time, package, furthest, None)])
+
+    return_time = (datetime.datetime.combine(today, first.departure_time) + first.travel_delta).time()
+    assert second.departure_time == return_time
+    assert return_time > datetime.time(9, 30, 20)
+    assert all(later.time_loaded == return_time and later.time_delivered >= return_time for later in second.manifest)
+
+
+def test_event_driven_trips_match_delivering_the_same_loads_one_by_one(sample_day, package_file):
+    for options in ((False, 0.05, False), (True, 0.05, False), (False, 0.05, True)):
+        day = sample_day()
+        city_map, hub_address, packages = day.city_map, day.hub_address, day.packages
+        trips = simulation.simulate_fleet_events([DeliveryTruck(hub_address, 'Truck 1'),
+                                                  DeliveryTruck(hub_address, 'Truck 2')],
+                                                 city_map, (package for _, package in packages), *options)
+        event_statuses = [(package.package_id, package.status_delivered) for _, package in packages]
+
+        # the same trips, loaded by hand from a fresh copy of the day and delivered by simulate_fleet
+        fresh_packages = main.load_package_data(day.vertex_list, package_file=package_file)
+        trucks = []
+        for trip in trips:
+            truck = DeliveryTruck(hub_address, trip.label, trip.departure_time)
+            truck.inventory = fresh_packages.get_many(package.package_id for package in trip.manifest)
+            trucks.append(truck)
+        controller.simulate_fleet(trucks, city_map, fresh_packages, 1, *options)
+
+        assert [(package.package_id, package.status_delivered) for _, package in fresh_packages] == event_statuses
+        assert [round(truck.miles_traveled, 6) for truck in trucks] == [round(trip.miles_traveled, 6) for trip in trips]
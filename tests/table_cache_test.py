@@ -0,0 +1,91 @@
+_Author_ = "Joseph Curtis"
+# Title: Table cache tests
+# Description: The compiled distance table cache of table_cache.py against the CSV it is built from
+# Date: 29 Apr 2023
+
+import csv
+import os
+import shutil
+
+import main
+import table_cache
+
+
+def csv_distances(table_file: str) -> list:
+    # the whole table read with the csv module, mirrored across the diagonal
+    with open(table_file, 'r') as distance_file:
+        rows = list(csv.reader(distance_file))[1:]
+    size = len(rows)
+    return [[float(rows[max(a, b)][2 + min(a, b)]) for b in range(size)] for a in range(size)]
+
+
+def graph_distances(city_map) -> list:
+    matrix = city_map.distance_matrix
+    return [[matrix[a, b] for b in range(len(matrix))] for a in range(len(matrix))]
+
+
+def vertex_fields(city_map) -> list:
+    return [(vertex.label, vertex.address, vertex.zipcode, vertex.index) for vertex in city_map.vertex_list]
+
+
+def test_cached_read_matches_csv(tmp_path, table_file):
+    cache_file = str(tmp_path / 'table.csv.cache')
+    table_file = shutil.copy(table_file, str(tmp_path / 'table.csv'))
+    parsed, _, _ = main.load_distance_data(table_file)
+    assert graph_distances(parsed) == csv_distances(table_file)
+
+    built, _, hub_address = main.load_cached_distance_data(table_file, cache_file)
+    assert os.path.exists(cache_file)
+    cached, vertex_list, cached_hub = main.load_cached_distance_data(table_file, cache_file)
+    # the second load maps the cache: its matrix is read-only
+    assert cached.distance_matrix.buffer.readonly
+    assert graph_distances(cached) == graph_distances(built) == csv_distances(table_file)
+    assert vertex_fields(cached) == vertex_fields(parsed)
+    assert cached_hub is vertex_list[0] and cached_hub.address == hub_address.address
+
+
+def test_stale_cache_is_rebuilt(tmp_path, table_file):
+    cache_file = str(tmp_path / 'table.csv.cache')
+    table_file = shutil.copy(table_file, str(tmp_path / 'table.csv'))
+    main.load_cached_distance_data(table_file, cache_file)
+    old_hash = table_cache.file_hash(table_file)
+
+    # change the distance between vertices 5 and 3 in the CSV
+    with open(table_file, 'r') as distance_file:
+        rows = list(csv.reader(distance_file))
+    rows[6][2 + 3] = str(float(rows[6][2 + 3]) + 1.5)
+    with open(table_file, 'w', newline='') as distance_file:
+        csv.writer(distance_file).writerows(rows)
+
+    assert table_cache.read_table_cache(cache_file, table_cache.file_hash(table_file)) is None
+    city_map, _, _ = main.load_cached_distance_data(table_file, cache_file)
+    assert graph_distances(city_map) == csv_distances(table_file)
+    assert city_map.distance_matrix[5, 3] == city_map.distance_matrix[3, 5] == float(rows[6][2 + 3])
+    # the rebuilt cache records the new CSV and is used from then on
+    assert table_cache.read_table_cache(cache_file, old_hash) is None
+    reread = table_cache.read_table_cache(cache_file, table_cache.file_hash(table_file))
+    assert reread is not None and graph_distances(reread) == csv_distances(table_file)
+
+
+def test_damaged_cache_is_ignored(tmp_path, table_file):
+    cache_file = str(tmp_path / 'table.csv.cache')
+    table_file = shutil.copy(table_file, str(tmp_path / 'table.csv'))
+    source_hash = table_cache.file_hash(table_file)
+    main.load_cached_distance_data(table_file, cache_file)
+    with open(cache_file, 'rb') as cache:
+        content = cache.read()
+
+    damaged = {'empty': b'',
+               'short header': content[:10],
+               'other version': content[:4] + b'\x63\x00' + content[6:],
+               'truncated distances': content[:-8],
+               'truncated vertices': content[:table_cache._HEADER.size + 20]}
+    for name, data in damaged.items():
+        with open(cache_file, 'wb') as cache:
+            cache.write(data)
+        assert table_cache.read_table_cache(cache_file, source_hash) is None, name
+
+    # a damaged cache is replaced by a good one on the next load
+    city_map, _, _ = main.load_cached_distance_data(table_file, cache_file)
+    assert graph_distances(city_map) == csv_distances(table_file)
+    assert table_cache.read_table_cache(cache_file, source_hash) is not None
@@ -0,0 +1,43 @@
+_Author_ = "Joseph Curtis"
+# Title: View tests
+# Description: The status reports written without the menu by view.py
+# Date: 29 Apr 2023
+
+import csv
+import datetime
+import json
+
+import view
+from model import PackageStatusTimeline
+
+
+def read_report(report_file: str, report_format: str) -> list:
+    with open(report_file, 'r', newline='') as report:
+        if report_format == 'json':
+            return [[str(row[column]) for column in view.REPORT_COLUMNS] for row in json.load(report)]
+        rows = list(csv.reader(report))
+    assert tuple(rows[0]) == view.REPORT_COLUMNS
+    return rows[1:]
+
+
+def test_status_reports_match_the_timeline(sample_day, tmp_path):
+    day = sample_day('manual')
+    timeline = PackageStatusTimeline(package for _, package in day.packages)
+    report_times = [datetime.time(9), datetime.time(10, 30)]
+    for report_format in ('csv', 'json'):
+        for package_ids in (None, [9, 1, 25]):
+            report_file = str(tmp_path / ('status.' + report_format))
+            view.write_status_reports(day.packages, timeline, report_times, package_ids, report_file, report_format)
+            rows = read_report(report_file, report_format)
+
+            reported_ids = package_ids or [package_id for package_id, _ in day.packages]
+            assert [(row[0], int(row[1])) for row in rows] \
+                == [(str(chosen_time), package_id) for chosen_time in report_times for package_id in reported_ids]
+            for row in rows:
+                chosen_time = datetime.time.fromisoformat(row[0])
+                package = day.packages.get(int(row[1]))
+                assert row[-1] == timeline.status_at(package.package_id, chosen_time)
+                assert row[2:-1] == [package.destination.address, package.city, package.state,
+                                     package.destination.zipcode, package.deadline_str, str(package.mass_kg)]
+            # the two times differ for some packages, e.g. those delivered in between
+            assert any(first[-1] != second[-1] for first, second in zip(rows, rows[len(reported_ids):]))